@@ -1,12 +1,105 @@
 import streamlit as st
 from utils.openai_helper import get_openai_streaming_response
-from utils.openai_helper import get_openai_response
-from helper.crawl_selenium import get_product_info, extract_product_id, is_product_id_in_list, get_basic_product_info
-import time
+from utils.openai_helper import invalidate_product_responses
+from helper.crawl_selenium import extract_product_id, is_product_id_in_list, get_driver_pool, get_scrape_cache
+from helper.crawl_selenium import get_session_manager
+from utils.review_retrieval import get_review_index, build_messages_with_reviews, reviews_message
+from utils.review_retrieval import invalidate_review_indexes
+from utils.local_review_index import get_local_review_index
+from utils.context_manager import RollingContext
+from utils.semantic_cache import semantic_cache, invalidate_product_answers
+from utils.semantic_cache import system_prefix_digest, is_standalone_question
+from utils.scrape_jobs import get_scrape_jobs, ACTIVE_STATUSES, DONE, TIMEOUT
+from utils.product_store import get_product_store
+from components.streaming_renderer import StreamingRenderer
+from utils.tracing import span
+from utils.llm_telemetry import telemetry
+from config.settings import REVIEW_TOP_K, CONTEXT_TOKEN_BUDGET, SCRAPE_POLL_INTERVAL
+import json
+
+def set_product_lease(lease):
+    """Thay lease sản phẩm của session, giải phóng lease cũ để kho được loại bản ghi cũ"""
+    previous = st.session_state.get("product_lease")
+    if previous is not None and previous is not lease:
+        previous.release()
+    st.session_state.product_lease = lease
+
+def apply_scrape_result(job):
+    """
+    Đưa kết quả của một job Scrape đã kết thúc vào session state
+
+    Args:
+        job (dict): Snapshot của ScrapeJob
+    """
+    if job["status"] == TIMEOUT:
+        st.session_state.scrape_error = "Quá thời gian xử lý sản phẩm. Vui lòng thử lại."
+        return
+    if job["status"] != DONE:
+        st.session_state.scrape_error = "Không thể lấy thông tin sản phẩm. Vui lòng thử lại."
+        return
+
+    # Session chỉ giữ lease (tham chiếu được pin) tới bản ghi trong kho sản phẩm dùng chung
+    store = get_product_store()
+    lease = store.acquire(job["result"]["product_ref"])
+    if lease is None:
+        # Bản ghi đã bị loại khỏi kho trước khi UI kịp đọc: dùng phiên bản mới nhất của sản phẩm
+        latest = store.latest(job["key"])
+        lease = store.acquire(latest.ref) if latest is not None else None
+    if lease is None:
+        # Không còn phiên bản nào trong kho: scrape lại thay vì báo lỗi
+        retry = get_scrape_jobs().submit(job["product_url"], job["product_id"], job["use_file_search"],
+                                         job["selected_model"])
+        st.session_state.scrape_job_id = retry.job_id
+        return
+    set_product_lease(lease)
+    record = lease.record
+    
+    # Reset toàn bộ system message (chuỗi của bản ghi được dùng chung, không sao chép)
+    if "messages_history" in st.session_state:
+        for i, msg in enumerate(st.session_state.messages_history):
+            if msg.get("role") == "system":
+                st.session_state.messages_history[i] = {"role": "system", "content": record.system_message}
+                break
+        else:
+            # Nếu không tìm thấy system message, thêm vào đầu danh sách
+            st.session_state.messages_history.insert(0, {"role": "system", "content": record.system_message})
+    else:
+        st.session_state.messages_history = [{"role": "system", "content": record.system_message}]
+    
+    # Reset conversation và thêm tin nhắn tự động từ hệ thống
+    st.session_state.conversation = []
+    st.session_state.conversation.append(("assistant", record.welcome_message))
+
+@st.fragment(run_every=SCRAPE_POLL_INTERVAL)
+def render_scrape_job(job_id):
+    """Hiển thị tiến độ job Scrape (tự chạy lại mỗi SCRAPE_POLL_INTERVAL giây), áp dụng kết quả khi job xong"""
+    job = get_scrape_jobs().get(job_id)
+    if job is None:
+        st.session_state.scrape_job_id = None
+        return
+    snapshot = job.snapshot()
+    if snapshot["status"] in ACTIVE_STATUSES:
+        st.progress(snapshot["percent"])
+        st.info(snapshot["message"])
+        return
+    st.session_state.scrape_job_id = None
+    apply_scrape_result(snapshot)
+    # Chạy lại toàn bộ trang để hiển thị hội thoại mới
+    st.rerun()
 
 def main():
     st.set_page_config(layout="wide", page_title="Amazon Chatbot", page_icon="🤖")
 
+    # Khởi tạo pool Chrome dùng chung (chỉ tạo một lần cho cả tiến trình)
+    get_driver_pool()
+
+    # Xoá câu trả lời LLM đã cache khi dữ liệu scrape của sản phẩm thay đổi
+    scrape_cache = get_scrape_cache()
+    if scrape_cache is not None:
+        scrape_cache.add_listener(invalidate_product_responses)
+        scrape_cache.add_listener(invalidate_product_answers)
+        scrape_cache.add_listener(invalidate_review_indexes)
+
     # Sidebar
     st.sidebar.header("Chatbot Configuration")
 
@@ -16,12 +109,35 @@ def main():
         options=["gpt-4o-mini", "gpt-4.1-mini", "gpt-4.1"]
     )
 
+    # Dùng lại câu trả lời cho các câu hỏi tương tự về cùng sản phẩm
+    use_answer_cache = st.sidebar.checkbox("Dùng cache câu trả lời", value=False)
+
+    # Số đo các lời gọi model trong cửa sổ gần nhất (TTFT, tokens/s, token prompt/cached/completion)
+    with st.sidebar.expander("📊 LLM telemetry"):
+        telemetry_rows = telemetry.summary()
+        if telemetry_rows:
+            st.dataframe(telemetry_rows, use_container_width=True)
+            st.download_button("Tải bản ghi (JSON)", json.dumps(telemetry.records(), ensure_ascii=False),
+                               file_name="llm_telemetry.json", mime="application/json")
+        else:
+            st.caption("Chưa có lời gọi model nào.")
+
+    # Tỉ lệ captcha và health của các phiên duyệt (cookies được dùng lại giữa các driver)
+    session_manager = get_session_manager()
+    if session_manager is not None:
+        with st.sidebar.expander("🍪 Browser sessions"):
+            session_rows = session_manager.stats()
+            if session_rows:
+                st.dataframe(session_rows, use_container_width=True)
+            else:
+                st.caption("Chưa có phiên duyệt nào.")
+
     # 2) Nhập URL của sản phẩm Amazon
     product_url = st.sidebar.text_input("Nhập Amazon Product URL")
 
-    # Khởi tạo session state cho product data và product id
-    if "product_data" not in st.session_state:
-        st.session_state.product_data = None
+    # Khởi tạo session state cho tham chiếu sản phẩm (trong kho dùng chung) và product id
+    if "product_lease" not in st.session_state:
+        st.session_state.product_lease = None
     
     if "product_id" not in st.session_state:
         st.session_state.product_id = None
@@ -83,194 +199,27 @@ def main():
             current_product_id = extract_product_id(product_url)
             if current_product_id != st.session_state.get("last_scraped_product_id", None):
                 # Reset tất cả session state liên quan đến sản phẩm
-                st.session_state.product_data = None
+                set_product_lease(None)
                 st.session_state.product_id = None
                 st.session_state.use_file_search = False
-                st.session_state.product_summary = None
                 st.session_state.conversation = []
                 st.session_state.messages_history = [
                     {"role": "system", "content": "Bạn là trợ lý AI hữu ích, thân thiện và trung thực."}
                 ]
+                st.session_state.chat_context = RollingContext(budget_tokens=CONTEXT_TOKEN_BUDGET)
                 # Ghi nhớ ID sản phẩm hiện tại để so sánh sau này
                 st.session_state.last_scraped_product_id = current_product_id
             
-            # Hiển thị loading spinner trung tâm màn hình
-            with st.spinner("Đang xử lý dữ liệu sản phẩm..."):
-                # Hiển thị progress bar để cập nhật tiến trình scraping
-                progress_bar = st.progress(0)
-                
-                # Thông báo đang bắt đầu quá trình
-                progress_status = st.empty()
-                progress_status.info("Đang bắt đầu quá trình scraping...")
-                
-                # Lấy product ID và thiết lập trạng thái
-                product_id = extract_product_id(product_url)
-                use_file_search = is_product_id_in_list(product_id) if product_id else False
-                st.session_state.product_id = product_id
-                st.session_state.use_file_search = use_file_search
-                
-                # Cập nhật progress bar
-                progress_bar.progress(10)
-                progress_status.info("Đang tìm kiếm thông tin sản phẩm...")
-                
-                # --- Luôn scrape thông tin cơ bản sản phẩm bất kể đã có trong cơ sở dữ liệu hay chưa ---
-                progress_status.info("Đang scrape thông tin cơ bản cho sản phẩm...")
-                
-                # Scrape thông tin cơ bản từ URL
-                basic_product_info = get_basic_product_info(product_url)
-                
-                # Cập nhật progress bar
-                progress_bar.progress(30)
-                
-                if use_file_search and product_id:
-                    # Nếu sản phẩm đã tồn tại, lấy reviews từ cơ sở dữ liệu
-                    progress_status.info("Đang tìm kiếm đánh giá trong cơ sở dữ liệu...")
-                    
-                    # Lấy reviews từ cơ sở dữ liệu thông qua file search
-                    reviews_prompt = f"Liệt kê chi tiết tất cả các đánh giá cho sản phẩm có ProductId {product_id}. Cho mỗi đánh giá, bao gồm: tên người dùng, số sao đánh giá, tiêu đề đánh giá, và nội dung đánh giá."
-                    reviews_context = get_openai_response(reviews_prompt, product_id, use_file_search=True, selected_model=selected_model)
-                    
-                    # Đảm bảo lưu dữ liệu vào session state để sử dụng sau này
-                    st.session_state.product_data = {
-                        "title": basic_product_info.get('title', 'Không rõ'),
-                        "price": basic_product_info.get('price', 'Không rõ'),
-                        "rating": basic_product_info.get('rating', 'Không rõ'),
-                        "review_count": basic_product_info.get('review_count', 'Không rõ'),
-                        "description": basic_product_info.get('description', 'Không rõ'),
-                        "reviews_context": reviews_context  # Lưu reviews_context vào session
-                    }
-                else:
-                    # Nếu sản phẩm chưa tồn tại, scrape đầy đủ
-                    progress_status.info(f"Đang scrape toàn bộ thông tin sản phẩm từ: {product_url}")
-                    
-                    # Gọi hàm scrape để lấy thông tin sản phẩm đầy đủ
-                    product_data = get_product_info(product_url)
+            # Lấy product ID và thiết lập trạng thái
+            product_id = extract_product_id(product_url)
+            use_file_search = is_product_id_in_list(product_id) if product_id else False
+            st.session_state.product_id = product_id
+            st.session_state.use_file_search = use_file_search
+            st.session_state.scrape_error = None
 
-                    # Thêm kiểm tra kết quả scrape
-                    if product_data and "error" not in product_data and product_data.get("title") != "Title not found":
-                        # Lưu dữ liệu vào session state để sử dụng sau
-                        st.session_state.product_data = product_data
-                        # ... tiếp tục xử lý như bình thường
-                                            # Tạo context từ reviews
-                        reviews_context = "Dưới đây là các đánh giá của người dùng về sản phẩm:\n\n"
-                        for i, review in enumerate(product_data.get("reviews", [])):
-                            reviews_context += f"Review #{i+1}:\n"
-                            reviews_context += f"- Tiêu đề: {review.get('title', 'Không có tiêu đề')}\n"
-                            reviews_context += f"- Người đánh giá: {review.get('author', 'Ẩn danh')}\n"
-                            reviews_context += f"- Nội dung: {review.get('text', 'Không có nội dung')}\n"
-                            reviews_context += f"- Ngày: {review.get('date', 'Không rõ ngày')}\n\n"
-                        
-                        # Lưu reviews_context vào product_data để dùng sau này
-                        st.session_state.product_data["reviews_context"] = reviews_context
-                    else:
-                        # Hiển thị thông báo lỗi và không rerun
-                        st.error("Không thể lấy thông tin sản phẩm. Vui lòng thử lại.")
-                        # Không gọi st.rerun() ở đây
-                        return
-                
-                    
-
-                
-                # Cập nhật progress bar
-                progress_bar.progress(60)
-                progress_status.info("Đang tạo tóm tắt sản phẩm...")
-                
-                # Tạo prompt để sinh tóm tắt sản phẩm
-                summary_prompt = f"""
-                Hãy tạo một bản tóm tắt ngắn gọn về sản phẩm này dựa trên thông tin sau:
-                
-                THÔNG TIN CƠ BẢN:
-                Tên sản phẩm: {basic_product_info.get('title', 'Không rõ')}
-                Giá: {basic_product_info.get('price', 'Không rõ')}
-                Đánh giá: {basic_product_info.get('rating', 'Không rõ')}
-                Số lượng đánh giá: {basic_product_info.get('review_count', 'Không rõ')}
-                Mô tả: {basic_product_info.get('description', 'Không rõ')}
-                
-                Tóm tắt nên bao gồm: Đây là sản phẩm gì, các tính năng chính, điểm mạnh, giá cả, và cảm nhận chung của người dùng.
-                """
-                
-                # Gọi OpenAI để tạo tóm tắt
-                product_summary = get_openai_response(summary_prompt, selected_model=selected_model)
-                
-                # Lưu product_summary vào session_state
-                st.session_state.product_summary = product_summary
-                
-                # Cập nhật progress bar
-                progress_bar.progress(80)
-                progress_status.info("Đang chuẩn bị thông tin cho chatbot...")
-                
-                # Lấy reviews_context từ session_state.product_data
-                reviews_context = st.session_state.product_data.get("reviews_context", reviews_context)
-                
-                # Cập nhật system message với thông tin sản phẩm
-                system_message = f"""Bạn là trợ lý AI hữu ích, thân thiện và trung thực.
-                
-                THÔNG TIN SẢN PHẨM {f"(ProductId: {product_id})" if product_id else ""}:
-                Tên: {basic_product_info.get('title', 'Không rõ')}
-                Giá: {basic_product_info.get('price', 'Không rõ')}
-                Đánh giá: {basic_product_info.get('rating', 'Không rõ')}
-                Số lượng đánh giá: {basic_product_info.get('review_count', 'Không rõ')}
-                Mô tả: {basic_product_info.get('description', 'Không rõ')}
-                
-                TÓM TẮT SẢN PHẨM:
-                {product_summary}
-                
-                ĐÁNH GIÁ NGƯỜI DÙNG:
-                {reviews_context}
-                
-                Hãy sử dụng thông tin trên để trả lời các câu hỏi của người dùng về sản phẩm này.
-                Khi được hỏi về đánh giá hoặc cảm nhận về sản phẩm, hãy dựa vào các đánh giá của người dùng đã cung cấp.
-                Khi không có thông tin để trả lời, hãy thừa nhận rằng bạn không có đủ thông tin và không tự tạo ra thông tin giả.
-                """
-                
-                # Reset toàn bộ system message
-                if "messages_history" in st.session_state:
-                    for i, msg in enumerate(st.session_state.messages_history):
-                        if msg.get("role") == "system":
-                            st.session_state.messages_history[i] = {"role": "system", "content": system_message}
-                            break
-                    else:
-                        # Nếu không tìm thấy system message, thêm vào đầu danh sách
-                        st.session_state.messages_history.insert(0, {"role": "system", "content": system_message})
-                else:
-                    st.session_state.messages_history = [{"role": "system", "content": system_message}]
-                
-                # Reset conversation và thêm tin nhắn tự động từ hệ thống
-                st.session_state.conversation = []
-                st.session_state.conversation.append(("assistant", f"Đã tìm thấy thông tin sản phẩm!\n\n**Tóm tắt sản phẩm:**\n\n{product_summary}"))
-                
-                # Hiển thị tóm tắt sản phẩm ngay trên màn hình với giao diện đẹp
-                summary_container = st.container()
-                with summary_container:
-                    col1, col2 = st.columns([0.05, 0.95])
-                    with col1:
-                        st.markdown("✅")
-                    with col2:
-                        st.success("Đã tìm thấy thông tin sản phẩm!")
-                    
-                    st.markdown("""
-                    <div style='margin: 10px; display: flex; align-items: flex-start;'>
-                        <div style='width: 36px; height: 36px; border-radius: 50%; background-color: #4285F4; color: white; display: flex; justify-content: center; align-items: center; margin-right: 8px; font-weight: bold;'>
-                            <span>🤖</span>
-                        </div>
-                        <div style='display: inline-block; background-color: #F1F0F0; padding: 8px 12px; border-radius: 8px; max-width: 90%;'>
-                            {summary}
-                        </div>
-                    </div>
-                    """.format(summary=product_summary.replace('\n', '<br>')), unsafe_allow_html=True)
-                    
-                
-                # Hoàn thành progress bar
-                progress_bar.progress(100)
-                progress_status.success("Hoàn tất!")
-                time.sleep(0.5)  # Cho người dùng thấy thông báo hoàn tất
-                
-                # Xóa các thành phần hiển thị progress
-                progress_bar.empty()
-                progress_status.empty()
-            
-            # Buộc Streamlit rerun để hiển thị thay đổi
-            st.rerun()
+            # Scrape, lấy reviews và tạo tóm tắt chạy trong worker nền; UI chỉ đọc trạng thái job
+            job = get_scrape_jobs().submit(product_url, product_id, use_file_search, selected_model)
+            st.session_state.scrape_job_id = job.job_id
 
     # ------------------------------------------------
     # Phần chính: giao diện chat
@@ -278,6 +227,12 @@ def main():
 
     st.title("Amazon Chatbot")
 
+    # Tiến độ của job Scrape đang chạy (tự cập nhật) hoặc lỗi của job vừa kết thúc
+    if st.session_state.get("scrape_error"):
+        st.error(st.session_state.scrape_error)
+    if st.session_state.get("scrape_job_id"):
+        render_scrape_job(st.session_state.scrape_job_id)
+
     # Khởi tạo session_state để lưu trữ lịch sử hội thoại
     if "conversation" not in st.session_state:
         st.session_state.conversation = []
@@ -288,6 +243,10 @@ def main():
             {"role": "system", "content": "Bạn là trợ lý AI hữu ích, thân thiện và trung thực."}
         ]
 
+    # Quản lý ngân sách token cho lịch sử gửi lên API (tóm tắt dần các lượt cũ)
+    if "chat_context" not in st.session_state:
+        st.session_state.chat_context = RollingContext(budget_tokens=CONTEXT_TOKEN_BUDGET)
+
     # Hàm hiển thị một tin nhắn trong khu vực chat
     # role: 'user' hoặc 'assistant'
     # text: nội dung tin nhắn
@@ -363,31 +322,53 @@ def main():
             product_id = st.session_state.product_id if st.session_state.use_file_search else None
             use_file_search = st.session_state.use_file_search
             
-            for response_chunk in get_openai_streaming_response(
-                st.session_state.messages_history, 
-                product_id=product_id,
-                use_file_search=use_file_search,
-                selected_model=selected_model
-            ):
-                if response_chunk:
-                    full_response += response_chunk
-                    # Cập nhật phản hồi đang xây dựng
-                    typing_placeholder.markdown(
-                        f"""
-                        <div style='margin: 10px; display: flex; align-items: flex-start;'>
-                            <div style='width: 36px; height: 36px; border-radius: 50%; background-color: #4285F4; color: white; display: flex; justify-content: center; align-items: center; margin-right: 8px; font-weight: bold;'>
-                                <span>🤖</span>
-                            </div>
-                            <div style='display: inline-block; background-color: #F1F0F0; padding: 8px 12px; border-radius: 8px; max-width: 90%;'>
-                                {full_response}▌
-                            </div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
+            # Chỉ gửi kèm các reviews liên quan tới câu hỏi hiện tại (không lưu vào lịch sử)
+            relevant_reviews = None
+            lease = st.session_state.product_lease
+            record = lease.record if lease is not None else None
+            scraped_reviews = record.reviews if record is not None else None
+            local_index = get_local_review_index() if use_file_search else None
+            if local_index is not None and product_id in local_index:
+                relevant_reviews = local_index.search(product_id, user_input, k=REVIEW_TOP_K)
+            elif scraped_reviews:
+                # Khoá theo phiên bản trong kho: reviews khác nhau (dù cùng số lượng) không dùng chung chỉ mục
+                review_index = get_review_index(record.ref, scraped_reviews)
+                relevant_reviews = review_index.search(user_input, k=REVIEW_TOP_K)
+            
+            # Giới hạn lịch sử trong ngân sách token: system prefix + tóm tắt + các lượt gần nhất,
+            # sau khi đã trừ phần reviews sẽ chèn vào request
+            review_message = reviews_message(relevant_reviews)
+            history = st.session_state.chat_context.build(st.session_state.messages_history, selected_model,
+                                                          extra_messages=[review_message] if review_message else ())
+            request_messages = build_messages_with_reviews(history, relevant_reviews) if relevant_reviews else history
+            
+            def stream_factory():
+                return get_openai_streaming_response(
+                    request_messages, 
+                    product_id=product_id,
+                    use_file_search=use_file_search,
+                    selected_model=selected_model
+                )
+            
+            cache_product_id = st.session_state.get("last_scraped_product_id")
+            # Chỉ câu hỏi đầu tiên của hội thoại dùng cache: câu hỏi nối tiếp phụ thuộc các lượt trước
+            if use_answer_cache and cache_product_id and is_standalone_question(st.session_state.messages_history):
+                response_stream = semantic_cache.stream(cache_product_id, selected_model, user_input, stream_factory,
+                                                        context=system_prefix_digest(request_messages))
+            else:
+                response_stream = stream_factory()
+            
+            # Gộp các chunk và vẽ lại theo ngân sách thời gian/ký tự thay vì sau mỗi chunk
+            renderer = StreamingRenderer(typing_placeholder, new_placeholder=st.empty)
+            with span("chat_render") as render_span:
+                for response_chunk in response_stream:
+                    renderer.feed(response_chunk)
+                full_response = renderer.finish()
+                # Số chunk/frame/byte đã vẽ được ghi vào trace thay vì in ra mỗi câu trả lời
+                render_span.set(**renderer.stats)
             
             # Xóa placeholder typing và thêm tin nhắn hoàn chỉnh vào hội thoại UI
-            typing_placeholder.empty()
+            renderer.clear()
             st.session_state.conversation.append(("assistant", full_response))
             
             # Thêm phản hồi của bot vào history cho OpenAI API
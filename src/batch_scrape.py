@@ -0,0 +1,223 @@
+"""
+Scrape hàng loạt sản phẩm Amazon từ danh sách ASIN
+
+Ví dụ (chạy từ thư mục gốc của repo):
+    python src/batch_scrape.py
+    python src/batch_scrape.py --input ids.txt --output out.jsonl --workers 4 --mode process
+    python src/batch_scrape.py --parquet out.parquet --refresh
+
+Kết quả được ghi nối tiếp vào file JSONL ngay khi mỗi sản phẩm xong. File checkpoint
+ghi lại các ASIN đã xử lý nên chạy lại cùng lệnh sẽ tiếp tục từ chỗ dừng.
+
+File Parquet (--parquet) chỉ được ghi ở cuối mỗi lần chạy, từ toàn bộ file JSONL: lần chạy
+bị ngắt giữa chừng vẫn ghi Parquet cho phần đã xong, và chạy lại để tiếp tục (kể cả khi
+không còn ASIN nào) sẽ ghi lại Parquet đầy đủ.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from helper.crawl_selenium import PRODUCT_IDS_FILE, get_cached_product
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_URL_TEMPLATE = "https://www.amazon.com/dp/{asin}"
+
+
+def scrape_one(asin, url_template, full, refresh):
+    """
+    Scrape một ASIN (chạy trong worker thread/process)
+
+    Returns:
+        dict: {"asin", "elapsed", "product"} hoặc {"asin", "elapsed", "error"}
+    """
+    start = time.perf_counter()
+    try:
+        product = get_cached_product(url_template.format(asin=asin), full=full, force_refresh=refresh)
+    except Exception as e:
+        product = {"error": str(e)}
+    elapsed = time.perf_counter() - start
+    if "error" in product:
+        return {"asin": asin, "elapsed": elapsed, "error": product["error"]}
+    return {"asin": asin, "elapsed": elapsed, "product": product}
+
+
+def read_asins(path):
+    with open(path, "r") as f:
+        seen = set()
+        asins = []
+        for line in f:
+            asin = line.strip()
+            if asin and asin not in seen:
+                seen.add(asin)
+                asins.append(asin)
+        return asins
+
+
+def read_checkpoint(path, retry_failed=True):
+    """
+    Đọc checkpoint (JSONL: {"asin", "status"})
+
+    Returns:
+        set: Các ASIN không cần chạy lại
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Dòng cuối có thể bị ghi dở khi tiến trình bị dừng đột ngột
+            if record.get("status") == "ok" or not retry_failed:
+                done.add(record["asin"])
+    return done
+
+
+def write_parquet(jsonl_path, parquet_path):
+    """
+    Chuyển toàn bộ file JSONL (gồm cả các lần chạy trước) sang Parquet, mỗi ASIN một dòng
+
+    Args:
+        jsonl_path (str): File JSONL đầu ra của batch
+        parquet_path (str): File Parquet cần ghi (ghi đè)
+    """
+    try:
+        import pandas as pd
+    except ImportError:
+        print("⚠️ pandas (và pyarrow) cần được cài đặt để ghi Parquet (xem requirements.txt), bỏ qua bước này")
+        return
+    if not os.path.exists(jsonl_path):
+        print(f"⚠️ {jsonl_path} does not exist, skipping Parquet output")
+        return
+    records = []
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    frame = pd.json_normalize(records, max_level=0)
+    if "asin" in frame:
+        # ASIN scrape lại (--refresh) xuất hiện nhiều lần trong JSONL, giữ bản mới nhất
+        frame = frame.drop_duplicates("asin", keep="last")
+    # Các cột lồng nhau (table, images, reviews) được lưu dưới dạng chuỗi JSON
+    for column in ("table", "images", "reviews"):
+        if column in frame:
+            frame[column] = frame[column].map(lambda value: json.dumps(value, ensure_ascii=False))
+    frame.to_parquet(parquet_path, index=False)
+    print(f"Wrote {len(frame)} rows to {parquet_path}")
+
+
+class ThroughputReport:
+    """Theo dõi tốc độ xử lý, tỉ lệ lỗi và độ trễ từng sản phẩm"""
+
+    def __init__(self, total, interval=10):
+        self.total = total
+        self.interval = interval
+        self.ok = 0
+        self.failed = 0
+        self.latencies = []
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def record(self, result):
+        self.latencies.append(result["elapsed"])
+        if "error" in result:
+            self.failed += 1
+        else:
+            self.ok += 1
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(self.summary())
+
+    def summary(self):
+        done = self.ok + self.failed
+        elapsed = time.perf_counter() - self.started
+        rate = done / elapsed * 60 if elapsed > 0 else 0.0
+        failure_rate = self.failed / done * 100 if done else 0.0
+        line = (f"[{done}/{self.total}] ok={self.ok} failed={self.failed} ({failure_rate:.1f}%) "
+                f"throughput={rate:.1f} items/min")
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+            line += f" latency p50={statistics.median(latencies):.1f}s p95={p95:.1f}s"
+        return line
+
+
+def run_batch(args, asins, checkpoint_path):
+    """Scrape các ASIN còn lại, ghi JSONL và checkpoint ngay khi mỗi sản phẩm xong"""
+    report = ThroughputReport(len(asins))
+    executor_cls = ProcessPoolExecutor if args.mode == "process" else ThreadPoolExecutor
+    consecutive_failures = 0
+    with executor_cls(max_workers=args.workers) as executor, \
+            open(args.output, "a", encoding="utf-8") as output, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        futures = [executor.submit(scrape_one, asin, args.url_template, not args.basic, args.refresh)
+                   for asin in asins]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                report.record(result)
+                if "error" in result:
+                    consecutive_failures += 1
+                    status = {"asin": result["asin"], "status": "error", "error": result["error"]}
+                else:
+                    consecutive_failures = 0
+                    record = {"asin": result["asin"], "scraped_at": time.time(), **result["product"]}
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                    status = {"asin": result["asin"], "status": "ok"}
+                # Checkpoint chỉ được ghi sau khi output đã flush
+                checkpoint.write(json.dumps(status) + "\n")
+                checkpoint.flush()
+                if consecutive_failures >= args.max_consecutive_failures:
+                    print(f"⚠️ {consecutive_failures} consecutive failures, stopping. Re-run to resume.")
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        except KeyboardInterrupt:
+            print("Interrupted, cancelling pending items. Re-run to resume.")
+            for pending in futures:
+                pending.cancel()
+
+    print(report.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch scrape Amazon products by ASIN")
+    parser.add_argument("--input", default=PRODUCT_IDS_FILE, help="File ASIN, mỗi dòng một ID")
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, "batch_products.jsonl"))
+    parser.add_argument("--checkpoint", default=None, help="Mặc định: <output>.checkpoint")
+    parser.add_argument("--parquet", default=None,
+                        help="Ghi thêm file Parquet từ toàn bộ JSONL ở cuối lần chạy (cần pandas, pyarrow)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--basic", action="store_true", help="Chỉ lấy thông tin cơ bản")
+    parser.add_argument("--refresh", action="store_true", help="Bỏ qua scrape cache và scrape lại")
+    parser.add_argument("--url-template", default=DEFAULT_URL_TEMPLATE)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--no-retry-failed", action="store_true", help="Không chạy lại các ASIN đã lỗi")
+    parser.add_argument("--max-consecutive-failures", type=int, default=20,
+                        help="Dừng khi lỗi liên tiếp quá số này (ví dụ bị captcha hàng loạt)")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    done = read_checkpoint(checkpoint_path, retry_failed=not args.no_retry_failed)
+    asins = [asin for asin in read_asins(args.input) if asin not in done]
+    if args.limit is not None:
+        asins = asins[:args.limit]
+    print(f"{len(done)} ASINs already in checkpoint, {len(asins)} to scrape "
+          f"with {args.workers} {args.mode} workers")
+    if asins:
+        run_batch(args, asins, checkpoint_path)
+    if args.parquet:
+        write_parquet(args.output, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
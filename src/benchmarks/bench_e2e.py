@@ -0,0 +1,312 @@
+"""
+Benchmark end-to-end offline: scrape, captcha và các lời gọi OpenAI qua máy chủ giả lập
+
+Trang Amazon được phục vụ từ benchmarks/fixtures bởi một máy chủ HTTP cục bộ, API OpenAI
+được thay bằng benchmarks.fake_openai (OPENAI_BASE_URL). Với mỗi stage, benchmark ghi
+p50/p95, throughput và peak RSS (gồm cả Chrome) rồi lưu kết quả JSON để so sánh hồi quy.
+Hai stage page_load_full/page_load_lean so sánh profile trình duyệt đầy đủ và profile lean
+(DRIVER_PROFILE) trên cùng trang sản phẩm: thời gian tới khi trích xuất được và KB đã tải.
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_e2e --skip-browser
+    python -m benchmarks.bench_e2e --iterations 20 --concurrency 4 --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fixture_server import FixtureServer
+from helper.driver_pool import process_tree_rss_mb
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Các chỉ số được so sánh với baseline: True nếu giá trị lớn hơn là tốt hơn
+COMPARED_METRICS = {"p50_ms": False, "p95_ms": False, "throughput_per_s": True, "peak_rss_mb": False}
+
+
+class PeakRssSampler:
+    """Lấy mẫu RSS của tiến trình hiện tại và các tiến trình con (chromedriver/Chrome) ở nền"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, process_tree_rss_mb(os.getpid()) or 0.0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, process_tree_rss_mb(os.getpid()) or 0.0)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run_stage(name, func, iterations, concurrency=1):
+    """
+    Chạy func(i) iterations lần với concurrency luồng và tổng hợp số liệu
+
+    func trả về True nếu lần chạy thành công, hoặc (ok, extra_metrics) với extra_metrics
+    là dict các số đo phụ (ví dụ ttft_ms) được tổng hợp p50/p95.
+
+    Returns:
+        dict: Số liệu của stage
+    """
+    durations = []
+    extras = {}
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            result = func(i)
+        except Exception as e:
+            print(f"⚠️ {name} #{i} failed: {e}")
+            result = False
+        elapsed = time.perf_counter() - start
+        ok, extra = result if isinstance(result, tuple) else (result, {})
+        with lock:
+            durations.append(elapsed)
+            errors += 0 if ok else 1
+            for key, value in extra.items():
+                extras.setdefault(key, []).append(value)
+
+    with PeakRssSampler() as sampler:
+        wall_start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(one, range(iterations)))
+        else:
+            for i in range(iterations):
+                one(i)
+        wall = time.perf_counter() - wall_start
+
+    stats = {
+        "n": iterations,
+        "errors": errors,
+        "p50_ms": percentile(durations, 0.5) * 1000,
+        "p95_ms": percentile(durations, 0.95) * 1000,
+        "mean_ms": sum(durations) / len(durations) * 1000,
+        "throughput_per_s": iterations / wall if wall else 0.0,
+        "peak_rss_mb": sampler.peak_mb,
+    }
+    for key, values in extras.items():
+        stats[f"{key}_p50"] = percentile(values, 0.5)
+        stats[f"{key}_p95"] = percentile(values, 0.95)
+    print(f"{name:<24} p50 {stats['p50_ms']:9.1f} ms   p95 {stats['p95_ms']:9.1f} ms   "
+          f"{stats['throughput_per_s']:7.2f} ops/s   peak RSS {stats['peak_rss_mb']:7.1f} MB   "
+          f"errors {errors}/{iterations}")
+    return stats
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    In chênh lệch so với baseline
+
+    Returns:
+        list: Các (stage, metric, baseline, current) bị hồi quy vượt tolerance
+    """
+    regressions = []
+    print(f"\nSo sánh với baseline ({baseline.get('timestamp')}, commit {baseline.get('commit')}):")
+    ignored = {"output", "baseline", "tolerance"}
+    changed = sorted(key for key, value in results["config"].items()
+                     if key not in ignored and baseline.get("config", {}).get(key) != value)
+    if changed:
+        print(f"  Lưu ý: cấu hình khác baseline ({', '.join(changed)}), số liệu có thể không so sánh được")
+    for stage, stats in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), stats.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            print(f"  {stage:<24} {metric:<18} {old:10.2f} -> {new:10.2f} ({change:+.1%}){flag}")
+            if flag:
+                regressions.append((stage, metric, old, new))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--skip-browser", action="store_true",
+                        help="Bỏ qua các stage cần Chrome (scrape qua Selenium, solve_captcha, page_load)")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="Độ trễ mỗi trang fixture (giây)")
+    parser.add_argument("--review-pages", type=int, default=3)
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="RATE_LIMIT_PER_SECOND cho máy chủ fixture (0 = không giới hạn)")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Độ trễ tới token đầu tiên của API giả (giây)")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--output", help="File JSON kết quả (mặc định benchmarks/results/<thời gian>.json)")
+    parser.add_argument("--baseline", help="File JSON kết quả trước đó để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Ngưỡng hồi quy (tỉ lệ)")
+    args = parser.parse_args()
+
+    fixtures = FixtureServer(latency=args.page_latency, review_pages=args.review_pages).start()
+    fake_openai = FakeOpenAIServer(ttft=args.ttft, tokens_per_second=args.tokens_per_second,
+                                   response_tokens=args.response_tokens).start()
+
+    # Cấu hình phải có trước khi import các module ứng dụng (settings đọc env lúc import)
+    os.environ.update({
+        "OPENAI_BASE_URL": fake_openai.base_url,
+        "OPENAI_API_KEY": "offline-benchmark",
+        "SCRAPE_CACHE_ENABLED": "false",
+        "LLM_CACHE_PATH": "",
+        "REVIEW_CRAWL_PAGES": str(args.review_pages + 1),
+        "HTTP_FIRST": "true",
+        "RATE_LIMIT_PER_SECOND": str(args.rate_limit),
+        # Phiên duyệt của benchmark không ghi vào src/data và không dùng lại giữa các lần chạy
+        "SESSION_STATE_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-sessions-"), "browser_sessions.json"),
+    })
+    from helper import crawl_selenium
+    from helper.handleCaptcha import solve_captcha
+    from utils.openai_helper import get_openai_response, get_openai_streaming_response
+
+    def product_url(i, prefix="B0BENCH"):
+        # Mỗi lần chạy một ASIN khác nhau để không bị cache nào trả lời thay
+        return fixtures.product_url(f"{prefix}{i:03d}")
+
+    def scrape_ok(product):
+        return "error" not in product and product.get("title") != "Title not found"
+
+    def stream_once(_):
+        start = time.perf_counter()
+        ttft = None
+        text = ""
+        for chunk in get_openai_streaming_response([{"role": "user", "content": "Sản phẩm này có bền không?"}]):
+            if ttft is None:
+                ttft = (time.perf_counter() - start) * 1000
+            text += chunk
+        return bool(text) and not text.startswith("Error:"), {"ttft_ms": ttft or 0.0}
+
+    stages = {
+        "get_product_info": lambda i: scrape_ok(crawl_selenium.get_product_info(product_url(i))),
+        "get_basic_product_info": lambda i: scrape_ok(crawl_selenium.get_basic_product_info(product_url(i, "B0BASIC"))),
+        "get_openai_response": lambda i: not get_openai_response(f"Tóm tắt sản phẩm #{i}").startswith("Error:"),
+        "file_search_response": lambda i: not get_openai_response(
+            "Liệt kê các đánh giá", f"B0BENCH{i:03d}", use_file_search=True).startswith("Error:"),
+        "streaming_response": stream_once,
+    }
+
+    drivers = []
+    if not args.skip_browser:
+        from selenium.webdriver.support.ui import WebDriverWait
+        from helper.browser_profile import page_weight
+        from helper.crawl_selenium import setup_driver
+        from helper.page_wait import wait_for_page_ready
+
+        def scrape_with_browser(i):
+            return scrape_ok(crawl_selenium.scrape_product(product_url(i, "B0BRWSR"), use_http=False))
+
+        driver = setup_driver(headless=True)
+        drivers.append(driver)
+
+        def captcha_once(i):
+            driver.get(fixtures.captcha_url(f"B0CAPTC{i:03d}"))
+            return solve_captcha(driver)
+
+        def page_load_stage(profile, prefix):
+            profile_driver = setup_driver(headless=True, profile=profile)
+            drivers.append(profile_driver)
+
+            def load_once(i):
+                # Trang sản phẩm kèm tài nguyên: đo thời gian tới khi trích xuất được và số byte đã tải
+                sent_before = fixtures.bytes_sent
+                start = time.perf_counter()
+                profile_driver.get(product_url(i, prefix))
+                state = wait_for_page_ready(profile_driver)
+                ready_ms = (time.perf_counter() - start) * 1000
+                # Đợi các tài nguyên còn lại tải xong (hoặc bị chặn) rồi mới đếm byte
+                WebDriverWait(profile_driver, 30, poll_frequency=0.05).until(
+                    lambda d: d.execute_script("return document.readyState") == "complete")
+                weight = page_weight(profile_driver)
+                return state == "ready", {
+                    "ready_ms": ready_ms,
+                    "load_ms": weight.get("load_ms") or 0.0,
+                    "page_kb": (fixtures.bytes_sent - sent_before) / 1024,
+                    "resources": weight.get("resources", 0),
+                }
+            return load_once
+
+        stages["scrape_product_browser"] = scrape_with_browser
+        stages["solve_captcha"] = captcha_once
+        stages["page_load_full"] = page_load_stage("full", "B0FULLP")
+        stages["page_load_lean"] = page_load_stage("lean", "B0LEANP")
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": vars(args),
+        "stages": {},
+    }
+    try:
+        for name, func in stages.items():
+            # Captcha và page_load dùng driver riêng của stage nên luôn chạy tuần tự
+            concurrency = 1 if name == "solve_captcha" or name.startswith("page_load") else args.concurrency
+            results["stages"][name] = run_stage(name, func, args.iterations, concurrency)
+    finally:
+        for driver in drivers:
+            driver.quit()
+        fixtures.stop()
+        fake_openai.stop()
+    results["requests"] = {"fixtures": fixtures.requests, "openai": fake_openai.requests}
+    if crawl_selenium.get_session_manager() is not None:
+        # Số trang, số captcha và tỉ lệ captcha theo phiên duyệt
+        results["sessions"] = crawl_selenium.get_session_manager().stats()
+    if not args.skip_browser:
+        # Tỉ lệ giải captcha thành công, số lần thử và thời gian OCR/giải
+        from helper.handleCaptcha import captcha_stats
+        results["captcha"] = captcha_stats.snapshot()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nKết quả đã lưu vào {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} chỉ số hồi quy vượt ngưỡng {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
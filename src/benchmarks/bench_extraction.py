@@ -0,0 +1,112 @@
+"""
+Benchmark: trích xuất dữ liệu sản phẩm bằng find_element từng trường (cách cũ)
+so với parse một snapshot page_source trong tiến trình (helper.parse_html)
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_extraction
+    python -m benchmarks.bench_extraction --iterations 20 --skip-browser
+"""
+import argparse
+import os
+import statistics
+import time
+
+from helper.parse_html import make_soup, parse_basic_fields, parse_detail_fields, parse_product_html
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def extract_with_webdriver(driver):
+    """Cách trích xuất cũ: mỗi trường (và mỗi trường của từng review) là một round trip tới chromedriver"""
+    from selenium.webdriver.common.by import By
+
+    def first_text(root, selector, attribute=None):
+        try:
+            element = root.find_element(By.CSS_SELECTOR, selector)
+            return element.get_attribute(attribute) if attribute else element.text.strip()
+        except Exception:
+            return None
+
+    product = {
+        "title": first_text(driver, "#productTitle"),
+        "price": first_text(driver, ".a-offscreen", "innerText"),
+        "rating": first_text(driver, ".a-icon-alt", "innerText"),
+        "review_count": first_text(driver, "#acrCustomerReviewText"),
+        "description": first_text(driver, "#feature-bullets"),
+        "table": {},
+        "reviews": [],
+    }
+    try:
+        table_element = driver.find_element(By.CSS_SELECTOR, ".a-normal.a-spacing-micro")
+        for row in table_element.find_elements(By.TAG_NAME, "tr"):
+            cells = row.find_elements(By.TAG_NAME, "td")
+            if len(cells) == 2:
+                product["table"][cells[0].text.strip()] = cells[1].text.strip()
+    except Exception:
+        pass
+    product["images"] = first_text(driver, "#landingImage", "data-a-dynamic-image")
+    for review in driver.find_elements(By.CSS_SELECTOR, "li.review"):
+        product["reviews"].append({
+            "title": (first_text(review, "a[data-hook='review-title']")
+                      or first_text(review, "span[data-hook='review-title']")),
+            "text": first_text(review, "span[data-hook='review-body']"),
+            "author": first_text(review, "span.a-profile-name"),
+            "date": first_text(review, "span[data-hook='review-date']"),
+        })
+    return product
+
+
+def extract_with_snapshot(driver):
+    """Cách mới: một lần lấy page_source rồi parse toàn bộ bằng lxml/soupsieve"""
+    soup = make_soup(driver.page_source)
+    return parse_detail_fields(soup, parse_basic_fields(soup))
+
+
+def time_calls(func, iterations):
+    durations = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+def report(name, durations):
+    durations = sorted(durations)
+    p95 = durations[min(len(durations) - 1, int(round(0.95 * (len(durations) - 1))))]
+    print(f"{name:<32} median {statistics.median(durations) * 1000:9.2f} ms   "
+          f"p95 {p95 * 1000:9.2f} ms   n={len(durations)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark product page extraction strategies")
+    parser.add_argument("--fixture", default=os.path.join(FIXTURES_DIR, "product_page.html"))
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--skip-browser", action="store_true",
+                        help="Chỉ đo phần parse HTML, không khởi động Chrome")
+    args = parser.parse_args()
+
+    with open(args.fixture, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    durations, product = time_calls(lambda: parse_product_html(html), args.iterations)
+    print(f"Fixture: {args.fixture} ({len(html) / 1024:.1f} KB, {len(product['reviews'])} reviews)")
+    report("parse_product_html (in-process)", durations)
+
+    if args.skip_browser:
+        return
+
+    from helper.crawl_selenium import setup_driver
+
+    driver = setup_driver(headless=True)
+    try:
+        driver.get("file://" + os.path.abspath(args.fixture))
+        report("find_element per field", time_calls(lambda: extract_with_webdriver(driver), args.iterations)[0])
+        report("page_source snapshot + parse", time_calls(lambda: extract_with_snapshot(driver), args.iterations)[0])
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: số frame và số byte gửi tới trình duyệt khi stream một câu trả lời,
+vẽ lại sau mỗi chunk (cách cũ) so với components.streaming_renderer
+
+Không cần Streamlit hay OpenAI: placeholder và stream đều được giả lập, thời gian
+được mô phỏng theo tốc độ sinh token.
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_streaming
+    python -m benchmarks.bench_streaming --chars 8000 --tokens-per-second 80
+"""
+import argparse
+import random
+
+from components.streaming_renderer import StreamingRenderer
+
+
+class RecordingPlaceholder:
+    """Thay cho st.empty(): chỉ ghi lại số lần và số byte được vẽ"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def markdown(self, body, unsafe_allow_html=False):
+        self.frames += 1
+        self.bytes += len(body.encode("utf-8"))
+
+    def empty(self):
+        pass
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_chunks(total_chars, seed=0):
+    """Sinh các chunk cỡ token (1-8 ký tự), có ngắt đoạn giống câu trả lời thật"""
+    rng = random.Random(seed)
+    words = ["sản", "phẩm", "này", "có", "chất", "lượng", "tốt", "giá", "hợp", "lý", "pin", "bền",
+             "người", "dùng", "đánh", "giá", "cao", "tuy", "nhiên", "một", "số", "phàn", "nàn"]
+    chunks = []
+    length = 0
+    while length < total_chars:
+        chunk = " " + rng.choice(words)
+        if rng.random() < 0.02:
+            chunk += ".\n\n"
+        chunks.append(chunk)
+        length += len(chunk)
+    return chunks
+
+
+def run(chunks, tokens_per_second, **renderer_kwargs):
+    clock = SimulatedClock()
+    placeholders = [RecordingPlaceholder()]
+
+    def new_placeholder():
+        placeholders.append(RecordingPlaceholder())
+        return placeholders[-1]
+
+    renderer = StreamingRenderer(placeholders[0], new_placeholder=new_placeholder, clock=clock, **renderer_kwargs)
+    for chunk in chunks:
+        clock.now += 1.0 / tokens_per_second
+        renderer.feed(chunk)
+    renderer.finish()
+    return renderer, placeholders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming chat rendering")
+    parser.add_argument("--chars", type=int, default=4000, help="Độ dài câu trả lời (ký tự)")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--max-chars", type=int, default=200)
+    parser.add_argument("--segment-chars", type=int, default=1500)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chars)
+    renderer, placeholders = run(chunks, args.tokens_per_second, interval=args.interval,
+                                 max_chars=args.max_chars, segment_chars=args.segment_chars)
+    stats = renderer.stats
+    print(f"Answer: {stats['chars']} chars in {stats['chunks']} chunks at {args.tokens_per_second:g} tokens/s")
+    print(f"{'per-chunk redraw':<20} frames {stats['chunks']:6d}   bytes {stats['naive_bytes'] / 1024:10.1f} KB")
+    print(f"{'coalesced renderer':<20} frames {stats['frames']:6d}   bytes {stats['bytes'] / 1024:10.1f} KB   "
+          f"placeholders {len(placeholders)}")
+    print(f"Reduction: {stats['chunks'] / max(stats['frames'], 1):.1f}x frames, "
+          f"{stats['naive_bytes'] / max(stats['bytes'], 1):.1f}x bytes")
+
+
+if __name__ == "__main__":
+    main()
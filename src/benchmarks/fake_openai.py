@@ -0,0 +1,180 @@
+"""
+Máy chủ giả lập API OpenAI (chat.completions và responses) cho benchmark offline
+
+Độ trễ tới token đầu tiên (ttft) và tốc độ sinh token được cấu hình, nên benchmark đo
+được chi phí phía ứng dụng (client, cache, stream, render) mà không cần mạng hay API key.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("sản phẩm này có chất lượng tốt giá hợp lý người dùng đánh giá cao về độ bền "
+         "tuy nhiên một số phàn nàn về bộ lọc và thời gian giữ nhiệt").split()
+
+
+def _estimate_tokens(payload):
+    return max(1, len(json.dumps(payload, ensure_ascii=False)) // 4)
+
+
+class FakeOpenAIServer:
+    """Máy chủ tương thích OpenAI chạy trong thread nền, base_url dùng cho OPENAI_BASE_URL"""
+
+    def __init__(self, ttft=0.2, tokens_per_second=50.0, response_tokens=120):
+        """
+        Args:
+            ttft (float): Thời gian (giây) trước khi trả token đầu tiên
+            tokens_per_second (float): Tốc độ sinh token (0 = không giới hạn)
+            response_tokens (int): Số token của mỗi câu trả lời
+        """
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def _tokens(self):
+        return [(" " if i else "") + WORDS[i % len(WORDS)] for i in range(self.response_tokens)]
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _generation_time(self):
+        return self.ttft + self._token_delay() * self.response_tokens
+
+    def chat_completion(self, request):
+        tokens = self._tokens()
+        prompt_tokens = _estimate_tokens(request.get("messages", []))
+        time.sleep(self._generation_time())
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                      "total_tokens": prompt_tokens + len(tokens)},
+        }
+
+    def chat_completion_events(self, request):
+        """Sinh các event SSE của một chat completion stream"""
+        model = request.get("model", "gpt-4o-mini")
+        created = int(time.time())
+        tokens = self._tokens()
+
+        def chunk(delta, finish_reason=None):
+            return {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        time.sleep(self.ttft)
+        yield chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            time.sleep(self._token_delay())
+            yield chunk({"content": token})
+        yield chunk({}, "stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            prompt_tokens = _estimate_tokens(request.get("messages", []))
+            yield {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": created, "model": model,
+                   "choices": [], "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                                            "total_tokens": prompt_tokens + len(tokens)}}
+
+    def response(self, request):
+        """Kết quả Responses API với file_search: output[0] là lời gọi tool, output[1] là message"""
+        tokens = self._tokens()
+        input_tokens = _estimate_tokens(request.get("input", ""))
+        time.sleep(self._generation_time())
+        return {
+            "id": "resp_bench",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": request.get("model", "gpt-4o-mini"),
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": request.get("tools", []),
+            "output": [
+                {"type": "file_search_call", "id": "fs_bench", "status": "completed",
+                 "queries": [request.get("input", "")], "results": None},
+                {"type": "message", "id": "msg_bench", "role": "assistant", "status": "completed",
+                 "content": [{"type": "output_text", "text": "".join(tokens), "annotations": []}]},
+            ],
+            "usage": {"input_tokens": input_tokens, "output_tokens": len(tokens),
+                      "total_tokens": input_tokens + len(tokens),
+                      "input_tokens_details": {"cached_tokens": 0},
+                      "output_tokens_details": {"reasoning_tokens": 0}},
+        }
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path.split("?")[0].rstrip("/")
+                if path.endswith("/chat/completions"):
+                    if request.get("stream"):
+                        server._count("chat_stream")
+                        self.send_response(200)
+                        self.send_header("Content-Type", "text/event-stream")
+                        self.send_header("Connection", "close")
+                        self.end_headers()
+                        self.close_connection = True
+                        for event in server.chat_completion_events(request):
+                            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                            self.wfile.flush()
+                        self.wfile.write(b"data: [DONE]\n\n")
+                        self.wfile.flush()
+                        return
+                    server._count("chat")
+                    self._send_json(200, server.chat_completion(request))
+                    return
+                if path.endswith("/responses"):
+                    server._count("responses")
+                    self._send_json(200, server.response(request))
+                    return
+                server._count("not_found")
+                self._send_json(404, {"error": {"message": f"Unknown route {self.path}", "type": "invalid_request_error"}})
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
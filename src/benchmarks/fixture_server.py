@@ -0,0 +1,190 @@
+"""
+Máy chủ HTTP cục bộ phục vụ các trang Amazon đã lưu (benchmarks/fixtures) cho benchmark offline
+
+Các route (mọi ASIN đều hợp lệ):
+    /dp/<ASIN>                              trang sản phẩm (product_page.html) kèm ảnh, font, media,
+                                            CSS, script và script quảng cáo "bên thứ ba" như trang thật
+    /static/<ASIN>/<tài nguyên>             tài nguyên của trang sản phẩm (FIXTURE_ASSETS)
+    /product-reviews/<ASIN>/?pageNumber=N   trang reviews thứ N (reviews_page.html), rỗng khi N > review_pages
+    /captcha/dp/<ASIN>                      trang captcha (captcha_page.html)
+    /captcha/<ASIN>.jpg                     ảnh captcha sinh bằng Pillow
+    /errors/validateCaptcha?amzn-r=<path>   chuyển hướng về trang gốc sau khi "giải" captcha
+"""
+import io
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+REVIEW_ITEM_PATTERN = re.compile(r"    <li id=\"R__PAGE__.*?\n    </li>\n", re.S)
+
+# Tài nguyên của trang sản phẩm: tên -> (content type, kích thước byte), xấp xỉ tỉ lệ trên trang thật
+FIXTURE_ASSETS = {
+    "site.css": ("text/css", 30_000),
+    "app.js": ("application/javascript", 120_000),
+    "amazon-adsystem.com/apstag.js": ("application/javascript", 40_000),
+    "ember.woff2": ("font/woff2", 60_000),
+    "hero.jpg": ("image/jpeg", 200_000),
+    "promo.mp4": ("video/mp4", 500_000),
+}
+# URL chứa ASIN để mỗi lần tải đều là cold load, không phụ thuộc cache của trình duyệt
+ASSET_HEAD_HTML = """<link rel="stylesheet" href="/static/__ASIN__/site.css">
+<script async src="/static/__ASIN__/app.js"></script>
+<script async src="/static/__ASIN__/amazon-adsystem.com/apstag.js"></script>
+</head>"""
+ASSET_BODY_HTML = """<img alt="" src="/static/__ASIN__/hero.jpg">
+<video src="/static/__ASIN__/promo.mp4" preload="auto" muted></video>
+</body>"""
+
+
+def _read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _captcha_image(text="BENCHX"):
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (200, 70), "white")
+    ImageDraw.Draw(image).text((30, 25), text, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _asset_body(name, size):
+    if name.endswith(".css"):
+        # Font được tham chiếu từ CSS như trên trang thật
+        rule = "@font-face{font-family:Ember;src:url(ember.woff2)}body{font-family:Ember,sans-serif}"
+        return (rule + "/*" + "x" * max(0, size - len(rule) - 4) + "*/").encode("utf-8")
+    if name.endswith(".js"):
+        code = "window.__fixtureScripts=(window.__fixtureScripts||0)+1;"
+        return (code + "//" + "x" * max(0, size - len(code) - 2)).encode("utf-8")
+    return bytes(size)
+
+
+class FixtureServer:
+    """Máy chủ fixture chạy trong thread nền trên một cổng ngẫu nhiên của 127.0.0.1"""
+
+    def __init__(self, latency=0.0, review_pages=3, assets=True):
+        """
+        Args:
+            latency (float): Độ trễ (giây) thêm vào mỗi response, mô phỏng mạng
+            review_pages (int): Số trang reviews có dữ liệu cho mỗi biến thể sort/filter
+            assets (bool): Thêm ảnh/font/media/CSS/script vào trang sản phẩm
+        """
+        self.latency = latency
+        self.review_pages = review_pages
+        self.product_html = _read_fixture("product_page.html")
+        if assets:
+            self.product_html = (self.product_html.replace("</head>", ASSET_HEAD_HTML, 1)
+                                 .replace("</body>", ASSET_BODY_HTML, 1))
+        self._assets = {}
+        self.reviews_html = _read_fixture("reviews_page.html")
+        self.empty_reviews_html = REVIEW_ITEM_PATTERN.sub("", self.reviews_html)
+        self.captcha_html = _read_fixture("captcha_page.html")
+        self._captcha_jpeg = None
+        self.requests = {}
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def product_url(self, product_id):
+        return f"{self.base_url}/dp/{product_id}"
+
+    def captcha_url(self, product_id):
+        return f"{self.base_url}/captcha/dp/{product_id}"
+
+    def _count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def _sent(self, size):
+        with self._lock:
+            self.bytes_sent += size
+
+    def _route(self, path, query):
+        """Trả về (status, content_type, body, headers) cho một request GET"""
+        parts = [part for part in path.split("/") if part]
+        if len(parts) == 2 and parts[0] == "dp":
+            self._count("product")
+            return 200, "text/html; charset=utf-8", self.product_html.replace("__ASIN__", parts[1]), {}
+        if len(parts) >= 3 and parts[0] == "static" and "/".join(parts[2:]) in FIXTURE_ASSETS:
+            name = "/".join(parts[2:])
+            self._count("asset")
+            content_type, size = FIXTURE_ASSETS[name]
+            if name not in self._assets:
+                self._assets[name] = _asset_body(name, size)
+            return 200, content_type, self._assets[name], {}
+        if len(parts) == 2 and parts[0] == "product-reviews":
+            self._count("reviews")
+            page = int(query.get("pageNumber", ["1"])[0])
+            template = self.reviews_html if page <= self.review_pages else self.empty_reviews_html
+            body = (template.replace("__PAGE__", f"{page:03d}").replace("__ASIN__", parts[1])
+                    .replace("__NEXT_PAGE__", str(page + 1)))
+            return 200, "text/html; charset=utf-8", body, {}
+        if len(parts) == 3 and parts[:2] == ["captcha", "dp"]:
+            self._count("captcha")
+            return 200, "text/html; charset=utf-8", self.captcha_html.replace("__ASIN__", parts[2]), {}
+        if len(parts) == 2 and parts[0] == "captcha" and parts[1].endswith(".jpg"):
+            self._count("captcha_image")
+            if self._captcha_jpeg is None:
+                self._captcha_jpeg = _captcha_image()
+            return 200, "image/jpeg", self._captcha_jpeg, {}
+        if path == "/errors/validateCaptcha":
+            self._count("validate_captcha")
+            return 302, "text/plain", "", {"Location": query.get("amzn-r", ["/"])[0]}
+        self._count("not_found")
+        return 404, "text/html; charset=utf-8", "<html><head><title>Page Not Found</title></head></html>", {}
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                parsed = urlparse(self.path)
+                status, content_type, body, headers = server._route(parsed.path, parse_qs(parsed.query))
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                server._sent(len(body))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,130 @@
+import time
+
+# Khung bong bóng tin nhắn của bot, dựng một lần và chỉ ghép nội dung vào giữa
+ASSISTANT_BUBBLE_PREFIX = (
+    "<div style='margin: 10px; display: flex; align-items: flex-start;'>"
+    "<div style='width: 36px; height: 36px; border-radius: 50%; background-color: #4285F4; color: white; "
+    "display: flex; justify-content: center; align-items: center; margin-right: 8px; font-weight: bold;'>"
+    "<span>🤖</span></div>"
+    "<div style='display: inline-block; background-color: #F1F0F0; padding: 8px 12px; border-radius: 8px; max-width: 90%;'>\n"
+)
+# Các đoạn tiếp theo của cùng một câu trả lời: không lặp lại avatar, thụt lề cho thẳng hàng
+ASSISTANT_CONTINUATION_PREFIX = (
+    "<div style='margin: 0 10px 10px 54px;'>"
+    "<div style='display: inline-block; background-color: #F1F0F0; padding: 8px 12px; border-radius: 8px; max-width: 90%;'>\n"
+)
+ASSISTANT_BUBBLE_SUFFIX = "\n</div></div>"
+CURSOR = "▌"
+# Số byte UTF-8 của khung một lần vẽ lại toàn bộ câu trả lời (cách cũ), để so sánh
+_NAIVE_FRAME_BYTES = len((ASSISTANT_BUBBLE_PREFIX + CURSOR + ASSISTANT_BUBBLE_SUFFIX).encode("utf-8"))
+
+
+class StreamingRenderer:
+    """
+    Hiển thị câu trả lời dạng stream với số lần cập nhật giới hạn
+
+    Các chunk được gộp lại và chỉ vẽ lại khi đã qua interval giây hoặc có thêm max_chars
+    ký tự. Khi đoạn đang hiển thị dài hơn segment_chars, phần đã hoàn chỉnh (tới ranh
+    giới đoạn văn gần nhất) được "đóng băng" trong placeholder hiện tại và phần còn lại
+    chuyển sang một placeholder mới, nên mỗi lần vẽ chỉ gửi đoạn cuối thay vì toàn bộ
+    câu trả lời.
+    """
+
+    def __init__(self, placeholder, new_placeholder=None, interval=0.05, max_chars=200,
+                 segment_chars=1500, clock=time.monotonic):
+        """
+        Args:
+            placeholder: Phần tử st.empty() dùng cho đoạn đầu tiên
+            new_placeholder (callable, optional): Tạo placeholder cho các đoạn tiếp theo
+                                                  (ví dụ st.empty); None thì không tách đoạn
+            interval (float): Khoảng thời gian tối thiểu (giây) giữa hai lần vẽ
+            max_chars (int): Vẽ ngay khi số ký tự chưa hiển thị đạt ngưỡng này
+            segment_chars (int): Độ dài đoạn đang hiển thị trước khi tách sang placeholder mới
+            clock (callable): Hàm thời gian (thay được khi đo đạc)
+        """
+        self.placeholders = [placeholder]
+        self.new_placeholder = new_placeholder
+        self.interval = interval
+        self.max_chars = max_chars
+        self.segment_chars = segment_chars
+        self.clock = clock
+        self._parts = []
+        self._segment_start = 0  # Vị trí bắt đầu của đoạn đang hiển thị trong câu trả lời
+        self._rendered_length = 0
+        self._last_render = None
+        self.text = ""
+        self._received_bytes = 0  # Tổng số byte UTF-8 của các chunk đã nhận
+        self.stats = {"chunks": 0, "chars": 0, "frames": 0, "bytes": 0, "naive_bytes": 0}
+
+    def _prefix(self):
+        return ASSISTANT_BUBBLE_PREFIX if len(self.placeholders) == 1 else ASSISTANT_CONTINUATION_PREFIX
+
+    def _render(self, text, cursor=True):
+        body = self._prefix() + text + (CURSOR if cursor else "") + ASSISTANT_BUBBLE_SUFFIX
+        self.placeholders[-1].markdown(body, unsafe_allow_html=True)
+        self.stats["frames"] += 1
+        self.stats["bytes"] += len(body.encode("utf-8"))
+
+    def _split_segment(self):
+        """Đóng băng phần đã hoàn chỉnh của đoạn hiện tại và mở placeholder mới cho phần còn lại"""
+        segment = self.text[self._segment_start:]
+        cut = segment.rfind("\n\n", 0, len(segment) - 1)
+        if cut <= 0:
+            return
+        self._render(segment[:cut], cursor=False)
+        self._segment_start += cut + 2
+        self.placeholders.append(self.new_placeholder())
+
+    def feed(self, chunk):
+        """Thêm một chunk từ stream, chỉ vẽ lại khi vượt ngân sách thời gian/ký tự"""
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self.stats["chunks"] += 1
+        self.stats["chars"] += len(chunk)
+        self._received_bytes += len(chunk.encode("utf-8"))
+        # Số byte nếu vẽ lại toàn bộ câu trả lời sau mỗi chunk (cách cũ), để so sánh
+        self.stats["naive_bytes"] += _NAIVE_FRAME_BYTES + self._received_bytes
+
+        now = self.clock()
+        pending = self.stats["chars"] - self._rendered_length
+        if self._last_render is not None and now - self._last_render < self.interval and pending < self.max_chars:
+            return
+        self.flush(now)
+
+    def flush(self, now=None):
+        """Vẽ ngay phần đã nhận (kèm con trỏ)"""
+        if self._parts:
+            self.text += "".join(self._parts)
+            self._parts = []
+        if self.new_placeholder is not None and len(self.text) - self._segment_start > self.segment_chars:
+            self._split_segment()
+        self._render(self.text[self._segment_start:])
+        self._rendered_length = len(self.text)
+        self._last_render = self.clock() if now is None else now
+
+    def finish(self):
+        """
+        Vẽ khung cuối cùng (không có con trỏ)
+
+        Returns:
+            str: Toàn bộ câu trả lời
+        """
+        if self._parts:
+            self.text += "".join(self._parts)
+            self._parts = []
+        self._render(self.text[self._segment_start:], cursor=False)
+        self._rendered_length = len(self.text)
+        return self.text
+
+    def clear(self):
+        for placeholder in self.placeholders:
+            placeholder.empty()
+
+    def summary(self):
+        """Chuỗi mô tả số frame và số byte đã gửi cho câu trả lời"""
+        stats = self.stats
+        ratio = stats["naive_bytes"] / stats["bytes"] if stats["bytes"] else 0
+        return (f"{stats['chars']} chars in {stats['chunks']} chunks -> {stats['frames']} frames, "
+                f"{stats['bytes'] / 1024:.1f} KB rendered (per-chunk redraw: {stats['naive_bytes'] / 1024:.1f} KB, "
+                f"{ratio:.1f}x)")
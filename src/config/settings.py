@@ -5,4 +5,85 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Get OpenAI API key from environment variables
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
\ No newline at end of file
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Endpoint tương thích OpenAI (để trống = API chính thức; dùng cho benchmark offline)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Cấu hình pool Chrome WebDriver dùng chung cho việc scrape
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES", "50"))
+DRIVER_MAX_RSS_MB = int(os.getenv("DRIVER_MAX_RSS_MB", "1024"))
+DRIVER_CHECKOUT_TIMEOUT = float(os.getenv("DRIVER_CHECKOUT_TIMEOUT", "120"))
+# Profile trình duyệt: "lean" chặn ảnh/font/media/CSS và script bên thứ ba, "full" tải đầy đủ trang
+DRIVER_PROFILE = os.getenv("DRIVER_PROFILE", "lean").lower()
+# Pattern chặn thêm / pattern được giữ lại trong profile lean (phân tách bằng dấu phẩy)
+DRIVER_BLOCK_URLS = [p.strip() for p in os.getenv("DRIVER_BLOCK_URLS", "").split(",") if p.strip()]
+DRIVER_ALLOW_URLS = [p.strip() for p in os.getenv("DRIVER_ALLOW_URLS", "").split(",") if p.strip()]
+
+# Thử lấy trang bằng requests trước, chỉ dùng Selenium khi bị chặn hoặc thiếu dữ liệu
+HTTP_FIRST = os.getenv("HTTP_FIRST", "true").lower() in ("1", "true", "yes")
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+# Cache kết quả scrape theo ASIN trên đĩa (SQLite)
+SCRAPE_CACHE_ENABLED = os.getenv("SCRAPE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", "")
+SCRAPE_CACHE_VOLATILE_TTL = float(os.getenv("SCRAPE_CACHE_VOLATILE_TTL", "3600"))
+SCRAPE_CACHE_STABLE_TTL = float(os.getenv("SCRAPE_CACHE_STABLE_TTL", "604800"))
+SCRAPE_CACHE_MAX_STALE = float(os.getenv("SCRAPE_CACHE_MAX_STALE", "2592000"))
+
+# Crawl thêm reviews từ các trang /product-reviews/<ASIN> (0 để tắt)
+REVIEW_CRAWL_PAGES = int(os.getenv("REVIEW_CRAWL_PAGES", "5"))
+REVIEW_CRAWL_CONCURRENCY = int(os.getenv("REVIEW_CRAWL_CONCURRENCY", "4"))
+
+# Số reviews liên quan nhất gửi kèm mỗi câu hỏi trong chat
+REVIEW_TOP_K = int(os.getenv("REVIEW_TOP_K", "8"))
+
+# Ngân sách token cho lịch sử chat gửi lên API mỗi lượt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+
+# Cache câu trả lời LLM cho các prompt xác định (LLM_CACHE_PATH rỗng = chỉ giữ trong bộ nhớ)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+
+# Cache câu trả lời chat theo độ tương đồng câu hỏi (bật trong sidebar), cho câu hỏi đầu tiên của hội thoại,
+# khoá theo sản phẩm, model và system prefix; so khớp trên các từ mang nội dung của câu hỏi
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+
+# Thời gian tối đa (giây) cho toàn bộ quá trình Scrape + tóm tắt
+SCRAPE_DEADLINE = float(os.getenv("SCRAPE_DEADLINE", "180"))
+
+# Hàng đợi job Scrape chạy nền: số worker, số job đồng thời trên mỗi host, thời gian giữ job đã xong (giây)
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "4"))
+SCRAPE_JOBS_PER_HOST = int(os.getenv("SCRAPE_JOBS_PER_HOST", "2"))
+SCRAPE_JOB_RETENTION = float(os.getenv("SCRAPE_JOB_RETENTION", "600"))
+# Chu kỳ (giây) UI đọc lại trạng thái job
+SCRAPE_POLL_INTERVAL = float(os.getenv("SCRAPE_POLL_INTERVAL", "1"))
+
+# Dung lượng tối đa (MB) của kho sản phẩm dùng chung giữa các session (LRU)
+PRODUCT_STORE_MAX_MB = float(os.getenv("PRODUCT_STORE_MAX_MB", "256"))
+
+# Tracing thời gian từng bước scrape (TRACE_JSONL_PATH rỗng = không ghi file, TRACE_METRICS_PORT 0 = tắt /metrics)
+# File JSONL được xoay vòng (giữ một bản <path>.1) khi vượt TRACE_JSONL_MAX_MB
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "")
+TRACE_JSONL_MAX_MB = float(os.getenv("TRACE_JSONL_MAX_MB", "50"))
+TRACE_METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT", "0"))
+
+# Cửa sổ (giây) giữ số đo các lời gọi model cho panel telemetry
+LLM_TELEMETRY_WINDOW = float(os.getenv("LLM_TELEMETRY_WINDOW", "3600"))
+
+# Giới hạn tốc độ request theo domain (thay cho sleep ngẫu nhiên trong từng lần tải, 0 = không giới hạn)
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "3"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "6"))
+
+# Lưu cookies/localStorage của phiên duyệt để driver mới không bắt đầu như khách mới
+# (SESSION_STATE_PATH rỗng = src/data/browser_sessions.json)
+SESSION_STATE_ENABLED = os.getenv("SESSION_STATE_ENABLED", "true").lower() in ("1", "true", "yes")
+SESSION_STATE_PATH = os.getenv("SESSION_STATE_PATH", "")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "604800"))
+SESSION_MIN_HEALTH = float(os.getenv("SESSION_MIN_HEALTH", "0.3"))
+# Số lần thử giải captcha tối đa (mỗi lần thử lại dùng captcha mới)
+CAPTCHA_MAX_ATTEMPTS = int(os.getenv("CAPTCHA_MAX_ATTEMPTS", "3"))
@@ -0,0 +1,126 @@
+from utils.tracing import span
+
+# Profile "lean": chỉ tải HTML và script của Amazon; ảnh, font, media, CSS và script
+# quảng cáo/tracking của bên thứ ba bị chặn ngay trong trình duyệt.
+# Việc trích xuất chỉ đọc DOM (page_source) nên không cần các tài nguyên này; ảnh captcha
+# được amazoncaptcha tải riêng bằng requests nên không bị ảnh hưởng.
+LEAN_BLOCKED_URL_PATTERNS = (
+    # Pattern khớp với toàn bộ URL: "*.jpg" không khớp "a.jpg?x=1" (ảnh của Amazon không có query)
+    # Ảnh
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    # Font
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    # Media
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    # Style
+    "*.css",
+    # Quảng cáo, tracking và widget bên thứ ba
+    "*amazon-adsystem.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*facebook.net*",
+    "*fls-na.amazon.com*", "*unagi.amazon.com*", "*device-metrics-us*.amazon.com*",
+)
+
+# Các switch giảm công việc nền của Chrome (không ảnh hưởng tới nội dung trang)
+LEAN_CHROME_ARGUMENTS = (
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--no-first-run",
+)
+
+# Content settings của Chrome: 2 = chặn
+LEAN_CONTENT_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.managed_default_content_settings.media_stream": 2,
+    "profile.managed_default_content_settings.notifications": 2,
+    "profile.managed_default_content_settings.geolocation": 2,
+    "profile.managed_default_content_settings.popups": 2,
+}
+
+# Cửa sổ nhỏ hơn để giảm chi phí layout/paint; trang Amazon vẫn ở layout desktop
+LEAN_WINDOW_SIZE = (1366, 768)
+FULL_WINDOW_SIZE = (1920, 1080)
+
+# Tổng số byte đã tải (tài liệu chính + tài nguyên) và các mốc thời gian của lần điều hướng gần nhất
+_PAGE_WEIGHT_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let bytes = nav ? nav.transferSize : 0;
+for (const entry of resources) { bytes += entry.transferSize || 0; }
+return {
+    transfer_bytes: bytes,
+    resources: resources.length,
+    dom_content_loaded_ms: nav ? nav.domContentLoadedEventEnd - nav.startTime : null,
+    load_ms: nav && nav.loadEventEnd ? nav.loadEventEnd - nav.startTime : null,
+};
+"""
+
+
+def blocked_url_patterns(extra=(), allowed=()):
+    """
+    Danh sách URL pattern bị chặn của profile lean
+
+    Args:
+        extra (iterable): Pattern chặn thêm (ví dụ domain tracking khác)
+        allowed (iterable): Pattern được giữ lại dù nằm trong danh sách mặc định
+                            (ví dụ "*.css" nếu việc trích xuất cần style)
+
+    Returns:
+        list: Các pattern theo cú pháp của Network.setBlockedURLs (* là wildcard)
+    """
+    allowed = set(allowed)
+    patterns = [pattern for pattern in LEAN_BLOCKED_URL_PATTERNS if pattern not in allowed]
+    patterns += [pattern for pattern in extra if pattern not in allowed and pattern not in patterns]
+    return patterns
+
+
+def apply_lean_options(chrome_options):
+    """
+    Cấu hình Options của Chrome cho profile lean (trước khi khởi động trình duyệt)
+
+    - page_load_strategy "eager": driver.get() trả về ngay khi có DOMContentLoaded,
+      không đợi ảnh/iframe; wait_for_page_ready kiểm tra dữ liệu cần trích xuất
+    - Tắt tải ảnh và các content setting không cần thiết
+    """
+    chrome_options.page_load_strategy = "eager"
+    for argument in LEAN_CHROME_ARGUMENTS:
+        chrome_options.add_argument(argument)
+    chrome_options.add_experimental_option("prefs", dict(LEAN_CONTENT_PREFS))
+    return chrome_options
+
+
+def install_request_blocking(driver, patterns):
+    """
+    Chặn các request khớp pattern qua Chrome DevTools Protocol (áp dụng cho mọi trang sau đó)
+
+    Args:
+        driver: Chrome WebDriver vừa khởi động
+        patterns (list): Các URL pattern cần chặn
+
+    Returns:
+        bool: True nếu đã bật chặn request
+    """
+    if not patterns:
+        return False
+    with span("request_blocking", patterns=len(patterns)) as block_span:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+            return True
+        except Exception as e:
+            # Trình duyệt không hỗ trợ CDP: vẫn dùng được, chỉ không chặn request
+            print(f"⚠️ Could not enable request blocking: {e}")
+            block_span.set(outcome="unsupported")
+            return False
+
+
+def page_weight(driver):
+    """
+    Đo trang hiện tại bằng Navigation/Resource Timing của trình duyệt
+
+    Returns:
+        dict: transfer_bytes, resources, dom_content_loaded_ms, load_ms (None nếu trang chưa load xong)
+    """
+    return driver.execute_script(_PAGE_WEIGHT_SCRIPT)
@@ -1,19 +1,34 @@
-from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
 import re
-import json
-import time
-import random
+from urllib.parse import urlparse
 import os
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from helper.handleCaptcha import solve_captcha
-import gc
+from helper.driver_pool import DriverPool
+from helper.product_index import ProductIdIndex
+from helper.parse_html import detect_block, make_soup, parse_basic_fields, parse_detail_fields, parse_product_html
+from helper.review_crawler import ReviewCrawler, merge_reviews
+from helper.scrape_cache import ScrapeCache, BackgroundRefresher, default_cache_path
+from helper.page_wait import wait_for_page_ready, REVIEWS_READY_SELECTOR
+from helper.rate_limiter import DomainRateLimiter
+from helper.single_flight import SingleFlight
+from helper.session_state import SessionStateManager, default_session_path
+from helper.browser_profile import (apply_lean_options, blocked_url_patterns, install_request_blocking,
+                                    LEAN_WINDOW_SIZE, FULL_WINDOW_SIZE)
+from config.settings import DRIVER_POOL_SIZE, DRIVER_MAX_PAGES, DRIVER_MAX_RSS_MB, DRIVER_CHECKOUT_TIMEOUT
+from config.settings import DRIVER_PROFILE, DRIVER_BLOCK_URLS, DRIVER_ALLOW_URLS
+from config.settings import HTTP_FIRST, HTTP_TIMEOUT, HTTP_POOL_SIZE, RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST
+from config.settings import REVIEW_CRAWL_PAGES, REVIEW_CRAWL_CONCURRENCY
+from config.settings import SESSION_STATE_ENABLED, SESSION_STATE_PATH, SESSION_TTL, SESSION_MIN_HEALTH
+from config.settings import (SCRAPE_CACHE_ENABLED, SCRAPE_CACHE_PATH, SCRAPE_CACHE_VOLATILE_TTL,
+                             SCRAPE_CACHE_STABLE_TTL, SCRAPE_CACHE_MAX_STALE)
+from utils.tracing import span, tracer
+import atexit
+import threading
 
 HEADERS = {
     'User-Agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
@@ -49,6 +64,11 @@ def extract_product_id(url):
     
     return None
 
+# Chỉ mục ProductID trong bộ nhớ, chỉ đọc lại file khi mtime thay đổi
+PRODUCT_IDS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'data', 'unique_product_ids.txt')
+_product_id_index = ProductIdIndex(PRODUCT_IDS_FILE)
+
 def is_product_id_in_list(product_id):
     """
     Kiểm tra xem ProductID có trong danh sách unique_product_ids.txt không
@@ -59,23 +79,30 @@ def is_product_id_in_list(product_id):
     Returns:
         bool: True nếu ID có trong danh sách, False nếu không
     """
-    if not product_id:
-        return False
-        
-    # Đường dẫn đến file unique_product_ids.txt
-    file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                           'data', 'unique_product_ids.txt')
-    
-    try:
-        with open(file_path, 'r') as file:
-            product_ids = file.read().splitlines()
-            return product_id in product_ids
-    except Exception as e:
-        print(f"Lỗi khi đọc file unique_product_ids.txt: {str(e)}")
-        return False
+    return product_id in _product_id_index
+
+def filter_known_product_ids(product_ids):
+    """
+    Kiểm tra nhiều ProductID cùng lúc với unique_product_ids.txt
+
+    Args:
+        product_ids (iterable): Danh sách ID sản phẩm
 
-def setup_driver(headless=True):  # Default to headless mode
-    """Setup and return a Chrome webdriver with appropriate options"""
+    Returns:
+        dict: ProductID -> True nếu có trong danh sách
+    """
+    return _product_id_index.contains_many(product_ids)
+
+def setup_driver(headless=True, profile=DRIVER_PROFILE):  # Default to headless mode
+    """
+    Setup and return a Chrome webdriver with appropriate options
+
+    Args:
+        headless (bool): Chạy Chrome không giao diện
+        profile (str): "lean" chặn ảnh/font/media/CSS và script bên thứ ba, dùng page load
+                       strategy "eager"; "full" tải toàn bộ trang như trình duyệt thường
+    """
+    lean = profile == "lean"
     chrome_options = Options()
     
     # Always run headless in Docker environment
@@ -90,231 +117,433 @@ def setup_driver(headless=True):  # Default to headless mode
     # Add some preferences that make detection harder
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option("useAutomationExtension", False)
+    if lean:
+        apply_lean_options(chrome_options)
     
-    try:
-        # Check if running in a Docker environment - use installed chromedriver
-        if os.path.exists("/.dockerenv"):
-            print("Running in Docker environment, using installed chromedriver")
-            driver = webdriver.Chrome(options=chrome_options)
-        else:
-            # Use webdriver-manager to handle driver installation for local development
-            print("Running in local environment, using webdriver-manager")
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-    except Exception as e:
-        print(f"Error setting up Chrome driver: {e}")
-        # Fallback to direct path in Docker
-        print("Falling back to direct chromedriver path")
-        driver = webdriver.Chrome(executable_path="/usr/bin/chromedriver", options=chrome_options)
-    
-    # Set window size to typical desktop
-    driver.set_window_size(1920, 1080)
+    with span("setup_driver", profile=profile) as setup_span:
+        try:
+            # Check if running in a Docker environment - use installed chromedriver
+            if os.path.exists("/.dockerenv"):
+                print("Running in Docker environment, using installed chromedriver")
+                with span("chrome_start"):
+                    driver = webdriver.Chrome(options=chrome_options)
+            else:
+                # Use webdriver-manager to handle driver installation for local development
+                print("Running in local environment, using webdriver-manager")
+                with span("chromedriver_install"):
+                    driver_path = ChromeDriverManager().install()
+                with span("chrome_start"):
+                    driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options)
+        except Exception as e:
+            print(f"Error setting up Chrome driver: {e}")
+            # Fallback to direct path in Docker
+            print("Falling back to direct chromedriver path")
+            setup_span.set(outcome="fallback")
+            with span("chrome_start", fallback=True):
+                driver = webdriver.Chrome(executable_path="/usr/bin/chromedriver", options=chrome_options)
+        
+        if lean:
+            install_request_blocking(driver, blocked_url_patterns(DRIVER_BLOCK_URLS, DRIVER_ALLOW_URLS))
+        # Set window size to typical desktop
+        driver.set_window_size(*(LEAN_WINDOW_SIZE if lean else FULL_WINDOW_SIZE))
     return driver
 
-def get_product_info(url):
-    """Extract basic product information from an Amazon product page using Selenium"""
+_session_manager = None
+if SESSION_STATE_ENABLED:
+    _session_manager = SessionStateManager(SESSION_STATE_PATH or default_session_path(), ttl=SESSION_TTL,
+                                           min_health=SESSION_MIN_HEALTH)
+    tracer.add_collector(_session_manager.render_prometheus)
+
+def get_session_manager():
+    """Quản lý cookies/localStorage của các phiên duyệt, hoặc None nếu bị tắt"""
+    return _session_manager
+
+def _create_pooled_driver():
     driver = setup_driver(headless=True)
+    if _session_manager is not None:
+        # Driver mới tiếp tục một phiên đã lưu thay vì là khách hoàn toàn mới
+        _session_manager.assign(driver)
+    return driver
+
+def _record_browser_page(driver, url, state, solved, ok):
+    """Ghi nhận kết quả tải trang vào phiên của driver; chia sẻ cookies mới với HTTP session sau khi giải captcha"""
+    if _session_manager is None:
+        return
+    _session_manager.record_page(driver, url, captcha=state == "captcha", solved=solved, ok=ok)
+    if solved and _http_session is not None:
+        _session_manager.apply_to_requests(_http_session, urlparse(url).hostname)
+
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+def get_driver_pool():
+    """
+    Trả về pool WebDriver dùng chung cho cả tiến trình (tạo lần đầu khi cần)
+
+    Returns:
+        DriverPool: Pool driver được chia sẻ giữa các session Streamlit
+    """
+    global _driver_pool
+    if _driver_pool is None:
+        with _driver_pool_lock:
+            if _driver_pool is None:
+                _driver_pool = DriverPool(
+                    _create_pooled_driver,
+                    max_size=DRIVER_POOL_SIZE,
+                    max_pages=DRIVER_MAX_PAGES,
+                    max_rss_mb=DRIVER_MAX_RSS_MB,
+                    checkout_timeout=DRIVER_CHECKOUT_TIMEOUT,
+                    on_destroy=_session_manager.release if _session_manager is not None else None,
+                )
+                atexit.register(_driver_pool.close)
+                # Khởi động sẵn driver ở nền để lần scrape đầu tiên không phải chờ Chrome
+                threading.Thread(target=_prewarm_driver_pool, args=(_driver_pool,), daemon=True).start()
+    return _driver_pool
+
+def _prewarm_driver_pool(pool):
     try:
-        driver.get(url)
-        time.sleep(random.uniform(3, 5))  # Random delay to mimic human behavior
-        
-        # Check if we hit a CAPTCHA and try to solve it
-        if solve_captcha(driver):
-            print("🔄 Continuing after captcha solution...")
-            time.sleep(3)  # Wait a bit for the page to fully load
+        pool.prewarm()
+    except Exception as e:
+        print(f"⚠️ Error prewarming Chrome driver pool: {e}")
 
-        # Product dictionary to store all information
-        product = {}
-        
-        # Get product title
-        try:
-            title_element = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.ID, "productTitle"))
-            )
-            product["title"] = title_element.text.strip()
-        except:
-            product["title"] = "Title not found"
-        
-        # Get product price
-        try:
-            price_element = driver.find_element(By.CSS_SELECTOR, ".a-offscreen")
-            product["price"] = price_element.get_attribute("innerText")
-        except:
-            product["price"] = "Price not found"
-        
-        # Get product rating
-        try:
-            rating_element = driver.find_element(By.CSS_SELECTOR, ".a-icon-alt")
-            product["rating"] = rating_element.get_attribute("innerText")
-        except:
-            product["rating"] = "Rating not found"
-        
-        # Get number of reviews
-        try:
-            review_count_element = driver.find_element(By.ID, "acrCustomerReviewText")
-            product["review_count"] = review_count_element.text
-        except:
-            product["review_count"] = "Review count not found"
-        
-        # Get product description
-        try:
-            description_element = driver.find_element(By.ID, "feature-bullets")
-            product["description"] = description_element.text
-        except:
-            product["description"] = "Description not found"
+_http_session = None
+_http_session_lock = threading.Lock()
 
-        # Get any information from table (if available) <table class="a-normal a-spacing-micro">
-        try:
-            product["table"] = {}  # Initialize the table dictionary
-            table_element = driver.find_element(By.CSS_SELECTOR, ".a-normal.a-spacing-micro")
-            table_rows = table_element.find_elements(By.TAG_NAME, "tr")
-            for row in table_rows:
-                cells = row.find_elements(By.TAG_NAME, "td")
-                if len(cells) == 2:
-                    key = cells[0].text.strip()
-                    value = cells[1].text.strip()
-                    product["table"][key] = value
-        except:
-            product["table"] = {}  # Ensure table key exists even if there's an error
-        
-        # Get product images
-        try:
-            img_element = driver.find_element(By.ID, "landingImage")
-            img_data = img_element.get_attribute('data-a-dynamic-image')
-            if img_data:
-                img_urls = json.loads(img_data)
-                product["images"] = list(img_urls.keys())
-            else:
-                product["images"] = [img_element.get_attribute('src')]
-        except:
-            product["images"] = []
+def get_http_session():
+    """
+    Trả về requests.Session dùng chung (keep-alive, connection pool) cho việc fetch HTML
 
-        # Get reviews <li id="" data-hook="review" class="review aok-relative">
+    Returns:
+        requests.Session: Session đã cấu hình headers của trình duyệt
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                # requests chỉ giải nén được gzip/deflate, không gửi br/zstd để tránh nhận nội dung không đọc được
+                session.headers["accept-encoding"] = "gzip, deflate"
+                session.headers["accept"] = "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                if _session_manager is not None:
+                    # Dùng cookies của phiên trình duyệt khoẻ nhất để không là khách mới
+                    _session_manager.apply_to_requests(session)
+                _http_session = session
+    return _http_session
+
+_rate_limiter = DomainRateLimiter(rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST)
+
+def get_rate_limiter():
+    """Rate limiter theo domain dùng chung cho HTTP, trình duyệt và crawl reviews"""
+    return _rate_limiter
+
+def _missing_fields(product, full):
+    required = {"title": "Title not found"}
+    if full:
+        required["description"] = "Description not found"
+    return [key for key, not_found in required.items() if product.get(key) == not_found]
+
+def fetch_product_http(url, full=True):
+    """
+    Lấy thông tin sản phẩm bằng một request HTTP, không cần trình duyệt
+
+    Args:
+        url (str): URL của sản phẩm Amazon
+        full (bool): True để lấy thêm table, images và reviews
+
+    Returns:
+        dict: Thông tin sản phẩm, hoặc None nếu gặp captcha/trang bị chặn/thiếu dữ liệu
+              (khi đó cần chuyển sang Selenium)
+    """
+    with span("http_fetch", full=full) as fetch_span:
         try:
-            product["reviews"] = []  # Initialize the reviews list
-            review_elements = driver.find_elements(By.CSS_SELECTOR, "li.review")
-            print(f"Found {len(review_elements)} reviews")
-            for review in review_elements:
-                review_dict = {}
-                # review_dict["title"] = review.find_element(By.CSS_SELECTOR, "a[data-hook='review-title']").text.strip()
-                # review_dict["rating"] = review.find_element(By.CSS_SELECTOR, "i[data-hook='review-star-rating']").text.strip()
-                # review_dict["text"] = review.find_element(By.CSS_SELECTOR, "span[data-hook='review-body']").text.strip()
-                # review_dict["author"] = review.find_element(By.CSS_SELECTOR, "span.a-profile-name").text.strip()
-                # review_dict["date"] = review.find_element(By.CSS_SELECTOR, "span[data-hook='review-date']").text.strip()
-                # product["reviews"].append(review_dict)
-
-                # For the review title
-                try:
-                    # Try first with anchor tag (original reviews)
-                    try:
-                        title_element = review.find_element(By.CSS_SELECTOR, "a[data-hook='review-title']")
-                        review_dict["title"] = title_element.text.strip()
-                    except:
-                        # If not found, try with span (reviews from other countries)
-                        title_element = review.find_element(By.CSS_SELECTOR, "span[data-hook='review-title']")
-                        review_dict["title"] = title_element.text.strip()
-                except:
-                    review_dict["title"] = "No title"
-
-                # For the review text
-                try:
-                    text_element = review.find_element(By.CSS_SELECTOR, "span[data-hook='review-body']")
-                    review_dict["text"] = text_element.text.strip()
-                except:
-                    review_dict["text"] = "No review text"
-                
-                # For the author
-                try:
-                    author_element = review.find_element(By.CSS_SELECTOR, "span.a-profile-name")
-                    review_dict["author"] = author_element.text.strip()
-                except:
-                    review_dict["author"] = "Anonymous"
-                
-                # For the review date
+            get_rate_limiter().wait(url)
+            response = get_http_session().get(url, timeout=HTTP_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"HTTP fetch error: {e}")
+            fetch_span.set(outcome="error", error=type(e).__name__)
+            return None
+
+        if response.status_code != 200:
+            print(f"HTTP fetch returned status {response.status_code}")
+            fetch_span.set(outcome=f"status_{response.status_code}")
+            return None
+
+        block = detect_block(response.text)
+        if block:
+            print(f"HTTP fetch hit a {block} page")
+            fetch_span.set(outcome=block)
+            if _session_manager is not None:
+                _session_manager.record_http(captcha=block == "captcha", ok=False)
+            return None
+
+        with span("parse_html", full=full):
+            product = parse_product_html(response.text, full=full)
+        missing = _missing_fields(product, full)
+        if _session_manager is not None:
+            _session_manager.record_http(ok=not missing)
+        if missing:
+            print(f"HTTP fetch missing fields: {', '.join(missing)}")
+            fetch_span.set(outcome="missing_fields", missing=missing)
+            return None
+        return product
+
+def scrape_product(url, full=True, on_basic=None, max_retries=2, use_http=HTTP_FIRST):
+    """
+    Scrape sản phẩm Amazon với một lần điều hướng duy nhất
+
+    Trang chỉ được load (và kiểm tra captcha) một lần. Thông tin cơ bản được lấy trước,
+    sau đó nếu full=True thì bảng thông số, hình ảnh và reviews được đọc từ cùng DOM đó.
+
+    Args:
+        url (str): URL của sản phẩm Amazon
+        full (bool): True để lấy đầy đủ (table, images, reviews), False chỉ lấy thông tin cơ bản
+        on_basic (callable, optional): Được gọi với dict thông tin cơ bản ngay khi có,
+                                       trước khi phân tích reviews (dùng cho progress UI)
+        max_retries (int): Số lần thử tối đa khi không tìm thấy title hoặc gặp lỗi
+        use_http (bool): Thử lấy trang bằng requests trước, chỉ dùng Selenium khi cần
+
+    Returns:
+        dict: Thông tin sản phẩm, hoặc dict có key "error" nếu thất bại sau các lần thử
+    """
+    with span("scrape_product", asin=extract_product_id(url), full=full) as scrape_span:
+        if use_http:
+            product = fetch_product_http(url, full=full)
+            if product is not None:
+                print("Successfully retrieved product info over HTTP")
+                scrape_span.set(outcome="http")
+                if on_basic:
+                    on_basic(dict(product))
+                return product
+            print("↪️ Falling back to Selenium")
+
+        last_error = "Failed after retries"
+        for attempt in range(max_retries):
+            pooled = None
+            failed = False
+            with span("scrape_attempt", attempt=attempt + 1) as attempt_span:
                 try:
-                    date_element = review.find_element(By.CSS_SELECTOR, "span[data-hook='review-date']")
-                    review_dict["date"] = date_element.text.strip()
-                except:
-                    review_dict["date"] = "No date"
+                    print(f"Attempt {attempt+1}: Scraping {'full' if full else 'basic'} product info for {url}")
+                    with span("driver_checkout"):
+                        pooled = get_driver_pool().acquire()
+                    driver = pooled.driver
+                    # Giãn cách request theo domain thay vì sleep ngẫu nhiên sau mỗi lần tải
+                    with span("rate_limit"):
+                        get_rate_limiter().wait(url)
+                    with span("driver_get"):
+                        driver.get(url)
 
-                product["reviews"].append(review_dict)
-        except Exception as e:
-            print(f"Error parsing reviews: {str(e)}")
-            product["reviews"] = []  # Ensure reviews key exists even if there's an error
-        
+                    # Đợi tới khi #productTitle (hoặc form captcha) có trong DOM
+                    state = wait_for_page_ready(driver)
+
+                    # Chụp DOM một lần, dùng chung cho việc kiểm tra captcha và trích xuất dữ liệu
+                    with span("page_source"):
+                        page_source = driver.page_source
+
+                    # Check if we hit a CAPTCHA and try to solve it
+                    solved = state == "captcha" and solve_captcha(driver, detected=True)
+                    if solved:
+                        print("🔄 Continuing after captcha solution...")
+                        wait_for_page_ready(driver)
+                        with span("page_source"):
+                            page_source = driver.page_source
+
+                    # Parse toàn bộ trường trong tiến trình thay vì gọi find_element cho từng trường
+                    with span("parse_basic"):
+                        soup = make_soup(page_source)
+                        product = parse_basic_fields(soup)
+                    _record_browser_page(driver, url, state, solved, ok=product.get("title") != "Title not found")
+
+                    if product.get("title") != "Title not found":
+                        if on_basic:
+                            on_basic(dict(product))
+                        if full:
+                            with span("parse_detail"):
+                                parse_detail_fields(soup, product)
+                        print("Successfully retrieved product info")
+                        scrape_span.set(outcome="browser", attempts=attempt + 1)
+                        return product
+
+                    last_error = "Title not found"
+                    attempt_span.set(outcome="title_not_found")
+                    # Nếu attempt đầu tiên không thành công, thử lần nữa (rate limiter giãn cách lần tải lại)
+                    if attempt < max_retries - 1:
+                        print("Attempt failed, will retry...")
+
+                except Exception as e:
+                    failed = True
+                    last_error = str(e)
+                    attempt_span.set(outcome="error", error=type(e).__name__)
+                    print(f"Error in scrape_product (attempt {attempt+1}): {str(e)}")
+                    if attempt < max_retries - 1:
+                        print("Retrying after error...")
+                finally:
+                    if pooled:
+                        get_driver_pool().release(pooled, discard=failed)  # Trả driver về pool thay vì quit()
+
+        scrape_span.set(outcome="failed", attempts=max_retries, error=last_error)
+        return {"error": last_error, "title": "Error retrieving product", "price": "Unknown",
+                "rating": "Not available", "description": "Failed to load product information"}
+
+def fetch_page_source(url):
+    """
+    Tải một URL bằng driver trong pool (giải captcha nếu có) và trả về page_source
+
+    Args:
+        url (str): URL cần tải
+
+    Returns:
+        str: HTML sau khi trình duyệt render
+    """
+    with span("browser_fetch"), get_driver_pool().checkout() as driver:
+        get_rate_limiter().wait(url)
+        with span("driver_get"):
+            driver.get(url)
+        state = wait_for_page_ready(driver, selector=REVIEWS_READY_SELECTOR)
+        page_source = driver.page_source
+        solved = state == "captcha" and solve_captcha(driver, detected=True)
+        if solved:
+            ready = wait_for_page_ready(driver, selector=REVIEWS_READY_SELECTOR)
+            page_source = driver.page_source
+        else:
+            ready = state
+        # "missing" là trang reviews rỗng (đã hết trang), không phải lỗi của phiên
+        _record_browser_page(driver, url, state, solved, ok=ready in ("ready", "missing"))
+        return page_source
+
+def iter_product_reviews(url, max_pages=REVIEW_CRAWL_PAGES, sort_options=("helpful", "recent"), star_filters=(None,)):
+    """
+    Crawl song song các trang /product-reviews/<ASIN> của sản phẩm, trả về từng review khi có
+
+    Args:
+        url (str): URL sản phẩm (dùng để lấy ASIN và domain)
+        max_pages (int): Số trang tối đa cho mỗi biến thể sort/filter
+        sort_options (tuple): Các kiểu sắp xếp ("helpful", "recent")
+        star_filters (tuple): Các bộ lọc sao, None nghĩa là không lọc
+
+    Yields:
+        dict: Review đã bỏ trùng theo review ID
+    """
+    product_id = extract_product_id(url)
+    if not product_id or max_pages <= 0:
+        return
+    parsed = urlparse(url)
+    base_url = f"{parsed.scheme or 'https'}://{parsed.netloc or 'www.amazon.com'}"
+    crawler = ReviewCrawler(get_http_session(), max_workers=REVIEW_CRAWL_CONCURRENCY,
+                            timeout=HTTP_TIMEOUT, fetch_with_browser=fetch_page_source,
+                            rate_limiter=get_rate_limiter())
+    yield from crawler.iter_reviews(base_url, product_id, max_pages=max_pages,
+                                    sort_options=sort_options, star_filters=star_filters)
+
+def _add_crawled_reviews(url, product):
+    """Bổ sung reviews từ các trang product-reviews vào reviews đã lấy trên trang sản phẩm"""
+    if REVIEW_CRAWL_PAGES <= 0:
         return product
-    except Exception as e:
-        return {"error": str(e)}
-    finally:
-        driver.quit()  # Close the browser
-        del driver  # Explicitly delete the driver object
-        gc.collect()
+    with span("review_crawl", max_pages=REVIEW_CRAWL_PAGES) as crawl_span:
+        try:
+            crawled = list(iter_product_reviews(url))
+            product["reviews"] = merge_reviews(product.get("reviews", []), crawled)
+            crawl_span.set(crawled=len(crawled), reviews=len(product["reviews"]))
+            print(f"Collected {len(product['reviews'])} reviews in total")
+        except Exception as e:
+            crawl_span.set(outcome="error", error=type(e).__name__)
+            print(f"Error crawling review pages: {str(e)}")
+    return product
+
+_scrape_cache = None
+_refresher = BackgroundRefresher()
+_scrape_flight = SingleFlight()
+
+def get_scrape_cache():
+    """
+    Trả về cache scrape theo ASIN dùng chung, hoặc None nếu cache bị tắt
+
+    Returns:
+        ScrapeCache: Cache SQLite trên đĩa
+    """
+    global _scrape_cache
+    if not SCRAPE_CACHE_ENABLED:
+        return None
+    if _scrape_cache is None:
+        _scrape_cache = ScrapeCache(
+            SCRAPE_CACHE_PATH or default_cache_path(),
+            volatile_ttl=SCRAPE_CACHE_VOLATILE_TTL,
+            stable_ttl=SCRAPE_CACHE_STABLE_TTL,
+            max_stale=SCRAPE_CACHE_MAX_STALE,
+        )
+    return _scrape_cache
+
+def _refresh_cached_product(url, product_id, full):
+    product = scrape_product(url, full=full)
+    if full and "error" not in product:
+        _add_crawled_reviews(url, product)
+    if "error" not in product:
+        get_scrape_cache().put(product_id, product, full=full)
+        print(f"🔄 Refreshed cached product {product_id}")
+
+def get_cached_product(url, full=True, on_basic=None, force_refresh=False):
+    """
+    Lấy sản phẩm từ cache theo ASIN trước, chỉ scrape khi cache miss
+
+    Entry stale được trả về ngay và làm mới ở nền (stale-while-revalidate) ở cùng độ sâu
+    đã cache; chỉ làm mới thông tin cơ bản nếu chỉ nhóm volatile (price, rating, review_count) hết hạn.
+    Khi cache miss, các request đồng thời cho cùng ASIN dùng chung một lần scrape.
+
+    Args:
+        url (str): URL của sản phẩm Amazon
+        full (bool): True nếu cần table, images và reviews
+        on_basic (callable, optional): Được gọi với thông tin cơ bản ngay khi có
+        force_refresh (bool): Bỏ qua dữ liệu trong cache, luôn scrape lại rồi ghi đè cache
+
+    Returns:
+        dict: Thông tin sản phẩm hoặc dict có key "error"
+    """
+    product_id = extract_product_id(url)
+    with span("get_cached_product", asin=product_id, full=full) as request_span:
+        cache = get_scrape_cache() if product_id else None
+        if cache and not force_refresh:
+            with span("cache_lookup"):
+                product, state, cached_full = cache.get(product_id, full=full)
+            if product is not None:
+                print(f"📦 Scrape cache hit ({state}) for {product_id}")
+                request_span.set(outcome=f"cache_{state}")
+                if state == "stale":
+                    # Làm mới đúng độ sâu đã cache: entry chỉ có thông tin cơ bản không kéo theo crawl reviews
+                    _refresher.schedule(product_id, _refresh_cached_product, url, product_id, cached_full)
+                elif state == "stale_volatile":
+                    _refresher.schedule(product_id, _refresh_cached_product, url, product_id, False)
+                if on_basic:
+                    on_basic(dict(product))
+                return product
+
+        def scrape(emit):
+            product = scrape_product(url, full=full, on_basic=emit)
+            if full and "error" not in product:
+                _add_crawled_reviews(url, product)
+            if cache and "error" not in product:
+                cache.put(product_id, product, full=full)
+            return product
+
+        if not product_id:
+            product = scrape(on_basic or (lambda info: None))
+            request_span.set(outcome="failed" if "error" in product else "scraped")
+            return product
+
+        # Mỗi ASIN chỉ có một lần scrape tại một thời điểm; request chỉ cần thông tin cơ bản
+        # cũng dùng chung lần scrape đầy đủ đang chạy (nếu có)
+        join_key = None if full else (product_id, True)
+        product, shared = _scrape_flight.do_or_join(join_key, (product_id, full), scrape, on_event=on_basic)
+        request_span.set(outcome="failed" if "error" in product else ("shared" if shared else "scraped"))
+        # Mỗi caller nhận bản sao riêng để không sửa chung một dict
+        return dict(product) if shared else product
+
+def get_product_info(url, on_basic=None):
+    """Extract full product information (basic fields, table, images, reviews) from an Amazon product page"""
+    return get_cached_product(url, full=True, on_basic=on_basic)
 
 def get_basic_product_info(url):
     """Extract only basic product information (title, price, rating, description) from an Amazon product page"""
-    max_retries = 2
-    for attempt in range(max_retries):
-        driver = None
-        try:
-            print(f"Attempt {attempt+1}: Getting basic product info for {url}")
-            driver = setup_driver(headless=True)
-            driver.get(url)
-            
-            # Tăng thời gian chờ trong môi trường Docker
-            wait_time = 5 if os.path.exists("/.dockerenv") else 3
-            time.sleep(random.uniform(wait_time, wait_time + 2))
-            
-            # Xử lý CAPTCHA nếu xuất hiện
-            if solve_captcha(driver):
-                print("🔄 Continuing after captcha solution...")
-                time.sleep(3)  # Tăng thời gian chờ sau khi giải captcha
-
-            # Bộ từ điển chỉ chứa thông tin cơ bản
-            product = {}
-            
-            # Thêm WebDriverWait để đảm bảo các element đã load
-            wait = WebDriverWait(driver, 15)  # Tăng timeout lên 15 giây
-            
-            # Lấy tiêu đề sản phẩm
-            try:
-                title_element = wait.until(EC.presence_of_element_located((By.ID, "productTitle")))
-                product["title"] = title_element.text.strip()
-                print(f"Found title: {product['title'][:30]}...")
-            except Exception as e:
-                print(f"Title error: {e}")
-                product["title"] = "Title not found"
-            
-            # Lấy giá sản phẩm với wait
-            try:
-                price_element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".a-offscreen")))
-                product["price"] = price_element.get_attribute("innerText")
-                print(f"Found price: {product['price']}")
-            except Exception as e:
-                print(f"Price error: {e}")
-                product["price"] = "Price not found"
-            
-            # Các phần còn lại tương tự...
-            
-            # Kiểm tra xem đã lấy được thông tin cơ bản chưa
-            if product.get("title") != "Title not found":
-                print("Successfully retrieved basic product info")
-                return product
-                
-            # Nếu attempt đầu tiên không thành công, thử lần nữa
-            if attempt < max_retries - 1:
-                print("First attempt failed, will retry...")
-                time.sleep(2)  # Đợi trước khi thử lại
-                
-        except Exception as e:
-            print(f"Error in get_basic_product_info (attempt {attempt+1}): {str(e)}")
-            if attempt < max_retries - 1:
-                print("Retrying after error...")
-                time.sleep(2)
-        finally:
-            if driver:
-                driver.quit()
-                del driver
-                gc.collect()
-    
-    return {"error": "Failed after retries", "title": "Error retrieving product", "price": "Unknown", 
-            "rating": "Not available", "description": "Failed to load product information"}
\ No newline at end of file
+    return get_cached_product(url, full=False)
@@ -0,0 +1,267 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def _read_proc_children():
+    """
+    Đọc bảng tiến trình từ /proc và trả về map ppid -> [pid]
+
+    Returns:
+        dict: ppid -> danh sách pid con (rỗng nếu không có /proc, ví dụ trên Windows/macOS)
+    """
+    children = {}
+    if not os.path.isdir("/proc"):
+        return children
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+            # Tên tiến trình nằm trong ngoặc và có thể chứa khoảng trắng
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    return children
+
+
+def _read_rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def process_tree_rss_mb(pid):
+    """
+    Tính tổng RSS (MB) của một tiến trình và toàn bộ tiến trình con
+
+    Args:
+        pid (int): PID gốc (chromedriver, Chrome là tiến trình con của nó)
+
+    Returns:
+        float: Tổng RSS tính bằng MB, hoặc None nếu không đo được
+    """
+    if not pid or not os.path.isdir("/proc"):
+        return None
+    children = _read_proc_children()
+    total_kb = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total_kb += _read_rss_kb(current)
+        stack.extend(children.get(current, []))
+    return total_kb / 1024
+
+
+class PooledDriver:
+    """Một WebDriver trong pool cùng với số trang đã xử lý"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.time()
+
+    @property
+    def pid(self):
+        service = getattr(self.driver, "service", None)
+        process = getattr(service, "process", None)
+        return getattr(process, "pid", None)
+
+    def rss_mb(self):
+        return process_tree_rss_mb(self.pid)
+
+
+class DriverPool:
+    """
+    Pool các Chrome WebDriver đã khởi động sẵn, dùng chung giữa các session Streamlit
+
+    Driver được mượn (checkout) và trả lại sau mỗi lần scrape thay vì quit(). Một driver
+    bị thay mới khi đã xử lý max_pages trang, khi cây tiến trình Chrome vượt quá
+    max_rss_mb, khi health check thất bại hoặc khi lần scrape ném ra exception.
+    """
+
+    def __init__(self, factory, max_size=2, max_pages=50, max_rss_mb=1024, checkout_timeout=120, on_destroy=None):
+        """
+        Args:
+            factory (callable): Hàm tạo WebDriver mới (thường là setup_driver)
+            max_size (int): Số driver tối đa tồn tại cùng lúc
+            max_pages (int): Số trang tối đa trước khi driver bị thay mới
+            max_rss_mb (int): Ngưỡng RSS (MB) của Chrome trước khi driver bị thay mới
+            checkout_timeout (float): Thời gian chờ tối đa (giây) để mượn được driver
+            on_destroy (callable, optional): Được gọi với WebDriver trước khi driver bị quit
+        """
+        self.factory = factory
+        self.on_destroy = on_destroy
+        self.max_size = max(1, max_size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.checkout_timeout = checkout_timeout
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.created = 0
+        self.recycled = 0
+
+    def _is_healthy(self, pooled):
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _should_recycle(self, pooled):
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return f"đã xử lý {pooled.pages} trang"
+        if self.max_rss_mb:
+            rss = pooled.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                return f"RSS {rss:.0f}MB vượt ngưỡng {self.max_rss_mb}MB"
+        return None
+
+    def _destroy(self, pooled, recycled=False):
+        if self.on_destroy:
+            try:
+                self.on_destroy(pooled.driver)
+            except Exception as e:
+                print(f"⚠️ Driver destroy callback error: {e}")
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            print(f"⚠️ Error quitting pooled driver: {e}")
+        with self._cond:
+            self._size -= 1
+            # Đếm trong lock như các bộ đếm khác (acquire/release chạy trên nhiều thread)
+            if recycled:
+                self.recycled += 1
+            self._cond.notify()
+
+    def _create(self):
+        try:
+            pooled = PooledDriver(self.factory())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+        return pooled
+
+    def prewarm(self, count=None):
+        """Khởi động trước count driver (mặc định max_size) để lần scrape đầu không phải chờ"""
+        count = self.max_size if count is None else min(count, self.max_size)
+        while True:
+            with self._cond:
+                if self._closed or self._size >= count:
+                    return
+                self._size += 1
+            pooled = self._create()
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def acquire(self, timeout=None):
+        """
+        Mượn một driver từ pool, tạo mới nếu pool chưa đầy
+
+        Args:
+            timeout (float, optional): Thời gian chờ tối đa, mặc định checkout_timeout
+
+        Returns:
+            PooledDriver: Driver đã qua health check
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No Chrome driver available after {timeout}s")
+                    self._cond.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                pooled = self._idle.popleft() if self._idle else None
+                if pooled is None:
+                    self._size += 1
+            if pooled is None:
+                return self._create()
+            if self._is_healthy(pooled):
+                return pooled
+            print("⚠️ Pooled driver failed health check, replacing it")
+            self._destroy(pooled, recycled=True)
+
+    def release(self, pooled, discard=False):
+        """
+        Trả driver về pool hoặc thay mới nếu cần
+
+        Args:
+            pooled (PooledDriver): Driver đã mượn bằng acquire()
+            discard (bool): True để bỏ driver (ví dụ sau khi gặp lỗi WebDriver)
+        """
+        pooled.pages += 1
+        reason = "lỗi trong lúc scrape" if discard else self._should_recycle(pooled)
+        if reason is None and not self._closed:
+            try:
+                # Giải phóng DOM của trang cũ trước khi trả driver về pool
+                pooled.driver.get("about:blank")
+            except Exception:
+                reason = "không thể reset trang"
+        if reason is not None or self._closed:
+            if reason:
+                print(f"♻️ Recycling Chrome driver: {reason}")
+            self._destroy(pooled, recycled=bool(reason))
+            return
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """
+        Context manager mượn driver và luôn trả lại, kể cả khi có exception
+
+        Yields:
+            WebDriver: Driver Selenium sẵn sàng sử dụng
+        """
+        pooled = self.acquire(timeout)
+        try:
+            yield pooled.driver
+        except BaseException:
+            self.release(pooled, discard=True)
+            raise
+        else:
+            self.release(pooled)
+
+    def close(self):
+        """Quit toàn bộ driver đang rảnh và ngừng cấp phát driver mới"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for pooled in idle:
+            self._destroy(pooled)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "created": self.created,
+                "recycled": self.recycled,
+            }
@@ -1,46 +1,203 @@
-from amazoncaptcha import AmazonCaptcha
+import threading
 import time
+
+from amazoncaptcha import AmazonCaptcha
 from selenium.webdriver.common.by import By
+from helper.page_wait import wait_for_navigation, CAPTCHA_SELECTOR
+from helper.parse_html import CAPTCHA_TITLE_PATTERN
+from config.settings import CAPTCHA_MAX_ATTEMPTS
+from utils.tracing import span, tracer
+
+# Ảnh captcha nằm trong form validateCaptcha (không lấy nhầm logo/ảnh khác của trang)
+CAPTCHA_IMAGE_SELECTOR = "form[action*='validateCaptcha'] img"
+CAPTCHA_URL_MARKER = "/errors/validatecaptcha"
+
+# Một lần execute_script: URL, tiêu đề và form captcha, không serialize toàn bộ DOM
+_CAPTCHA_STATE_SCRIPT = """
+return [location.href, document.title, !!document.querySelector(arguments[0])];
+"""
+
+
+def is_captcha_page(driver):
+    """
+    Kiểm tra nhanh trình duyệt có đang ở trang captcha không (dựa vào URL, tiêu đề và form captcha)
+
+    Cùng quy tắc với parse_html.detect_block: URL validateCaptcha hoặc tiêu đề "Robot Check" là
+    captcha; trang có tiêu đề riêng (tên sản phẩm) là trang bình thường; trang có tiêu đề chung
+    ("Amazon.com") chỉ là captcha khi có form captcha.
 
-def solve_captcha(driver):
+    Args:
+        driver: Selenium WebDriver
+    Returns:
+        bool: True nếu là trang captcha
+    """
+    url, title, has_form = driver.execute_script(_CAPTCHA_STATE_SCRIPT, CAPTCHA_SELECTOR)
+    if CAPTCHA_URL_MARKER in (url or "").lower():
+        return True
+    title = (title or "").strip().lower()
+    if title and not CAPTCHA_TITLE_PATTERN.match(title):
+        return False
+    return title == "robot check" or bool(has_form)
+
+
+class CaptchaStats:
+    """Thống kê giải captcha: số lần gặp, số lần thử, kết quả, thời gian OCR và thời gian giải"""
+
+    def __init__(self):
+        self.encounters = 0
+        self.attempts = 0
+        self.solved = 0
+        self.failed = 0
+        self.bypassed = 0  # Trang qua được captcha sau khi tải lại mà không cần giải
+        self.unreadable = 0  # OCR không đọc được ảnh, phải lấy captcha mới
+        self.ocr_ms_total = 0.0
+        self.solve_ms_total = 0.0
+        self._lock = threading.Lock()
+
+    def record_attempt(self, ocr_ms, readable):
+        with self._lock:
+            self.attempts += 1
+            self.ocr_ms_total += ocr_ms
+            if not readable:
+                self.unreadable += 1
+
+    def record_result(self, outcome, solve_ms):
+        """
+        Args:
+            outcome (str): "solved", "failed" hoặc "bypassed"
+            solve_ms (float): Tổng thời gian xử lý captcha (ms)
+        """
+        with self._lock:
+            self.encounters += 1
+            self.solve_ms_total += solve_ms
+            if outcome == "solved":
+                self.solved += 1
+            elif outcome == "bypassed":
+                self.bypassed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Số lần gặp/thử/giải được, tỉ lệ thành công và thời gian trung bình (ms)
+                  (success_rate chỉ tính các lần solver thực sự giải hoặc thất bại, không tính "bypassed")
+        """
+        with self._lock:
+            judged = self.solved + self.failed
+            return {
+                "encounters": self.encounters,
+                "attempts": self.attempts,
+                "solved": self.solved,
+                "failed": self.failed,
+                "bypassed": self.bypassed,
+                "unreadable": self.unreadable,
+                "success_rate": round(self.solved / judged, 3) if judged else None,
+                "attempts_per_captcha": round(self.attempts / self.encounters, 2) if self.encounters else None,
+                "ocr_ms_mean": round(self.ocr_ms_total / self.attempts, 1) if self.attempts else None,
+                "solve_ms_mean": round(self.solve_ms_total / self.encounters, 1) if self.encounters else None,
+            }
+
+    def render_prometheus(self):
+        """Xuất số lần giải captcha và thời gian dưới dạng text Prometheus"""
+        stats = self.snapshot()
+        lines = ["# TYPE captcha_encounters_total counter", "# TYPE captcha_attempts_total counter",
+                 "# TYPE captcha_results_total counter", "# TYPE captcha_success_rate gauge",
+                 "# TYPE captcha_ocr_ms_mean gauge", "# TYPE captcha_solve_ms_mean gauge"]
+        lines.append(f"captcha_encounters_total {stats['encounters']}")
+        lines.append(f"captcha_attempts_total {stats['attempts']}")
+        for outcome in ("solved", "failed", "bypassed", "unreadable"):
+            lines.append(f'captcha_results_total{{outcome="{outcome}"}} {stats[outcome]}')
+        for name in ("success_rate", "ocr_ms_mean", "solve_ms_mean"):
+            if stats[name] is not None:
+                lines.append(f"captcha_{name} {stats[name]}")
+        return "\n".join(lines) + "\n"
+
+
+captcha_stats = CaptchaStats()
+tracer.add_collector(captcha_stats.render_prometheus)
+
+
+def _attempt(driver):
+    """
+    Giải captcha đang hiển thị một lần
+
+    Returns:
+        str: "solved", "unreadable" (OCR không đọc được) hoặc "rejected" (vẫn ở trang captcha)
+    """
+    captcha_element = driver.find_element(By.CSS_SELECTOR, CAPTCHA_IMAGE_SELECTOR)
+    captcha_url = captcha_element.get_attribute('src')
+
+    start = time.perf_counter()
+    with span("captcha_ocr"):
+        solution = AmazonCaptcha.fromlink(captcha_url).solve()
+    readable = bool(solution) and solution != "Not solved"
+    captcha_stats.record_attempt((time.perf_counter() - start) * 1000, readable)
+    if not readable:
+        return "unreadable"
+    print(f"✓ Captcha solved: {solution}")
+
+    # Enter the solution and submit the form
+    input_field = driver.find_element(By.ID, "captchacharacters")
+    input_field.send_keys(solution)
+    driver.find_element(By.CLASS_NAME, "a-button-text").click()
+
+    # Đợi trang captcha được thay thế thay vì sleep cố định
+    if not wait_for_navigation(driver, input_field):
+        print("⚠️ Page did not change after submitting captcha")
+        return "rejected"
+    return "rejected" if is_captcha_page(driver) else "solved"
+
+
+def solve_captcha(driver, detected=False, max_attempts=CAPTCHA_MAX_ATTEMPTS):
     """
     Automatically solve Amazon captcha if present
-    Returns: 
-        bool: True if captcha was detected and solved, False otherwise
+    Args:
+        driver: Selenium WebDriver on the page to check
+        detected (bool): Caller đã biết đây là trang captcha (ví dụ wait_for_page_ready trả về "captcha")
+        max_attempts (int): Số lần thử tối đa; mỗi lần thử lại dùng một captcha mới
+    Returns:
+        bool: True if captcha was detected and the page got past it (solved, or bypassed after a refresh)
     """
-    try:
-        # Check if captcha is present
-        if "captcha" in driver.page_source.lower() or "robot" in driver.page_source.lower():
+    with span("solve_captcha") as captcha_span:
+        try:
+            if not detected and not is_captcha_page(driver):
+                captcha_span.set(outcome="none")
+                return False
             print("🔍 Captcha detected! Attempting to solve...")
-            
-            # Find the captcha image
+        except Exception as e:
+            print(f"⚠️ Error in captcha handling: {str(e)}")
+            captcha_span.set(outcome="error", error=type(e).__name__)
+            return False
+
+        start = time.perf_counter()
+        outcome = "failed"
+        attempts = 0
+        while attempts < max(1, max_attempts):
+            attempts += 1
             try:
-                captcha_element = driver.find_element(By.TAG_NAME, "img")
-                captcha_url = captcha_element.get_attribute('src')
-                
-                # Verify it's actually a captcha image URL
-                if 'captcha' in captcha_url.lower():
-                    # Solve the captcha
-                    captcha = AmazonCaptcha.fromlink(captcha_url)
-                    solution = captcha.solve()
-                    
-                    print(f"✓ Captcha solved: {solution}")
-                    
-                    # Enter the solution
-                    input_field = driver.find_element(By.ID, "captchacharacters")
-                    input_field.send_keys(solution)
-                    
-                    # Submit the form
-                    submit_button = driver.find_element(By.CLASS_NAME, "a-button-text")
-                    submit_button.click()
-                    
-                    # Wait for page to load
-                    time.sleep(3)
-                    return True
+                result = _attempt(driver)
             except Exception as e:
                 print(f"⚠️ Error solving captcha: {str(e)}")
-        
-        return False
-    except Exception as e:
-        print(f"⚠️ Error in captcha handling: {str(e)}")
-        return False
\ No newline at end of file
+                captcha_span.set(error=type(e).__name__)
+                break
+            if result == "solved":
+                outcome = "solved"
+                break
+            if attempts < max_attempts:
+                print(f"🔁 Captcha {result}, retrying with a fresh one ({attempts}/{max_attempts})")
+                try:
+                    # Submit sai thì Amazon đã hiển thị captcha mới; OCR không đọc được thì tải lại trang
+                    if result == "unreadable":
+                        driver.refresh()
+                    if not is_captcha_page(driver):
+                        # Amazon trả trang thường sau khi tải lại: qua được nhưng solver không giải gì
+                        outcome = "bypassed"
+                        break
+                except Exception as e:
+                    print(f"⚠️ Error refreshing captcha: {str(e)}")
+                    break
+
+        captcha_stats.record_result(outcome, (time.perf_counter() - start) * 1000)
+        captcha_span.set(outcome=outcome, attempts=attempts)
+        return outcome in ("solved", "bypassed")
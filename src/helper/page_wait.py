@@ -0,0 +1,90 @@
+import time
+
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from utils.tracing import span
+
+# Selector chứng tỏ trang sản phẩm đã có dữ liệu cần trích xuất
+PRODUCT_READY_SELECTOR = "#productTitle"
+REVIEWS_READY_SELECTOR = "li.review, div[data-hook='review'], #cm_cr-review_list"
+CAPTCHA_SELECTOR = "#captchacharacters, form[action*='validateCaptcha']"
+
+# Một lần execute_script cho mỗi lần poll thay vì nhiều lệnh find_element
+_PAGE_STATE_SCRIPT = """
+if (document.readyState === 'loading') { return 'loading'; }
+if (document.querySelector(arguments[1])) { return 'captcha'; }
+if (document.querySelector(arguments[0])) { return 'ready'; }
+return document.readyState === 'complete' ? 'missing' : 'interactive';
+"""
+
+
+def wait_for_page_ready(driver, selector=PRODUCT_READY_SELECTOR, timeout=15, grace=2.0, poll_frequency=0.1):
+    """
+    Đợi tới khi trang có dữ liệu cần trích xuất (hoặc là trang captcha) thay vì sleep cố định
+
+    Điều kiện được kiểm tra mỗi poll_frequency giây: document.readyState khác "loading" và
+    selector (hoặc form captcha) đã có trong DOM. Nếu trang đã "complete" mà vẫn không có
+    selector thì chỉ đợi thêm grace giây (cho nội dung render bằng JS) rồi dừng.
+
+    Args:
+        driver: Selenium WebDriver vừa điều hướng tới trang
+        selector (str): CSS selector của phần tử cần trích xuất
+        timeout (float): Thời gian chờ tối đa (giây)
+        grace (float): Thời gian chờ thêm sau khi trang complete mà chưa có selector
+        poll_frequency (float): Khoảng thời gian giữa hai lần kiểm tra
+
+    Returns:
+        str: "ready", "captcha", "missing" (trang tải xong nhưng không có selector) hoặc "timeout"
+    """
+    completed_at = None
+
+    def page_state(driver):
+        nonlocal completed_at
+        state = driver.execute_script(_PAGE_STATE_SCRIPT, selector, CAPTCHA_SELECTOR)
+        if state in ("ready", "captcha"):
+            return state
+        if state == "missing":
+            completed_at = completed_at or time.monotonic()
+            if time.monotonic() - completed_at >= grace:
+                return state
+        return False
+
+    with span("wait_ready", selector=selector) as wait_span:
+        try:
+            state = WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(page_state)
+        except TimeoutException:
+            state = "timeout"
+            print(f"Page not ready after {timeout}s (waiting for {selector})")
+        wait_span.set(outcome=state)
+        return state
+
+
+def wait_for_navigation(driver, element, timeout=10):
+    """
+    Đợi trang cũ được thay thế sau khi submit form (element cũ bị stale), rồi đợi DOM sẵn sàng
+
+    Args:
+        driver: Selenium WebDriver
+        element: Một phần tử của trang cũ (ví dụ ô nhập captcha)
+        timeout (float): Thời gian chờ tối đa (giây)
+
+    Returns:
+        bool: True nếu đã chuyển sang trang mới
+    """
+    def navigated(_):
+        try:
+            element.is_enabled()
+            return False
+        except StaleElementReferenceException:
+            return True
+
+    with span("wait_navigation") as wait_span:
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.1).until(navigated)
+            WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+                lambda d: d.execute_script("return document.readyState") != "loading")
+            return True
+        except TimeoutException:
+            wait_span.set(outcome="timeout")
+            return False
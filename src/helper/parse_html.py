@@ -0,0 +1,145 @@
+from bs4 import BeautifulSoup
+import json
+import re
+
+# Các dấu hiệu cho thấy Amazon trả về trang captcha/chặn thay vì trang sản phẩm
+CAPTCHA_FORM_PATTERN = re.compile(r"/errors/validateCaptcha|id=[\"']?captchacharacters", re.I)
+# Trang captcha chỉ có tiêu đề chung ("Amazon.com", "Amazon.co.uk", "Robot Check");
+# trang sản phẩm/reviews luôn có tên sản phẩm trong tiêu đề
+CAPTCHA_TITLE_PATTERN = re.compile(r"^(amazon(\.[a-z]{2,3}){1,2}|robot check)$", re.I)
+TITLE_PATTERN = re.compile(r"<title[^>]*>(.*?)</title", re.I | re.S)
+BLOCKED_TITLES = (
+    "robot check",
+    "sorry! something went wrong",
+    "page not found",
+)
+
+def make_soup(html):
+    """
+    Parse HTML một lần bằng lxml để các hàm parse_* dùng chung
+
+    Args:
+        html (str): HTML thô (từ requests hoặc driver.page_source)
+
+    Returns:
+        BeautifulSoup: Cây DOM đã parse, truy vấn bằng CSS selector (soupsieve)
+    """
+    return BeautifulSoup(html, "lxml")
+
+def _text(element, separator=""):
+    return element.get_text(separator, strip=True) if element is not None else None
+
+def detect_block(html):
+    """
+    Kiểm tra HTML có phải trang captcha hoặc trang bị chặn không
+
+    Chỉ đọc thẻ <title> (dừng ở lần khớp đầu tiên, không sao chép/lower toàn bộ HTML).
+    Trang có tiêu đề riêng được coi là trang bình thường ngay; chỉ trang có tiêu đề chung
+    hoặc không có tiêu đề mới được quét tìm form captcha.
+
+    Args:
+        html (str): Nội dung HTML thô
+
+    Returns:
+        str: "captcha", "blocked" hoặc None nếu là trang bình thường
+    """
+    if not html:
+        return "blocked"
+    match = TITLE_PATTERN.search(html)
+    title = match.group(1).strip().lower() if match else None
+    if title is not None and not CAPTCHA_TITLE_PATTERN.match(title):
+        return "blocked" if any(blocked in title for blocked in BLOCKED_TITLES) else None
+    if CAPTCHA_FORM_PATTERN.search(html):
+        return "captcha"
+    if title and any(blocked in title for blocked in BLOCKED_TITLES):
+        return "blocked"
+    return None
+
+def parse_basic_fields(soup):
+    """Lấy title, price, rating, review_count, description từ soup của trang sản phẩm"""
+    return {
+        "title": _text(soup.select_one("#productTitle")) or "Title not found",
+        "price": _text(soup.select_one(".a-offscreen")) or "Price not found",
+        "rating": _text(soup.select_one(".a-icon-alt")) or "Rating not found",
+        "review_count": _text(soup.select_one("#acrCustomerReviewText")) or "Review count not found",
+        "description": _text(soup.select_one("#feature-bullets"), "\n") or "Description not found",
+    }
+
+def parse_table(soup):
+    """Lấy bảng thông số <table class="a-normal a-spacing-micro"> thành dict"""
+    table = {}
+    table_element = soup.select_one(".a-normal.a-spacing-micro")
+    if table_element is None:
+        return table
+    for row in table_element.find_all("tr"):
+        cells = row.find_all("td")
+        if len(cells) == 2:
+            table[_text(cells[0])] = _text(cells[1])
+    return table
+
+def parse_images(soup):
+    """Lấy danh sách URL ảnh từ thuộc tính data-a-dynamic-image của #landingImage"""
+    img_element = soup.select_one("#landingImage")
+    if img_element is None:
+        return []
+    img_data = img_element.get("data-a-dynamic-image")
+    if img_data:
+        try:
+            return list(json.loads(img_data).keys())
+        except ValueError:
+            pass
+    src = img_element.get("src")
+    return [src] if src else []
+
+def _review_title(review):
+    # Anchor với reviews gốc, span với reviews từ các quốc gia khác
+    title_element = (review.select_one("a[data-hook='review-title']")
+                     or review.select_one("span[data-hook='review-title']"))
+    if title_element is None:
+        return None
+    # Bỏ phần "x.0 out of 5 stars" ẩn nằm trong tiêu đề (Selenium không trả về phần này)
+    for hidden in title_element.select(".a-icon-alt, .a-letter-space"):
+        hidden.decompose()
+    return _text(title_element)
+
+def parse_reviews(soup):
+    """
+    Lấy danh sách reviews trên trang sản phẩm (<li class="review">) hoặc trang
+    /product-reviews (<div data-hook="review">)
+    """
+    reviews = []
+    for review in soup.select("li.review, div[data-hook='review']"):
+        reviews.append({
+            "id": review.get("id") or None,
+            "rating": _text(review.select_one("[data-hook='review-star-rating'] .a-icon-alt, "
+                                              "[data-hook='cmps-review-star-rating'] .a-icon-alt")),
+            "title": _review_title(review) or "No title",
+            "text": _text(review.select_one("span[data-hook='review-body']")) or "No review text",
+            "author": _text(review.select_one("span.a-profile-name")) or "Anonymous",
+            "date": _text(review.select_one("span[data-hook='review-date']")) or "No date",
+        })
+    return reviews
+
+def parse_detail_fields(soup, product):
+    """Bổ sung table, images và reviews vào product từ cùng một soup"""
+    product["table"] = parse_table(soup)
+    product["images"] = parse_images(soup)
+    product["reviews"] = parse_reviews(soup)
+    return product
+
+def parse_product_html(html, full=True):
+    """
+    Phân tích trang sản phẩm Amazon từ HTML thô
+
+    Args:
+        html (str): Nội dung HTML của trang sản phẩm
+        full (bool): True để lấy thêm table, images và reviews
+
+    Returns:
+        dict: Thông tin sản phẩm với cùng các key/giá trị mặc định như bản Selenium
+    """
+    soup = make_soup(html)
+    product = parse_basic_fields(soup)
+    if full:
+        parse_detail_fields(soup, product)
+    return product
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+ASIN_LENGTH = 10
+# Signature khi file không stat được (để chỉ log lỗi một lần cho tới khi file xuất hiện lại)
+_MISSING = ("missing",)
+
+
+class _PackedIds:
+    """
+    Danh sách ASIN đã sắp xếp, đóng gói liền nhau trong một bytes (10 byte/ID)
+
+    Tốn ~10 byte mỗi ID thay vì ~60-70 byte của một str trong frozenset,
+    tra cứu bằng binary search.
+    """
+
+    def __init__(self, sorted_ids):
+        self._blob = "".join(sorted_ids).encode("ascii")
+        self._count = len(sorted_ids)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, product_id):
+        if len(product_id) != ASIN_LENGTH or not product_id.isascii():
+            return False
+        key = product_id.encode("ascii")
+        blob = self._blob
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = blob[mid * ASIN_LENGTH:(mid + 1) * ASIN_LENGTH]
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+
+class ProductIdIndex:
+    """
+    Chỉ mục ASIN trong bộ nhớ, đọc từ file một ID mỗi dòng
+
+    File chỉ được đọc lại khi mtime/kích thước thay đổi (kiểm tra tối đa mỗi
+    check_interval giây), nên mỗi lần tra cứu chỉ là một phép kiểm tra membership.
+    """
+
+    def __init__(self, path, check_interval=1.0, packed_threshold=200_000):
+        """
+        Args:
+            path (str): Đường dẫn file danh sách ProductID
+            check_interval (float): Khoảng thời gian tối thiểu giữa hai lần stat() file
+            packed_threshold (int): Từ số lượng ID này trở lên dùng mảng đóng gói thay cho frozenset
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.packed_threshold = packed_threshold
+        self._ids = frozenset()
+        self._signature = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _build(self, raw_ids):
+        ids = {line.strip() for line in raw_ids}
+        ids.discard("")
+        if len(ids) >= self.packed_threshold and all(
+            len(i) == ASIN_LENGTH and i.isascii() for i in ids
+        ):
+            return _PackedIds(sorted(ids))
+        return frozenset(ids)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except OSError as e:
+                if self._signature != _MISSING:
+                    print(f"Lỗi khi đọc file {os.path.basename(self.path)}: {str(e)}")
+                    self._signature = _MISSING
+                return
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature:
+                return
+            # Ghi nhận signature trước khi đọc: file lỗi chỉ được đọc (và log) lại khi nó thay đổi
+            self._signature = signature
+            try:
+                with open(self.path, "r") as file:
+                    self._ids = self._build(file)
+            except Exception as e:
+                print(f"Lỗi khi đọc file {os.path.basename(self.path)}: {str(e)}")
+                return
+            print(f"Loaded {len(self._ids)} product IDs from {os.path.basename(self.path)}")
+
+    def __len__(self):
+        self._refresh()
+        return len(self._ids)
+
+    def __contains__(self, product_id):
+        if not product_id:
+            return False
+        self._refresh()
+        return product_id in self._ids
+
+    def contains_many(self, product_ids):
+        """
+        Kiểm tra nhiều ProductID cùng lúc
+
+        Args:
+            product_ids (iterable): Danh sách ProductID
+
+        Returns:
+            dict: ProductID -> bool
+        """
+        self._refresh()
+        ids = self._ids
+        return {product_id: bool(product_id) and product_id in ids for product_id in product_ids}
@@ -0,0 +1,57 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class DomainRateLimiter:
+    """
+    Giới hạn tốc độ request theo domain (token bucket) cho mọi cách tải trang
+
+    Thay cho các lần sleep ngẫu nhiên trong từng lần fetch: request chỉ phải chờ khi domain
+    đã dùng hết burst, và các thread cùng gọi tới một domain được giãn cách đều nhau.
+    """
+
+    def __init__(self, rate=3.0, burst=6, jitter=0.25, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            rate (float): Số request mỗi giây cho mỗi domain (0 = không giới hạn)
+            burst (int): Số request được gửi liền nhau trước khi phải chờ
+            jitter (float): Tỉ lệ dao động ngẫu nhiên của thời gian chờ (0.25 = ±25%)
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.jitter = jitter
+        self.clock = clock
+        self.sleep = sleep
+        self._buckets = {}  # domain -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def reserve(self, url):
+        """
+        Đặt chỗ cho một request tới domain của url
+
+        Returns:
+            float: Số giây caller cần chờ trước khi gửi request
+        """
+        if not self.rate:
+            return 0.0
+        domain = urlparse(url).netloc or url
+        with self._lock:
+            now = self.clock()
+            tokens, updated_at = self._buckets.get(domain, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate)
+            # Token có thể âm: các request đang xếp hàng đã đặt chỗ trước
+            tokens -= 1.0
+            self._buckets[domain] = (tokens, now)
+        if tokens >= 0:
+            return 0.0
+        delay = -tokens / self.rate
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter) if self.jitter else delay
+
+    def wait(self, url):
+        """Chờ (nếu cần) trước khi gửi request tới url; trả về số giây đã chờ"""
+        delay = self.reserve(url)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
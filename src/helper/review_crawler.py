@@ -0,0 +1,159 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlencode
+
+from helper.parse_html import detect_block, make_soup, parse_reviews
+
+SORT_OPTIONS = ("helpful", "recent")
+STAR_FILTERS = ("five_star", "four_star", "three_star", "two_star", "one_star", "positive", "critical")
+
+
+def build_reviews_url(base_url, product_id, page=1, sort_by="helpful", filter_by_star=None):
+    """
+    Tạo URL trang reviews /product-reviews/<ASIN>
+
+    Args:
+        base_url (str): Scheme + domain, ví dụ https://www.amazon.com
+        product_id (str): ASIN
+        page (int): Số trang (bắt đầu từ 1)
+        sort_by (str): "helpful" hoặc "recent"
+        filter_by_star (str, optional): Một giá trị trong STAR_FILTERS
+
+    Returns:
+        str: URL trang reviews
+    """
+    params = {"reviewerType": "all_reviews", "pageNumber": page, "sortBy": sort_by}
+    if filter_by_star:
+        params["filterByStar"] = filter_by_star
+    return f"{base_url.rstrip('/')}/product-reviews/{product_id}/?{urlencode(params)}"
+
+
+def review_key(review):
+    """Khoá chống trùng: review ID nếu có, ngược lại là hash của tác giả, tiêu đề, ngày và nội dung"""
+    if review.get("id"):
+        return review["id"]
+    raw = "\x1f".join(str(review.get(field, "")) for field in ("author", "title", "date", "text"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def merge_reviews(*review_lists):
+    """Gộp nhiều danh sách reviews, giữ thứ tự xuất hiện đầu tiên và bỏ trùng theo review_key"""
+    seen = set()
+    merged = []
+    for reviews in review_lists:
+        for review in reviews:
+            key = review_key(review)
+            if key not in seen:
+                seen.add(key)
+                merged.append(review)
+    return merged
+
+
+class ReviewCrawler:
+    """
+    Crawl song song nhiều trang /product-reviews/<ASIN> với số request đồng thời giới hạn
+
+    Trang được tải qua requests.Session; trang captcha/bị chặn được chuyển cho
+    fetch_with_browser (nếu có). Mỗi biến thể sort/filter dừng lại ở trang đầu tiên
+    không còn review nào.
+    """
+
+    def __init__(self, session, max_workers=4, timeout=10, fetch_with_browser=None, rate_limiter=None):
+        """
+        Args:
+            session (requests.Session): Session HTTP dùng chung (keep-alive)
+            max_workers (int): Số trang tải đồng thời tối đa
+            timeout (float): Timeout cho mỗi request HTTP
+            fetch_with_browser (callable, optional): url -> page_source, dùng khi HTTP bị chặn
+            rate_limiter (DomainRateLimiter, optional): Giãn cách request HTTP theo domain
+        """
+        self.session = session
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.fetch_with_browser = fetch_with_browser
+        self.rate_limiter = rate_limiter
+
+    def fetch_page(self, url):
+        """
+        Tải và parse một trang reviews
+
+        Returns:
+            list: Danh sách reviews trên trang (rỗng nếu không còn review hoặc tải thất bại)
+        """
+        html = None
+        try:
+            if self.rate_limiter:
+                self.rate_limiter.wait(url)
+            response = self.session.get(url, timeout=self.timeout)
+            if response.status_code == 200 and not detect_block(response.text):
+                html = response.text
+        except Exception as e:
+            print(f"Review page fetch error ({url}): {e}")
+
+        if html is None and self.fetch_with_browser:
+            try:
+                html = self.fetch_with_browser(url)
+            except Exception as e:
+                print(f"Review page browser fetch error ({url}): {e}")
+        if not html or detect_block(html):
+            return []
+        return parse_reviews(make_soup(html))
+
+    def iter_reviews(self, base_url, product_id, max_pages=5, sort_options=("helpful",), star_filters=(None,)):
+        """
+        Crawl reviews và trả về từng review ngay khi trang chứa nó tải xong
+
+        Args:
+            base_url (str): Scheme + domain của trang sản phẩm
+            product_id (str): ASIN
+            max_pages (int): Số trang tối đa cho mỗi biến thể sort/filter
+            sort_options (tuple): Các kiểu sắp xếp cần crawl
+            star_filters (tuple): Các bộ lọc sao (None = không lọc)
+
+        Yields:
+            dict: Review chưa từng xuất hiện (đã bỏ trùng theo review ID)
+        """
+        # Hàng đợi các trang cần tải: mỗi biến thể bắt đầu từ trang 1
+        variants = [(sort_by, star) for sort_by in sort_options for star in star_filters]
+        next_page = {variant: 1 for variant in variants}
+        exhausted = set()
+        seen = set()
+
+        def pending_pages():
+            for variant in variants:
+                if variant not in exhausted and next_page[variant] <= max_pages:
+                    yield variant
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = {}
+            while True:
+                # Giữ tối đa max_workers trang đang tải, xoay vòng giữa các biến thể
+                for variant in pending_pages():
+                    if len(in_flight) >= self.max_workers:
+                        break
+                    page = next_page[variant]
+                    next_page[variant] = page + 1
+                    url = build_reviews_url(base_url, product_id, page, variant[0], variant[1])
+                    in_flight[executor.submit(self.fetch_page, url)] = variant
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    variant = in_flight.pop(future)
+                    reviews = future.result()
+                    new_reviews = 0
+                    for review in reviews:
+                        key = review_key(review)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        new_reviews += 1
+                        yield review
+                    if not reviews or new_reviews == 0:
+                        # Hết review (hoặc Amazon lặp lại trang cuối) cho biến thể này
+                        exhausted.add(variant)
+
+    def crawl(self, base_url, product_id, **kwargs):
+        """Giống iter_reviews nhưng trả về toàn bộ reviews dưới dạng list"""
+        return list(self.iter_reviews(base_url, product_id, **kwargs))
@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Các trường thay đổi thường xuyên, được làm mới với TTL ngắn hơn
+VOLATILE_FIELDS = ("price", "rating", "review_count")
+# Các trường ổn định (title, description, table, images, reviews, ...) dùng TTL dài
+
+
+class ScrapeCache:
+    """
+    Cache kết quả scrape theo ASIN, lưu trên đĩa bằng SQLite
+
+    Mỗi ASIN có hai nhóm trường với TTL riêng: nhóm volatile (giá, điểm, số đánh giá)
+    và nhóm stable (mọi trường còn lại). Entry quá TTL nhưng chưa quá max_stale vẫn
+    được trả về với trạng thái "stale" để caller phục vụ ngay và làm mới ở nền.
+    """
+
+    def __init__(self, path, volatile_ttl=3600, stable_ttl=7 * 86400, max_stale=30 * 86400):
+        """
+        Args:
+            path (str): Đường dẫn file SQLite
+            volatile_ttl (float): TTL (giây) cho price, rating, review_count
+            stable_ttl (float): TTL (giây) cho các trường còn lại
+            max_stale (float): Tuổi tối đa (giây) của entry còn được phục vụ khi đã stale
+        """
+        self.path = path
+        self.volatile_ttl = volatile_ttl
+        self.stable_ttl = stable_ttl
+        self.max_stale = max_stale
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """
+        Đăng ký callback(asin) được gọi khi dữ liệu đã cache của một ASIN thay đổi
+        (dùng để xoá các cache phụ thuộc, ví dụ câu trả lời LLM)
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _notify(self, asin):
+        for callback in list(self._listeners):
+            try:
+                callback(asin)
+            except Exception as e:
+                print(f"⚠️ Scrape cache listener error for {asin}: {e}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        """CREATE TABLE IF NOT EXISTS products (
+                            asin TEXT PRIMARY KEY,
+                            volatile TEXT NOT NULL,
+                            volatile_at REAL NOT NULL,
+                            stable TEXT NOT NULL,
+                            stable_at REAL NOT NULL,
+                            full INTEGER NOT NULL DEFAULT 0
+                        )"""
+                    )
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    def get(self, asin, full=True):
+        """
+        Tra cứu sản phẩm trong cache
+
+        Args:
+            asin (str): ProductID
+            full (bool): True nếu cần bản đầy đủ (có reviews, table, images)
+
+        Returns:
+            tuple: (product, state, is_full) với state là "fresh", "stale" hoặc None khi cache miss.
+                   Khi stale, state cho biết nhóm nào hết hạn: "stale" nếu nhóm stable
+                   hết hạn, "stale_volatile" nếu chỉ nhóm volatile hết hạn. is_full cho biết
+                   entry là bản đầy đủ hay chỉ có thông tin cơ bản.
+        """
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT volatile, volatile_at, stable, stable_at, full FROM products WHERE asin = ?",
+                    (asin,),
+                ).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Scrape cache read error: {e}")
+            return None, None, False
+
+        if row is None:
+            return None, None, False
+        volatile, volatile_at, stable, stable_at, is_full = row
+        if full and not is_full:
+            return None, None, False
+
+        now = time.time()
+        if now - min(volatile_at, stable_at) > self.max_stale:
+            return None, None, False
+
+        product = json.loads(stable)
+        product.update(json.loads(volatile))
+        if now - stable_at > self.stable_ttl:
+            return product, "stale", bool(is_full)
+        if now - volatile_at > self.volatile_ttl:
+            return product, "stale_volatile", bool(is_full)
+        return product, "fresh", bool(is_full)
+
+    def put(self, asin, product, full=True):
+        """
+        Lưu kết quả scrape, gộp với dữ liệu đã có (bản basic không xoá reviews đã cache)
+
+        Args:
+            asin (str): ProductID
+            product (dict): Kết quả từ scrape_product (không chứa key "error")
+            full (bool): True nếu product là bản đầy đủ
+        """
+        now = time.time()
+        volatile = {key: product[key] for key in VOLATILE_FIELDS if key in product}
+        stable = {key: value for key, value in product.items() if key not in VOLATILE_FIELDS}
+        changed = False
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(
+                        "SELECT stable, stable_at, full, volatile FROM products WHERE asin = ?", (asin,)
+                    ).fetchone()
+                    stable_at = now
+                    if row is not None and not full and row[2]:
+                        # Bản basic chỉ làm mới các trường nó có, giữ lại reviews/table/images cũ
+                        merged = json.loads(row[0])
+                        merged.update(stable)
+                        stable, stable_at, full = merged, row[1], True
+                    if row is not None:
+                        changed = json.loads(row[0]) != stable or json.loads(row[3]) != volatile
+                    conn.execute(
+                        "INSERT OR REPLACE INTO products (asin, volatile, volatile_at, stable, stable_at, full) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (asin, json.dumps(volatile, ensure_ascii=False), now,
+                         json.dumps(stable, ensure_ascii=False), stable_at, int(bool(full))),
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Scrape cache write error: {e}")
+            return
+        if changed:
+            self._notify(asin)
+
+    def invalidate(self, asin):
+        """Xoá entry của một ASIN khỏi cache"""
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM products WHERE asin = ?", (asin,))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Scrape cache delete error: {e}")
+        self._notify(asin)
+
+
+class BackgroundRefresher:
+    """Chạy làm mới entry stale ở nền, mỗi ASIN tối đa một lần làm mới cùng lúc"""
+
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, key, func, *args, **kwargs):
+        """
+        Args:
+            key (str): Khoá chống trùng (thường là ASIN)
+            func (callable): Hàm làm mới chạy trong thread nền
+
+        Returns:
+            bool: True nếu đã lên lịch, False nếu key đang được làm mới
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+
+        def run():
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"⚠️ Background refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+def default_cache_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "scrape_cache.db")
@@ -0,0 +1,358 @@
+"""
+Lưu và khôi phục trạng thái phiên duyệt (cookies, localStorage) giữa các driver
+
+Mỗi driver Chrome mới được gán một phiên đã lưu (phiên khoẻ nhất chưa được driver khác
+dùng) thay vì bắt đầu như một khách hoàn toàn mới, nhờ đó Amazon ít hiện captcha hơn.
+Cookies được ghi lại sau khi giải captcha hoặc sau các trang thành công, và cũng được nạp
+vào requests.Session dùng cho fetch HTTP. Mỗi phiên có số trang, số captcha, tỉ lệ captcha
+và điểm sức khoẻ; phiên hết hạn hoặc có điểm thấp sẽ bị bỏ.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from urllib.parse import urlparse
+
+from utils.tracing import span
+
+# Phiên của requests.Session dùng cho fetch HTTP
+HTTP_SESSION_ID = "http"
+
+_LOCAL_STORAGE_SCRIPT = "return JSON.stringify(Object.assign({}, window.localStorage));"
+# Chạy trước mọi script của trang: chỉ đặt các key chưa có để không ghi đè giá trị trang vừa đổi
+_RESTORE_LOCAL_STORAGE_SCRIPT = """
+(function() {
+    if (location.hostname.slice(-%(suffix_length)d) !== %(suffix)s) { return; }
+    var items = %(items)s;
+    try {
+        for (var key in items) {
+            if (window.localStorage.getItem(key) === null) { window.localStorage.setItem(key, items[key]); }
+        }
+    } catch (e) {}
+})();
+"""
+
+
+class BrowserSession:
+    """Trạng thái và số đo của một phiên duyệt"""
+
+    def __init__(self, session_id=None, domain=None, cookies=None, local_storage=None, created_at=None,
+                 updated_at=None, pages=0, captchas=0, solved=0, failures=0):
+        self.session_id = session_id or uuid.uuid4().hex[:10]
+        self.domain = domain
+        self.cookies = cookies or []
+        self.local_storage = local_storage or {}
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+        self.pages = pages
+        self.captchas = captchas
+        self.solved = solved
+        self.failures = failures
+        self.pages_since_capture = 0
+
+    @property
+    def captcha_rate(self):
+        return self.captchas / self.pages if self.pages else 0.0
+
+    @property
+    def health(self):
+        """Điểm 0..1: giảm theo số captcha (nhất là captcha không giải được) và lỗi"""
+        unsolved = self.captchas - self.solved
+        penalty = self.solved + 3 * unsolved + 2 * self.failures
+        return (1 + self.pages) / (1 + self.pages + penalty)
+
+    def to_dict(self):
+        return {
+            "session_id": self.session_id,
+            "domain": self.domain,
+            "cookies": self.cookies,
+            "local_storage": self.local_storage,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "pages": self.pages,
+            "captchas": self.captchas,
+            "solved": self.solved,
+            "failures": self.failures,
+        }
+
+
+class SessionStateManager:
+    """Gán, ghi lại và khôi phục phiên duyệt cho driver và requests.Session"""
+
+    def __init__(self, path=None, ttl=7 * 86400, min_health=0.3, min_pages_for_health=5, capture_every=10):
+        """
+        Args:
+            path (str, optional): File JSON lưu các phiên (None = chỉ giữ trong bộ nhớ)
+            ttl (float): Tuổi tối đa (giây) của một phiên kể từ lần ghi gần nhất
+            min_health (float): Phiên có health thấp hơn ngưỡng này bị bỏ
+            min_pages_for_health (int): Chỉ đánh giá health khi phiên đã tải ít nhất chừng này trang
+            capture_every (int): Ghi lại cookies sau mỗi chừng này trang thành công
+        """
+        self.path = path
+        self.ttl = ttl
+        self.min_health = min_health
+        self.min_pages_for_health = min_pages_for_health
+        self.capture_every = capture_every
+        self._sessions = {}
+        self._drivers = weakref.WeakKeyDictionary()  # driver -> session_id
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._load()
+
+    # ------------------------------------------------------------------ lưu trữ
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for data in json.load(f):
+                    session = BrowserSession(**data)
+                    self._sessions[session.session_id] = session
+            self._prune()
+            print(f"Loaded {len(self._sessions)} saved browser sessions")
+        except (OSError, ValueError, TypeError) as e:
+            print(f"⚠️ Could not load browser sessions: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        # Chụp và ghi trong cùng _save_lock: các lần lưu đồng thời không ghi chen vào nhau và
+        # bản chụp cũ không bao giờ thay thế bản mới hơn (thứ tự lấy lock: _save_lock rồi _lock)
+        with self._save_lock:
+            with self._lock:
+                data = [session.to_dict() for session in self._sessions.values()]
+            temp_path = None
+            try:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, delete=False,
+                                                 prefix=f"{os.path.basename(self.path)}.", suffix=".tmp") as f:
+                    temp_path = f.name
+                    json.dump(data, f)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ Could not save browser sessions: {e}")
+                if temp_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _expired(self, session, now):
+        return now - session.updated_at > self.ttl
+
+    def _unhealthy(self, session):
+        return session.pages >= self.min_pages_for_health and session.health < self.min_health
+
+    def _prune(self):
+        now = time.time()
+        # Phiên đang được driver dùng chỉ bị bỏ sau khi driver đó bị quit
+        in_use = set(self._drivers.values())
+        for session_id in [session_id for session_id, session in self._sessions.items()
+                           if session_id != HTTP_SESSION_ID and session_id not in in_use
+                           and (self._expired(session, now) or self._unhealthy(session))]:
+            print(f"🗑️ Dropping browser session {session_id}")
+            del self._sessions[session_id]
+
+    # ------------------------------------------------------------------ driver
+
+    def session_for(self, driver):
+        with self._lock:
+            session_id = self._drivers.get(driver)
+            return self._sessions.get(session_id) if session_id else None
+
+    def assign(self, driver):
+        """
+        Gán cho driver mới phiên khoẻ nhất chưa được driver khác dùng và khôi phục trạng thái của nó
+
+        Returns:
+            BrowserSession: Phiên đã gán (phiên mới, rỗng nếu không còn phiên nào dùng được)
+        """
+        with self._lock:
+            self._prune()
+            in_use = set(self._drivers.values())
+            candidates = [session for session in self._sessions.values()
+                          if session.session_id not in in_use and session.session_id != HTTP_SESSION_ID
+                          and session.cookies]
+            session = max(candidates, key=lambda s: (s.health, s.updated_at), default=None)
+            if session is None:
+                session = BrowserSession()
+                self._sessions[session.session_id] = session
+            self._drivers[driver] = session.session_id
+        if session.cookies:
+            self.restore(driver, session)
+        return session
+
+    def release(self, driver):
+        """Bỏ gán phiên khi driver bị quit (phiên được giữ lại cho driver sau)"""
+        with self._lock:
+            self._drivers.pop(driver, None)
+
+    def restore(self, driver, session):
+        """Nạp cookies và localStorage của phiên vào driver qua CDP (không cần điều hướng)"""
+        with span("session_restore", cookies=len(session.cookies)) as restore_span:
+            try:
+                cookies = [_cdp_cookie(cookie) for cookie in _live_cookies(session.cookies)]
+                if cookies:
+                    driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+                if session.local_storage and session.domain:
+                    suffix = _base_domain(session.domain)
+                    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+                        "source": _RESTORE_LOCAL_STORAGE_SCRIPT % {
+                            "suffix": json.dumps(suffix),
+                            "suffix_length": len(suffix),
+                            "items": json.dumps(session.local_storage),
+                        }
+                    })
+                print(f"🍪 Restored browser session {session.session_id} ({len(cookies)} cookies)")
+                return True
+            except Exception as e:
+                print(f"⚠️ Could not restore browser session {session.session_id}: {e}")
+                restore_span.set(outcome="error", error=type(e).__name__)
+                return False
+
+    def record_page(self, driver, url, captcha=False, solved=False, ok=True):
+        """
+        Ghi nhận một lần tải trang của driver; ghi lại cookies khi cần
+
+        Args:
+            driver: Driver vừa tải trang
+            url (str): URL đã tải
+            captcha (bool): Trang có hiện captcha không
+            solved (bool): Captcha đã được giải thành công
+            ok (bool): Lấy được dữ liệu từ trang
+        """
+        session = self.session_for(driver)
+        if session is None:
+            return
+        with self._lock:
+            session.pages += 1
+            session.captchas += 1 if captcha else 0
+            session.solved += 1 if solved else 0
+            session.failures += 0 if ok else 1
+            session.pages_since_capture += 1
+            should_capture = ok and (solved or not session.cookies
+                                     or session.pages_since_capture >= self.capture_every)
+        if should_capture:
+            self.capture(driver, url, session)
+
+    def capture(self, driver, url, session=None):
+        """Ghi lại cookies và localStorage hiện tại của driver vào phiên của nó"""
+        session = session or self.session_for(driver)
+        if session is None:
+            return
+        with span("session_capture") as capture_span:
+            try:
+                cookies = driver.get_cookies()
+                local_storage = json.loads(driver.execute_script(_LOCAL_STORAGE_SCRIPT) or "{}")
+            except Exception as e:
+                print(f"⚠️ Could not capture browser session {session.session_id}: {e}")
+                capture_span.set(outcome="error", error=type(e).__name__)
+                return
+            with self._lock:
+                session.cookies = cookies
+                session.local_storage = local_storage
+                session.domain = urlparse(url).hostname or session.domain
+                session.updated_at = time.time()
+                session.pages_since_capture = 0
+            capture_span.set(cookies=len(cookies))
+        self._save()
+
+    # ------------------------------------------------------------------ requests
+
+    def apply_to_requests(self, http_session, domain=None):
+        """
+        Nạp cookies của phiên trình duyệt khoẻ nhất vào requests.Session
+
+        Returns:
+            int: Số cookie đã nạp
+        """
+        with self._lock:
+            candidates = [session for session in self._sessions.values()
+                          if session.session_id != HTTP_SESSION_ID and session.cookies
+                          and (domain is None or _base_domain(session.domain or "") == _base_domain(domain))]
+            session = max(candidates, key=lambda s: (s.health, s.updated_at), default=None)
+            self._sessions.setdefault(HTTP_SESSION_ID, BrowserSession(HTTP_SESSION_ID))
+        if session is None:
+            return 0
+        cookies = _live_cookies(session.cookies)
+        for cookie in cookies:
+            http_session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"),
+                                     path=cookie.get("path", "/"))
+        return len(cookies)
+
+    def record_http(self, captcha=False, ok=True):
+        """Ghi nhận một lần fetch HTTP (phiên "http")"""
+        with self._lock:
+            session = self._sessions.setdefault(HTTP_SESSION_ID, BrowserSession(HTTP_SESSION_ID))
+            session.pages += 1
+            session.captchas += 1 if captcha else 0
+            session.failures += 0 if ok or captcha else 1
+
+    # ------------------------------------------------------------------ số đo
+
+    def stats(self):
+        """
+        Returns:
+            list: Mỗi phiên một dict (session_id, tuổi, số trang, số captcha, tỉ lệ captcha, health, đang dùng)
+        """
+        now = time.time()
+        with self._lock:
+            in_use = set(self._drivers.values())
+            return [{
+                "session_id": session.session_id,
+                "age_s": round(now - session.created_at),
+                "pages": session.pages,
+                "captchas": session.captchas,
+                "solved": session.solved,
+                "captcha_rate": round(session.captcha_rate, 3),
+                "health": round(session.health, 3),
+                "cookies": len(session.cookies),
+                "in_use": session.session_id in in_use,
+            } for session in self._sessions.values()]
+
+    def render_prometheus(self):
+        """Xuất số trang, số captcha và health theo phiên dưới dạng text Prometheus"""
+        lines = ["# TYPE scrape_session_pages_total counter", "# TYPE scrape_session_captchas_total counter",
+                 "# TYPE scrape_session_captcha_rate gauge", "# TYPE scrape_session_health gauge"]
+        for row in self.stats():
+            labels = f'session="{row["session_id"]}"'
+            lines.append(f"scrape_session_pages_total{{{labels}}} {row['pages']}")
+            lines.append(f"scrape_session_captchas_total{{{labels}}} {row['captchas']}")
+            lines.append(f"scrape_session_captcha_rate{{{labels}}} {row['captcha_rate']}")
+            lines.append(f"scrape_session_health{{{labels}}} {row['health']}")
+        return "\n".join(lines) + "\n"
+
+
+def _live_cookies(cookies):
+    now = time.time()
+    return [cookie for cookie in cookies if not cookie.get("expiry") or cookie["expiry"] > now]
+
+
+def _cdp_cookie(cookie):
+    """Chuyển cookie dạng Selenium (get_cookies) sang tham số của Network.setCookies"""
+    converted = {
+        "name": cookie["name"],
+        "value": cookie["value"],
+        "domain": cookie.get("domain"),
+        "path": cookie.get("path", "/"),
+        "secure": cookie.get("secure", False),
+        "httpOnly": cookie.get("httpOnly", False),
+    }
+    if cookie.get("sameSite") in ("Strict", "Lax", "None"):
+        converted["sameSite"] = cookie["sameSite"]
+    if cookie.get("expiry"):
+        converted["expires"] = cookie["expiry"]
+    return converted
+
+
+def _base_domain(host):
+    """www.amazon.com -> amazon.com, www.amazon.co.uk -> amazon.co.uk (đủ để so khớp cookie giữa các subdomain)"""
+    parts = (host or "").lstrip(".").split(".")
+    keep = 3 if len(parts) >= 3 and parts[-2] in ("co", "com") else 2
+    return ".".join(parts[-keep:]) if len(parts) >= 2 else (host or "")
+
+
+def default_session_path():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "browser_sessions.json")
@@ -0,0 +1,116 @@
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "events", "subscribers", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.events = []
+        self.subscribers = []
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi đồng thời cùng khoá thành một lần chạy duy nhất
+
+    Lời gọi đầu tiên (leader) chạy hàm; các lời gọi cùng khoá tới trong lúc đó chờ và nhận
+    cùng kết quả (hoặc cùng exception). Sự kiện tiến độ do leader phát ra được chuyển tới
+    mọi caller, kể cả caller tham gia muộn (được phát lại các sự kiện đã có).
+
+        product = flight.do(asin, lambda emit: scrape(url, on_basic=emit), on_event=on_basic)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, func, on_event=None):
+        """
+        Args:
+            key: Khoá gộp (ví dụ ASIN)
+            func (callable): Nhận emit(*args) để phát sự kiện tiến độ, trả về kết quả
+            on_event (callable, optional): Nhận các sự kiện tiến độ của lần chạy
+
+        Returns:
+            tuple: (kết quả, shared) - shared = True nếu kết quả đến từ lần chạy của caller khác
+        """
+        return self.do_or_join(None, key, func, on_event=on_event)
+
+    def do_or_join(self, join_key, key, func, on_event=None):
+        """
+        Tham gia lần chạy đang có của join_key; nếu không có thì chạy (hoặc tham gia) dưới key
+
+        Việc chọn khoá và đăng ký leader/follower diễn ra trong cùng một lần giữ lock, nên
+        caller không bao giờ trở thành leader của join_key.
+
+        Args:
+            join_key: Khoá có kết quả dùng được thay (ví dụ lần scrape đầy đủ), None nếu không có
+            key: Khoá của chính caller
+            func (callable): Nhận emit(*args) để phát sự kiện tiến độ, trả về kết quả
+            on_event (callable, optional): Nhận các sự kiện tiến độ của lần chạy
+
+        Returns:
+            tuple: (kết quả, shared) - shared = True nếu kết quả đến từ lần chạy của caller khác
+        """
+        with self._lock:
+            if join_key is not None and join_key in self._calls:
+                key = join_key
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.followers += 1
+            if on_event:
+                call.subscribers.append(on_event)
+                replay = list(call.events)
+            else:
+                replay = []
+
+        for args in replay:
+            _deliver(on_event, args)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        def emit(*args):
+            with self._lock:
+                call.events.append(args)
+                subscribers = list(call.subscribers)
+            for subscriber in subscribers:
+                _deliver(subscriber, args)
+
+        try:
+            call.result = func(emit)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.waiters:
+                print(f"🔗 Shared result of {key} with {call.waiters} waiting caller(s)")
+        return call.result, False
+
+
+def _deliver(callback, args):
+    try:
+        callback(*args)
+    except Exception as e:
+        print(f"⚠️ Single-flight event callback error: {e}")
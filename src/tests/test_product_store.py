@@ -0,0 +1,54 @@
+import gc
+
+from utils.product_store import ProductStore
+
+
+def _result(title, reviews=3):
+    product_data = {
+        "title": title,
+        "price": "$20",
+        "reviews": [{"id": f"R{i}", "rating": "5.0", "text": f"{title} review {i}" * 50} for i in range(reviews)],
+    }
+    return {"product_data": product_data, "basic_product_info": {"title": title}, "reviews_context": "",
+            "product_summary": f"Summary of {title}"}
+
+
+def test_unchanged_scrape_reuses_latest_version():
+    store = ProductStore()
+    first = store.put("B0A", _result("Kettle"), product_id="B0A")
+    again = store.put("B0A", _result("Kettle"), product_id="B0A")
+    changed = store.put("B0A", _result("Kettle v2"), product_id="B0A")
+    assert again is first
+    assert changed.ref == ("B0A", 2)
+    assert store.stats()["reused"] == 1
+
+
+def test_leased_records_are_not_evicted():
+    store = ProductStore()
+    held = store.put("B0A", _result("Kettle"))
+    store.max_bytes = held.nbytes
+    lease = store.acquire(held.ref)
+    store.put("B0B", _result("Press"))
+    store.put("B0C", _result("Grinder"))
+    assert store.get(held.ref) is held
+    assert lease.record is held
+    assert store.get(("B0B", 1)) is None
+
+    # Session kết thúc: lease bị thu gom, kho quay về trong giới hạn
+    del lease
+    gc.collect()
+    stats = store.stats()
+    assert stats["pinned"] == 0
+    assert stats["records"] == 1 and stats["nbytes"] <= store.max_bytes
+
+
+def test_lease_falls_back_to_latest_version():
+    store = ProductStore()
+    old = store.put("B0A", _result("Kettle"))
+    lease = store.acquire(old.ref)
+    lease.release()
+    newer = store.put("B0A", _result("Kettle v2"))
+    store.max_bytes = newer.nbytes
+    store.put("B0A", _result("Kettle v3"))
+    assert store.get(old.ref) is None
+    assert lease.record.ref == ("B0A", 3)
@@ -0,0 +1,35 @@
+import time
+
+from helper import crawl_selenium
+from helper.scrape_cache import ScrapeCache
+
+URL = "https://www.amazon.com/dp/B0TESTSC01"
+
+
+def _stale_cache(tmp_path, full):
+    cache = ScrapeCache(str(tmp_path / "cache.db"), stable_ttl=10)
+    product = {"title": "French Press", "price": "$20"}
+    if full:
+        product.update({"table": {}, "images": [], "reviews": [{"id": "R1", "text": "ok"}]})
+    cache.put("B0TESTSC01", product, full=full)
+    return cache
+
+
+def _scheduled_refresh(monkeypatch, cache, full):
+    scheduled = []
+    monkeypatch.setattr(crawl_selenium, "get_scrape_cache", lambda: cache)
+    monkeypatch.setattr(crawl_selenium._refresher, "schedule", lambda key, fn, *args: scheduled.append(args))
+    monkeypatch.setattr(time, "time", lambda now=time.time(): now + 60)
+    crawl_selenium.get_cached_product(URL, full=full)
+    return scheduled
+
+
+def test_stale_basic_entry_refreshes_basic_only(tmp_path, monkeypatch):
+    cache = _stale_cache(tmp_path, full=False)
+    assert _scheduled_refresh(monkeypatch, cache, full=False) == [(URL, "B0TESTSC01", False)]
+
+
+def test_stale_full_entry_refreshes_full(tmp_path, monkeypatch):
+    cache = _stale_cache(tmp_path, full=True)
+    # Caller chỉ cần thông tin cơ bản nhưng entry đã cache bản đầy đủ: giữ nguyên độ sâu đó
+    assert _scheduled_refresh(monkeypatch, cache, full=False) == [(URL, "B0TESTSC01", True)]
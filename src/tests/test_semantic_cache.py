@@ -0,0 +1,59 @@
+import pytest
+
+from utils.semantic_cache import SemanticAnswerCache, is_standalone_question, system_prefix_digest
+
+PARAPHRASES = [
+    ("How is the battery life?", "What's the battery life like?"),
+    ("Is it easy to clean?", "Is this easy to clean?"),
+    ("Does it come with a warranty?", "Does this come with warranty?"),
+    ("How is the sound quality?", "what about the sound quality"),
+    ("Is it waterproof?", "is this thing waterproof"),
+    ("Pin dùng được bao lâu?", "Pin dùng bao lâu?"),
+]
+
+DIFFERENT_QUESTIONS = [
+    ("Is it easy to clean?", "Is it hard to clean?"),
+    ("Is it loud?", "Is it not loud?"),
+    ("How is the battery life?", "How is the screen quality?"),
+    ("Does it fit a queen bed?", "Does it fit a king bed?"),
+    ("Is it good for kids?", "Is it safe for kids?"),
+    ("How long is the cable?", "How long is the warranty?"),
+]
+
+PREFIX = system_prefix_digest([{"role": "system", "content": "Kettle"}, {"role": "user", "content": "q"}])
+
+
+@pytest.mark.parametrize("stored, asked", PARAPHRASES)
+def test_paraphrases_hit(stored, asked):
+    cache = SemanticAnswerCache()
+    cache.store("B0A", "gpt-4o-mini", stored, "answer", context=PREFIX)
+    assert cache.lookup("B0A", "gpt-4o-mini", asked, context=PREFIX) == "answer"
+
+
+@pytest.mark.parametrize("stored, asked", DIFFERENT_QUESTIONS)
+def test_different_questions_miss(stored, asked):
+    cache = SemanticAnswerCache()
+    cache.store("B0A", "gpt-4o-mini", stored, "answer", context=PREFIX)
+    assert cache.lookup("B0A", "gpt-4o-mini", asked, context=PREFIX) is None
+
+
+def test_key_isolates_product_model_and_system_prefix():
+    cache = SemanticAnswerCache()
+    cache.store("B0A", "gpt-4o-mini", "Is it loud?", "answer", context=PREFIX)
+    other_prefix = system_prefix_digest([{"role": "system", "content": "Kettle v2"}])
+    assert cache.lookup("B0B", "gpt-4o-mini", "Is it loud?", context=PREFIX) is None
+    assert cache.lookup("B0A", "gpt-4", "Is it loud?", context=PREFIX) is None
+    assert cache.lookup("B0A", "gpt-4o-mini", "Is it loud?", context=other_prefix) is None
+
+
+def test_system_prefix_ignores_injected_reviews_and_turns():
+    first = [{"role": "system", "content": "Kettle"}, {"role": "user", "content": "Is it loud?"}]
+    with_reviews = [{"role": "system", "content": "Kettle"}, {"role": "user", "content": "Is it loud?"},
+                    {"role": "system", "content": "reviews"}, {"role": "user", "content": "Is it heavy?"}]
+    assert system_prefix_digest(first) == system_prefix_digest(with_reviews)
+
+
+def test_only_first_turn_is_standalone():
+    assert is_standalone_question([{"role": "system", "content": "Kettle"}, {"role": "user", "content": "q"}])
+    assert not is_standalone_question([{"role": "system", "content": "Kettle"}, {"role": "user", "content": "q"},
+                                       {"role": "assistant", "content": "a"}, {"role": "user", "content": "and?"}])
@@ -0,0 +1,60 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from helper import crawl_selenium
+from helper.single_flight import SingleFlight
+
+URL = "https://www.amazon.com/dp/B0TESTSF01"
+
+
+def _fake_scrape(url, full=True, on_basic=None, **kwargs):
+    time.sleep(random.uniform(0, 0.002))
+    product = {"title": "French Press", "price": "$20"}
+    if on_basic:
+        on_basic(dict(product))
+    if full:
+        product.update({"table": {}, "images": [], "reviews": [{"id": "R1", "text": "ok"}]})
+    return product
+
+
+def test_do_or_join_never_leads_join_key():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(emit):
+        started.set()
+        release.wait()
+        return "basic"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flight.do_or_join, ("A", True), ("A", False), slow)
+        started.wait()
+        assert flight.in_flight(("A", False))
+        assert not flight.in_flight(("A", True))
+        release.set()
+        assert leader.result() == ("basic", False)
+
+
+def test_full_waiters_always_get_reviews(monkeypatch):
+    monkeypatch.setattr(crawl_selenium, "scrape_product", _fake_scrape)
+    monkeypatch.setattr(crawl_selenium, "_add_crawled_reviews", lambda url, product: None)
+    monkeypatch.setattr(crawl_selenium, "get_scrape_cache", lambda: None)
+
+    for _ in range(100):
+        barrier = threading.Barrier(8)
+
+        def call(i):
+            barrier.wait()
+            # Caller đến rải rác để có request tới đúng lúc một lần scrape vừa kết thúc
+            time.sleep(random.uniform(0, 0.003))
+            return i % 2 == 0, crawl_selenium.get_cached_product(URL, full=i % 2 == 0)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(call, range(8)))
+        for full, product in results:
+            assert product["title"] == "French Press"
+            if full:
+                assert product["reviews"], "full caller received a basic-only product"
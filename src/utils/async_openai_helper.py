@@ -0,0 +1,89 @@
+import asyncio
+from openai import AsyncOpenAI
+from config.settings import OPENAI_API_KEY, OPENAI_BASE_URL
+from utils.llm_telemetry import llm_call
+from utils.openai_helper import (FILE_SEARCH_VECTOR_STORE_IDS, extract_response_text, resolve_model_name,
+                                 response_cache, response_cache_key)
+
+_async_client = None
+# Các lời gọi có cache đang chạy theo cache key (mọi coroutine chạy trên cùng một event loop)
+_inflight = {}
+
+def get_async_client():
+    """
+    Trả về AsyncOpenAI client dùng chung (connection pool của httpx được tái sử dụng)
+
+    Client gắn với event loop tạo ra nó, vì vậy chỉ nên gọi từ cùng một event loop
+    (xem utils.scrape_pipeline, nơi mọi coroutine chạy trên một loop nền duy nhất).
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+    return _async_client
+
+async def get_openai_response_async(prompt, product_id=None, use_file_search=False, selected_model="gpt-4o-mini",
+                                    use_cache=False, cache_tag=None):
+    """
+    Phiên bản async của get_openai_response (cùng tham số, cùng cache câu trả lời)
+    
+    Args:
+        prompt (str): The prompt to send to the API
+        product_id (str, optional): Product ID to include in search
+        use_file_search (bool, optional): Whether to use file search tool
+        selected_model (str, optional): The model to use for the API call
+        use_cache (bool, optional): Reuse a cached response for the same model, prompt and tools
+        cache_tag (str, optional): Tag used to invalidate the cached response (defaults to product_id)
+        
+    Returns:
+        str: The generated response text
+    """
+    if use_cache:
+        cache_key = response_cache_key(prompt, product_id, use_file_search, selected_model)
+        # Cache có thể đọc SQLite: chạy trong thread để không chặn event loop
+        cached = await asyncio.to_thread(response_cache.get, cache_key)
+        if cached is not None:
+            return cached
+        # Các lời gọi đồng thời cùng prompt (ví dụ nhiều session tóm tắt cùng sản phẩm) dùng chung một request
+        task = _inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(_fetch_and_cache(cache_key, prompt, product_id, use_file_search,
+                                                          selected_model, cache_tag or product_id))
+            _inflight[cache_key] = task
+            task.add_done_callback(lambda _: _inflight.pop(cache_key, None))
+        # shield: caller bị huỷ (quá deadline) không huỷ request của các caller khác
+        return await asyncio.shield(task)
+
+    try:
+        model_name = resolve_model_name(selected_model)
+        client = get_async_client()
+        
+        if product_id and use_file_search:
+            search_prompt = f"{prompt} ProductId: {product_id}"
+            with llm_call(model_name, api="responses", tools="file_search", prompt_chars=len(search_prompt)) as call:
+                response = await client.responses.create(
+                    model=model_name,
+                    input=search_prompt,
+                    tools=[{
+                        "type": "file_search",
+                        "vector_store_ids": FILE_SEARCH_VECTOR_STORE_IDS
+                    }]
+                )
+                call.set_usage(getattr(response, "usage", None))
+            return extract_response_text(response)
+
+        with llm_call(model_name, api="chat", prompt_chars=len(prompt)) as call:
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+                stream=False
+            )
+            call.set_usage(response.usage)
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+async def _fetch_and_cache(cache_key, prompt, product_id, use_file_search, selected_model, tag):
+    response_text = await get_openai_response_async(prompt, product_id, use_file_search, selected_model)
+    if not response_text.startswith("Error:"):
+        await asyncio.to_thread(response_cache.put, cache_key, response_text, tag=tag)
+    return response_text
@@ -0,0 +1,219 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from utils.openai_helper import get_openai_response
+
+try:
+    import tiktoken
+except ImportError:  # Ước lượng ~4 ký tự/token khi không có tiktoken
+    tiktoken = None
+
+# Giới hạn context của từng model (tokens)
+MODEL_CONTEXT_LIMITS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4.1-mini": 1000000,
+    "gpt-4.1": 1000000,
+}
+# Số token dành cho câu trả lời, không dùng cho lịch sử
+RESPONSE_RESERVE_TOKENS = 4000
+# Mỗi message tốn thêm vài token cho role/định dạng
+MESSAGE_OVERHEAD_TOKENS = 4
+# Số kết quả đếm token được nhớ (khoá là mã băm của văn bản, không giữ bản thân văn bản)
+TOKEN_COUNT_CACHE_SIZE = 4096
+
+_token_counts = OrderedDict()  # (digest, model) -> số token
+_token_counts_lock = threading.Lock()
+_fallback_warned = False
+
+
+@lru_cache(maxsize=8)
+def _encoding_for(model):
+    """Bộ mã hoá tiktoken của model, None nếu không có tiktoken hoặc không tải được (ví dụ offline)"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"⚠️ Could not load tiktoken encoding for {model}: {e}")
+        return None
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """
+    Đếm số token của một đoạn văn bản (dùng tiktoken nếu có, nếu không thì ước lượng)
+
+    Args:
+        text (str): Văn bản cần đếm
+        model (str): Tên model để chọn bộ mã hoá
+
+    Returns:
+        int: Số token
+    """
+    global _fallback_warned
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is None:
+        if not _fallback_warned:
+            _fallback_warned = True
+            print("⚠️ tiktoken is unavailable, estimating tokens as len(text) / 4")
+        return len(text) // 4 + 1
+    key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), model)
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+    count = len(encoding.encode(text))
+    with _token_counts_lock:
+        _token_counts[key] = count
+        while len(_token_counts) > TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+
+def message_tokens(message, model="gpt-4o-mini"):
+    return count_tokens(message.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summarize_turns(previous_summary, turns, selected_model="gpt-4o-mini"):
+    """
+    Gộp các lượt hội thoại cũ vào bản tóm tắt đang có bằng OpenAI
+
+    Args:
+        previous_summary (str): Bản tóm tắt hiện tại (có thể rỗng)
+        turns (list): Các message cần gộp thêm
+        selected_model (str): Model dùng để tóm tắt
+
+    Returns:
+        str: Bản tóm tắt mới
+    """
+    transcript = "\n".join(f"{turn['role']}: {turn.get('content', '')}" for turn in turns)
+    prompt = f"""
+    Hãy cập nhật bản tóm tắt cuộc trò chuyện giữa người dùng và trợ lý về một sản phẩm.
+    Giữ lại các câu hỏi chính, các thông tin quan trọng đã trả lời và mọi yêu cầu/sở thích của người dùng.
+    Viết ngắn gọn, tối đa khoảng 200 từ.
+
+    TÓM TẮT HIỆN TẠI:
+    {previous_summary or "(chưa có)"}
+
+    CÁC LƯỢT HỘI THOẠI MỚI CẦN GỘP:
+    {transcript}
+    """
+    return get_openai_response(prompt, selected_model=selected_model)
+
+
+class RollingContext:
+    """
+    Giữ lịch sử chat trong ngân sách token cố định cho mỗi lượt gọi API
+
+    System prefix và các lượt gần nhất được giữ nguyên văn. Các lượt cũ hơn được gộp
+    dần vào một bản tóm tắt; việc tóm tắt chạy ở thread nền nên không làm chậm lượt chat
+    hiện tại (trong lúc chờ, các lượt cũ vượt ngân sách chỉ đơn giản là bị bỏ qua).
+    """
+
+    def __init__(self, budget_tokens=8000, compact_ratio=0.5, summarize=summarize_turns):
+        """
+        Args:
+            budget_tokens (int): Ngân sách token cho toàn bộ messages gửi đi
+            compact_ratio (float): Khi tóm tắt, gộp bớt lượt cũ cho tới khi phần nguyên văn
+                                   còn chiếm tối đa tỉ lệ này của ngân sách
+            summarize (callable): (previous_summary, turns, selected_model) -> summary
+        """
+        self.budget_tokens = budget_tokens
+        self.compact_ratio = compact_ratio
+        self.summarize = summarize
+        self.summary = ""
+        self.summarized_upto = 0  # Số lượt (không tính system prefix) đã nằm trong summary
+        self._lock = threading.Lock()
+        self._compacting = False
+
+    def budget_for(self, model):
+        limit = MODEL_CONTEXT_LIMITS.get(model, 128000) - RESPONSE_RESERVE_TOKENS
+        return min(self.budget_tokens, limit)
+
+    def _summary_message(self):
+        return {"role": "system", "content": f"TÓM TẮT CUỘC TRÒ CHUYỆN TRƯỚC ĐÓ:\n{self.summary}"}
+
+    def _fit_from_end(self, turns, start, budget, model):
+        """Trả về chỉ số lượt đầu tiên được giữ khi lấy từ cuối lên trong ngân sách"""
+        used = 0
+        cut = len(turns)
+        while cut > start:
+            cost = message_tokens(turns[cut - 1], model)
+            if used + cost > budget and cut < len(turns):
+                break
+            used += cost
+            cut -= 1
+        return cut
+
+    def build(self, messages_history, model="gpt-4o-mini", extra_messages=()):
+        """
+        Tạo danh sách messages cho lượt gọi API hiện tại
+
+        Args:
+            messages_history (list): Toàn bộ lịch sử (system prefix + các lượt user/assistant)
+            model (str): Model được chọn (để lấy ngân sách và bộ đếm token)
+            extra_messages (list): Message sẽ được chèn thêm vào request (ví dụ reviews liên quan);
+                                   không được trả về nhưng được trừ vào ngân sách
+
+        Returns:
+            list: System prefix + tóm tắt (nếu có) + các lượt gần nhất vừa ngân sách
+        """
+        prefix_length = 0
+        while prefix_length < len(messages_history) and messages_history[prefix_length].get("role") == "system":
+            prefix_length += 1
+        prefix = messages_history[:prefix_length]
+        turns = messages_history[prefix_length:]
+
+        with self._lock:
+            if self.summarized_upto > len(turns):
+                # Lịch sử đã bị reset (ví dụ khi scrape sản phẩm mới)
+                self.summary, self.summarized_upto = "", 0
+            summary, summarized_upto = self.summary, self.summarized_upto
+
+        budget = self.budget_for(model) - sum(message_tokens(message, model)
+                                              for message in list(prefix) + list(extra_messages))
+        if summary:
+            budget -= message_tokens(self._summary_message(), model)
+        cut = self._fit_from_end(turns, summarized_upto, budget, model)
+
+        if cut > summarized_upto:
+            # Có lượt cũ bị bỏ ra ngoài: gộp chúng (và thêm một ít) vào summary ở nền
+            target = self._fit_from_end(turns, summarized_upto, int(budget * self.compact_ratio), model)
+            self._schedule_compaction(turns, summarized_upto, max(cut, target), model)
+
+        messages = list(prefix)
+        if summary:
+            messages.append(self._summary_message())
+        messages.extend(turns[cut:])
+        return messages
+
+    def _schedule_compaction(self, turns, start, end, model):
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        pending = [dict(turn) for turn in turns[start:end]]
+        previous_summary = self.summary
+
+        def run():
+            try:
+                summary = self.summarize(previous_summary, pending, model)
+                if summary and not summary.startswith("Error:"):
+                    with self._lock:
+                        if self.summarized_upto == start:
+                            self.summary = summary
+                            self.summarized_upto = end
+            except Exception as e:
+                print(f"⚠️ Error compacting conversation history: {e}")
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,214 @@
+"""
+Telemetry cho các lời gọi model OpenAI
+
+Mỗi lời gọi ghi lại: thời gian tới khi nhận header (connect), time-to-first-token, thời
+gian stream, tokens/giây, số token prompt/cached/completion, model và tool. Bản ghi được
+giữ trong cửa sổ trượt (LLM_TELEMETRY_WINDOW giây) để truy vấn phân vị theo model, và
+đồng thời được ghi thành span "llm_call" của utils.tracing (JSONL + /metrics).
+
+    with llm_call("gpt-4o-mini", api="chat", stream=True) as call:
+        response = client.chat.completions.create(..., stream=True)
+        call.connected()
+        for chunk in response:
+            call.token()
+            ...
+            call.set_usage(chunk.usage)
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config.settings import LLM_TELEMETRY_WINDOW
+from utils.tracing import span, tracer
+
+# Các số đo được tổng hợp phân vị
+TIMING_METRICS = ("connect_ms", "ttft_ms", "stream_ms", "total_ms", "tokens_per_s")
+TOKEN_METRICS = ("prompt_tokens", "cached_tokens", "completion_tokens")
+
+
+def usage_fields(usage):
+    """
+    Chuẩn hoá usage của chat.completions và Responses API
+
+    Returns:
+        dict: prompt_tokens, cached_tokens, completion_tokens (0 nếu không có)
+    """
+    if usage is None:
+        return {}
+
+    def read(obj, *names):
+        for name in names:
+            value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+            if value is not None:
+                return value
+        return None
+
+    details = read(usage, "prompt_tokens_details", "input_tokens_details")
+    return {
+        "prompt_tokens": read(usage, "prompt_tokens", "input_tokens") or 0,
+        "cached_tokens": (read(details, "cached_tokens") or 0) if details is not None else 0,
+        "completion_tokens": read(usage, "completion_tokens", "output_tokens") or 0,
+    }
+
+
+class LLMCall:
+    """Số đo của một lời gọi model đang diễn ra"""
+
+    def __init__(self, model, api, stream, tools, prompt_chars):
+        self.record = {"model": model, "api": api, "stream": stream, "tools": tools or "none",
+                       "prompt_chars": prompt_chars, "outcome": "ok"}
+        self._start = time.perf_counter()
+        self._first_token = None
+        self._last_token = None
+
+    def connected(self):
+        """Gọi khi API trả về header/đối tượng response (trước token đầu tiên nếu stream)"""
+        self.record["connect_ms"] = (time.perf_counter() - self._start) * 1000
+
+    def token(self):
+        """Gọi mỗi khi nhận một chunk có nội dung"""
+        now = time.perf_counter()
+        if self._first_token is None:
+            self._first_token = now
+        self._last_token = now
+
+    def set_usage(self, usage):
+        self.record.update(usage_fields(usage))
+
+    def fail(self, error):
+        self.record["outcome"] = "error"
+        self.record["error"] = type(error).__name__
+
+    def finish(self):
+        end = time.perf_counter()
+        record = self.record
+        record["ts"] = time.time()
+        record["total_ms"] = (end - self._start) * 1000
+        if self._first_token is None and record["outcome"] == "ok" and not record["stream"]:
+            # Không stream: token đầu tiên tới cùng lúc với toàn bộ câu trả lời
+            self._first_token = self._last_token = end
+        if self._first_token is not None:
+            record["ttft_ms"] = (self._first_token - self._start) * 1000
+            record["stream_ms"] = (self._last_token - self._first_token) * 1000
+            generation_s = (self._last_token - self._first_token) if record["stream"] else (end - self._start)
+            if record.get("completion_tokens") and generation_s > 0:
+                record["tokens_per_s"] = record["completion_tokens"] / generation_s
+        return record
+
+
+class LLMTelemetry:
+    """Cửa sổ trượt các bản ghi lời gọi model, truy vấn phân vị theo nhóm"""
+
+    def __init__(self, window_seconds=3600, max_records=5000):
+        """
+        Args:
+            window_seconds (float): Chỉ giữ bản ghi trong khoảng thời gian này
+            max_records (int): Số bản ghi tối đa giữ trong bộ nhớ
+        """
+        self.window_seconds = window_seconds
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        cutoff = time.time() - self.window_seconds
+        with self._lock:
+            while self._records and self._records[0]["ts"] < cutoff:
+                self._records.popleft()
+            return list(self._records)
+
+    def summary(self, group_by=("model", "api", "stream")):
+        """
+        Tổng hợp các lời gọi trong cửa sổ
+
+        Args:
+            group_by (tuple): Các trường dùng để nhóm bản ghi
+
+        Returns:
+            list: Mỗi nhóm một dict gồm calls, errors, p50/p95 của các số đo thời gian,
+                  tổng và trung bình token, tỉ lệ cached/prompt
+        """
+        groups = {}
+        for record in self.records():
+            groups.setdefault(tuple(record.get(key) for key in group_by), []).append(record)
+
+        rows = []
+        for key, records in sorted(groups.items(), key=lambda item: str(item[0])):
+            row = dict(zip(group_by, key))
+            row["calls"] = len(records)
+            row["errors"] = sum(1 for record in records if record["outcome"] != "ok")
+            for metric in TIMING_METRICS:
+                values = sorted(record[metric] for record in records if metric in record)
+                if values:
+                    row[f"{metric}_p50"] = round(_percentile(values, 0.5), 1)
+                    row[f"{metric}_p95"] = round(_percentile(values, 0.95), 1)
+            for metric in TOKEN_METRICS:
+                total = sum(record.get(metric, 0) for record in records)
+                row[f"{metric}_total"] = total
+                row[f"{metric}_mean"] = round(total / len(records), 1)
+            if row["prompt_tokens_total"]:
+                row["cached_ratio"] = round(row["cached_tokens_total"] / row["prompt_tokens_total"], 3)
+            rows.append(row)
+        return rows
+
+    def render_prometheus(self):
+        """Xuất phân vị và tổng token theo model dưới dạng text Prometheus"""
+        lines = [f"# TYPE llm_call_{metric} gauge" for metric in TIMING_METRICS]
+        lines += ["# TYPE llm_tokens_total counter", "# TYPE llm_calls_total counter",
+                  "# TYPE llm_call_errors_total counter"]
+        for row in self.summary(group_by=("model", "api", "stream")):
+            labels = f'model="{row["model"]}",api="{row["api"]}",stream="{str(row["stream"]).lower()}"'
+            for metric in TIMING_METRICS:
+                for quantile in ("p50", "p95"):
+                    value = row.get(f"{metric}_{quantile}")
+                    if value is not None:
+                        lines.append(f'llm_call_{metric}{{{labels},quantile="0.{quantile[1:]}"}} {value}')
+            for metric in TOKEN_METRICS:
+                lines.append(f'llm_tokens_total{{{labels},kind="{metric.split("_")[0]}"}} {row[f"{metric}_total"]}')
+            lines.append(f"llm_calls_total{{{labels}}} {row['calls']}")
+            lines.append(f"llm_call_errors_total{{{labels}}} {row['errors']}")
+        return "\n".join(lines) + "\n"
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+telemetry = LLMTelemetry(window_seconds=LLM_TELEMETRY_WINDOW)
+tracer.add_collector(telemetry.render_prometheus)
+
+
+@contextmanager
+def llm_call(model, api="chat", stream=False, tools=None, prompt_chars=0):
+    """
+    Đo một lời gọi model và ghi vào telemetry dùng chung
+
+    Args:
+        model (str): Tên model thực gọi API
+        api (str): "chat" hoặc "responses"
+        stream (bool): Có stream hay không
+        tools (str, optional): Tool được dùng (ví dụ "file_search")
+        prompt_chars (int): Độ dài prompt (ký tự), để theo dõi prompt phình to
+
+    Yields:
+        LLMCall: Đối tượng để đánh dấu connected/token và gắn usage
+    """
+    call = LLMCall(model, api, stream, tools, prompt_chars)
+    # Với stream, khối with bao quanh các yield của generator: span không được làm span hiện tại,
+    # nếu không code của caller chạy giữa các chunk sẽ bị gắn làm span con của llm_call
+    with span("llm_call", detached=stream, model=model, api=api, stream=stream) as call_span:
+        try:
+            yield call
+        except Exception as e:
+            call.fail(e)
+            raise
+        finally:
+            record = call.finish()
+            call_span.set(outcome=record["outcome"], **{key: record[key] for key in
+                          ("tools", "prompt_chars", "connect_ms", "ttft_ms", "tokens_per_s") + TOKEN_METRICS
+                          if key in record})
+            telemetry.add(record)
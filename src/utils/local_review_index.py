@@ -0,0 +1,251 @@
+"""
+Chỉ mục reviews cục bộ cho các sản phẩm trong unique_product_ids.txt
+
+Thay cho vector store file_search từ xa: embeddings được lưu trong một ma trận NumPy
+(memory-mapped) sắp xếp theo ASIN, kèm bảng offset cho từng ASIN, nên mỗi truy vấn chỉ
+tính similarity trên các dòng của đúng sản phẩm đó và trả về review gốc mà không cần
+gọi LLM.
+
+Xây dựng chỉ mục từ file CSV reviews (định dạng Amazon Fine Food Reviews:
+Id, ProductId, ProfileName, Score, Time, Summary, Text), chạy từ thư mục src:
+    python -m utils.local_review_index build --csv /path/to/Reviews.csv
+    python -m utils.local_review_index query B000084F6F "có bền không"
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from helper.crawl_selenium import filter_known_product_ids
+
+EMBEDDING_DIM = 512
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "review_index")
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def embed_texts(texts, dim=EMBEDDING_DIM):
+    """
+    Embedding cục bộ bằng feature hashing (unigram + bigram), đã chuẩn hoá L2
+
+    Không cần model hay mạng; cùng một văn bản luôn cho cùng một vector.
+
+    Args:
+        texts (list): Danh sách văn bản
+        dim (int): Số chiều của vector
+
+    Returns:
+        np.ndarray: Ma trận float32 kích thước (len(texts), dim)
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = TOKEN_PATTERN.findall((text or "").lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            matrix[row, digest % dim] += 1.0 if digest & 0x80000000 else -1.0
+        # Giảm ảnh hưởng của từ lặp lại nhiều lần
+        matrix[row] = np.sign(matrix[row]) * np.log1p(np.abs(matrix[row]))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _record_from_row(row):
+    try:
+        date = datetime.fromtimestamp(int(row.get("Time") or 0), tz=timezone.utc).strftime("%Y-%m-%d")
+    except (ValueError, OverflowError, OSError):
+        date = "Không rõ ngày"
+    return {
+        "id": row.get("Id") or None,
+        "title": row.get("Summary") or "No title",
+        "text": row.get("Text") or "No review text",
+        "author": row.get("ProfileName") or "Anonymous",
+        "rating": f"{row['Score']}.0 out of 5 stars" if row.get("Score") else None,
+        "date": date,
+    }
+
+
+def build_index(csv_path, index_dir=DEFAULT_INDEX_DIR, batch_size=2048):
+    """
+    Xây dựng chỉ mục cho các ASIN có trong unique_product_ids.txt
+
+    Tạo trong index_dir:
+        embeddings.npy  - ma trận (N, EMBEDDING_DIM) float32, sắp xếp theo ASIN
+        offsets.json    - ASIN -> [start, end) trong ma trận
+        reviews.jsonl   - review gốc, cùng thứ tự với ma trận
+        positions.npy   - vị trí byte của từng dòng trong reviews.jsonl
+
+    Returns:
+        int: Số reviews đã đưa vào chỉ mục
+    """
+    by_product = {}
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            product_id = row.get("ProductId")
+            if product_id:
+                by_product.setdefault(product_id, []).append(row)
+    known = filter_known_product_ids(by_product.keys())
+    product_ids = sorted(product_id for product_id, is_known in known.items() if is_known)
+    total = sum(len(by_product[product_id]) for product_id in product_ids)
+
+    os.makedirs(index_dir, exist_ok=True)
+    embeddings = np.lib.format.open_memmap(os.path.join(index_dir, "embeddings.npy"), mode="w+",
+                                           dtype=np.float32, shape=(total, EMBEDDING_DIM))
+    positions = np.zeros(total, dtype=np.int64)
+    offsets = {}
+    row_index = 0
+    with open(os.path.join(index_dir, "reviews.jsonl"), "wb") as reviews_file:
+        for product_id in product_ids:
+            start = row_index
+            records = [_record_from_row(row) for row in by_product[product_id]]
+            for batch_start in range(0, len(records), batch_size):
+                batch = records[batch_start:batch_start + batch_size]
+                texts = [f"{record['title']} {record['text']}" for record in batch]
+                embeddings[row_index:row_index + len(batch)] = embed_texts(texts)
+                for record in batch:
+                    positions[row_index] = reviews_file.tell()
+                    reviews_file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+                    row_index += 1
+            offsets[product_id] = [start, row_index]
+    embeddings.flush()
+    del embeddings
+    np.save(os.path.join(index_dir, "positions.npy"), positions)
+    with open(os.path.join(index_dir, "offsets.json"), "w") as f:
+        json.dump(offsets, f)
+    print(f"Indexed {total} reviews for {len(product_ids)} products into {index_dir}")
+    return total
+
+
+class LocalReviewIndex:
+    """Chỉ mục reviews đã xây dựng bằng build_index, mở ở chế độ memory-mapped"""
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        self.embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+        self.positions = np.load(os.path.join(index_dir, "positions.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "offsets.json"), "r") as f:
+            self.offsets = {product_id: tuple(bounds) for product_id, bounds in json.load(f).items()}
+        self._reviews_path = os.path.join(index_dir, "reviews.jsonl")
+        self._local = threading.local()
+
+    def __contains__(self, product_id):
+        return product_id in self.offsets
+
+    def count(self, product_id):
+        start, end = self.offsets.get(product_id, (0, 0))
+        return end - start
+
+    def _reviews_file(self):
+        # Mỗi thread giữ file handle riêng để seek/read không tranh chấp
+        handle = getattr(self._local, "handle", None)
+        if handle is None:
+            handle = open(self._reviews_path, "rb")
+            self._local.handle = handle
+        return handle
+
+    def _load_records(self, rows):
+        handle = self._reviews_file()
+        records = []
+        for row in rows:
+            handle.seek(int(self.positions[row]))
+            records.append(json.loads(handle.readline()))
+        return records
+
+    def get_reviews(self, product_id, limit=None):
+        """
+        Trả về review gốc của một ASIN, không qua LLM
+
+        Args:
+            product_id (str): ASIN
+            limit (int, optional): Số reviews tối đa
+
+        Returns:
+            list: Review dict (id, title, text, author, rating, date)
+        """
+        start, end = self.offsets.get(product_id, (0, 0))
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._load_records(range(start, end))
+
+    def search_many(self, product_id, queries, k=8):
+        """
+        Tìm top-k reviews cho nhiều câu hỏi cùng lúc (một phép nhân ma trận)
+
+        Args:
+            product_id (str): ASIN, similarity chỉ tính trên các dòng của ASIN này
+            queries (list): Danh sách câu hỏi
+            k (int): Số reviews cho mỗi câu hỏi
+
+        Returns:
+            list: Với mỗi câu hỏi, danh sách (score, review) theo điểm giảm dần
+        """
+        start, end = self.offsets.get(product_id, (0, 0))
+        if end <= start or not queries:
+            return [[] for _ in queries]
+        scores = np.asarray(self.embeddings[start:end]) @ embed_texts(queries).T
+        k = min(k, end - start)
+        results = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            top = np.argpartition(-column_scores, k - 1)[:k]
+            top = top[np.argsort(-column_scores[top])]
+            records = self._load_records(start + top)
+            results.append([(float(column_scores[i]), record) for i, record in zip(top, records)])
+        return results
+
+    def search(self, product_id, query, k=8):
+        """Tìm top-k reviews của một ASIN liên quan tới câu hỏi, trả về review dict"""
+        return [record for _, record in self.search_many(product_id, [query], k)[0]]
+
+
+_local_index = None
+_local_index_lock = threading.Lock()
+
+
+def get_local_review_index(index_dir=DEFAULT_INDEX_DIR):
+    """
+    Trả về chỉ mục reviews cục bộ dùng chung, hoặc None nếu chưa được xây dựng
+
+    Returns:
+        LocalReviewIndex: Chỉ mục đã mở, None khi thư mục chỉ mục không tồn tại
+    """
+    global _local_index
+    if _local_index is None:
+        with _local_index_lock:
+            if _local_index is None:
+                if not os.path.exists(os.path.join(index_dir, "offsets.json")):
+                    return None
+                _local_index = LocalReviewIndex(index_dir)
+                print(f"Loaded local review index with {len(_local_index.offsets)} products")
+    return _local_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local review index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Xây dựng chỉ mục từ file CSV reviews")
+    build_parser.add_argument("--csv", required=True)
+    build_parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    query_parser = subparsers.add_parser("query", help="Tìm reviews liên quan cho một ASIN")
+    query_parser.add_argument("product_id")
+    query_parser.add_argument("question")
+    query_parser.add_argument("-k", type=int, default=5)
+    query_parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.csv, args.index_dir)
+        return
+    index = LocalReviewIndex(args.index_dir)
+    for score, review in index.search_many(args.product_id, [args.question], args.k)[0]:
+        print(f"[{score:.3f}] {review['title']} - {review['text'][:120]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,165 @@
 from openai import OpenAI
-from config.settings import OPENAI_API_KEY
+from config.settings import OPENAI_API_KEY, OPENAI_BASE_URL
+from config.settings import LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+from utils.llm_telemetry import llm_call
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 
-def get_openai_response(prompt, product_id=None, use_file_search=False, selected_model="gpt-4o-mini"):
+FILE_SEARCH_VECTOR_STORE_IDS = ["vs_6804ef31d9cc8191a9041b697b24a0cc"]
+
+class ResponseCache:
+    """
+    Cache câu trả lời của các prompt xác định (tóm tắt sản phẩm, liệt kê reviews)
+
+    Khoá là hash của model, prompt và cấu hình tool. Entry được giữ trong một LRU
+    trong bộ nhớ và ghi xuống SQLite để dùng lại sau khi khởi động lại app; mỗi entry
+    có thể gắn tag (ProductId) để xoá khi dữ liệu sản phẩm thay đổi.
+    """
+
+    def __init__(self, path, ttl=86400, max_entries=1000):
+        """
+        Args:
+            path (str): File SQLite lưu cache (rỗng để chỉ dùng bộ nhớ)
+            ttl (float): Thời gian sống của entry (giây)
+            max_entries (int): Số entry tối đa (LRU)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # key -> (value, tag, created_at)
+        self._lock = threading.Lock()
+        if self.path:
+            self._execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    tag TEXT,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+
+    @staticmethod
+    def make_key(model, prompt, tools=None):
+        raw = json.dumps({"model": model, "prompt": prompt, "tools": tools}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _execute(self, sql, params=(), fetch=False):
+        try:
+            conn = sqlite3.connect(self.path, timeout=10)
+            try:
+                with conn:
+                    cursor = conn.execute(sql, params)
+                    return cursor.fetchone() if fetch else None
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache error: {e}")
+            return None
+
+    def _remember(self, key, value, tag, created_at):
+        self._memory[key] = (value, tag, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[2] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    return entry[0]
+                del self._memory[key]
+        if not self.path:
+            return None
+        row = self._execute("SELECT value, tag, created_at FROM responses WHERE key = ?", (key,), fetch=True)
+        if row is None:
+            return None
+        value, tag, created_at = row
+        if now - created_at > self.ttl:
+            self._execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        self._execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self._remember(key, value, tag, created_at)
+        return value
+
+    def put(self, key, value, tag=None):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, tag, now)
+        if self.path:
+            self._execute(
+                "INSERT OR REPLACE INTO responses (key, tag, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, tag, value, now, now),
+            )
+            # Giới hạn kích thước trên đĩa: bỏ các entry ít được dùng nhất
+            self._execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self, tag):
+        """Xoá mọi entry gắn tag (ví dụ ProductId có dữ liệu vừa thay đổi)"""
+        with self._lock:
+            for key in [key for key, entry in self._memory.items() if entry[1] == tag]:
+                del self._memory[key]
+        if self.path:
+            self._execute("DELETE FROM responses WHERE tag = ?", (tag,))
+
+response_cache = ResponseCache(
+    LLM_CACHE_PATH if LLM_CACHE_PATH is not None else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "llm_cache.db"),
+    ttl=LLM_CACHE_TTL,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+)
+
+def resolve_model_name(selected_model):
+    """Map selected_model value from frontend to actual API model names"""
+    model_mapping = {
+        "GPT-4o-MINI": "gpt-4o-mini",
+        "GPT-4": "gpt-4",
+        "GPT-4 32k": "gpt-4-32k",
+        # Default to gpt-4o-mini if not in mapping
+    }
+    
+    # Get the correct model name or default to gpt-4o-mini
+    return model_mapping.get(selected_model, "gpt-4o-mini")
+
+def extract_response_text(response):
+    """Trích xuất nội dung text từ kết quả Responses API (file_search)"""
+    if hasattr(response, 'output') and len(response.output) > 1:
+        output_message = response.output[1]
+        if hasattr(output_message, 'content') and len(output_message.content) > 0:
+            content_item = output_message.content[0]
+            if hasattr(content_item, 'text'):
+                return content_item.text
+    
+    # Nếu không thể trích xuất được text, trả về toàn bộ nội dung
+    return str(response)
+
+def response_cache_key(prompt, product_id, use_file_search, selected_model):
+    tools = {"file_search": FILE_SEARCH_VECTOR_STORE_IDS, "product_id": product_id} if product_id and use_file_search else None
+    # Khoá theo model API thực gọi: các tên hiển thị cùng model dùng chung entry, đổi mapping thì đổi khoá
+    return ResponseCache.make_key(resolve_model_name(selected_model), prompt, tools)
+
+def invalidate_product_responses(product_id):
+    """Xoá các câu trả lời đã cache liên quan đến một ProductId"""
+    if product_id:
+        response_cache.invalidate(product_id)
+
+def get_openai_response(prompt, product_id=None, use_file_search=False, selected_model="gpt-4o-mini",
+                        use_cache=False, cache_tag=None):
     """
     Generate a response from OpenAI API
     
@@ -12,52 +168,50 @@ def get_openai_response(prompt, product_id=None, use_file_search=False, selected
         product_id (str, optional): Product ID to include in search
         use_file_search (bool, optional): Whether to use file search tool
         selected_model (str, optional): The model to use for the API call
+        use_cache (bool, optional): Reuse a cached response for the same model, prompt and tools
+        cache_tag (str, optional): Tag used to invalidate the cached response (defaults to product_id)
         
     Returns:
         str: The generated response text
     """
+    if use_cache:
+        cache_key = response_cache_key(prompt, product_id, use_file_search, selected_model)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        response_text = get_openai_response(prompt, product_id, use_file_search, selected_model)
+        if not response_text.startswith("Error:"):
+            response_cache.put(cache_key, response_text, tag=cache_tag or product_id)
+        return response_text
+
     try:
-        # Map selected_model value from frontend to actual API model names
-        model_mapping = {
-            "GPT-4o-MINI": "gpt-4o-mini",
-            "GPT-4": "gpt-4",
-            "GPT-4 32k": "gpt-4-32k",
-            # Default to gpt-4o-mini if not in mapping
-        }
-        
-        # Get the correct model name or default to gpt-4o-mini
-        model_name = model_mapping.get(selected_model, "gpt-4o-mini")
+        model_name = resolve_model_name(selected_model)
         
         # Nếu có product_id và dùng file search, thêm vào prompt để cải thiện tìm kiếm
         if product_id and use_file_search:
             search_prompt = f"{prompt} ProductId: {product_id}"
             
-            response = client.responses.create(
-                model=model_name,
-                input=search_prompt,
-                tools=[{
-                    "type": "file_search",
-                    "vector_store_ids": ["vs_6804ef31d9cc8191a9041b697b24a0cc"]
-                }]
-            )
-            
-            # Trích xuất nội dung trả về từ response
-            if hasattr(response, 'output') and len(response.output) > 1:
-                output_message = response.output[1]
-                if hasattr(output_message, 'content') and len(output_message.content) > 0:
-                    content_item = output_message.content[0]
-                    if hasattr(content_item, 'text'):
-                        return content_item.text
+            with llm_call(model_name, api="responses", tools="file_search", prompt_chars=len(search_prompt)) as call:
+                response = client.responses.create(
+                    model=model_name,
+                    input=search_prompt,
+                    tools=[{
+                        "type": "file_search",
+                        "vector_store_ids": FILE_SEARCH_VECTOR_STORE_IDS
+                    }]
+                )
+                call.set_usage(getattr(response, "usage", None))
             
-            # Nếu không thể trích xuất được text, trả về toàn bộ nội dung
-            return str(response)
+            return extract_response_text(response)
         else:
             # Sử dụng API chat.completions thông thường
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                stream=False
-            )
+            with llm_call(model_name, api="chat", prompt_chars=len(prompt)) as call:
+                response = client.chat.completions.create(
+                    model=model_name,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=False
+                )
+                call.set_usage(response.usage)
             
             return response.choices[0].message.content
     except Exception as e:
@@ -79,16 +233,7 @@ def get_openai_streaming_response(messages_history, product_id=None, use_file_se
     """
     
     try:
-        # Map selected_model value from frontend to actual API model names
-        model_mapping = {
-            "GPT-4o-MINI": "gpt-4o-mini",
-            "GPT-4": "gpt-4",
-            "GPT-4 32k": "gpt-4-32k",
-            # Default to gpt-4o-mini if not in mapping
-        }
-        
-        # Get the correct model name or default to gpt-4o-mini
-        model_name = model_mapping.get(selected_model, "gpt-4o-mini")
+        model_name = resolve_model_name(selected_model)
         
         # Format the messages for OpenAI API
         formatted_messages = []
@@ -110,16 +255,23 @@ def get_openai_streaming_response(messages_history, product_id=None, use_file_se
         if product_id and use_file_search and last_user_message:
             last_user_message['content'] += f" ProductId: {product_id}"
         
-        # Call OpenAI API with the full conversation history
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=formatted_messages,
-            stream=True
-        )
-        
-        for chunk in response:
-            if chunk.choices and chunk.choices[0].delta.content is not None:
-                yield chunk.choices[0].delta.content
+        prompt_chars = sum(len(msg.get("content") or "") for msg in formatted_messages)
+        with llm_call(model_name, api="chat", stream=True, prompt_chars=prompt_chars) as call:
+            # Call OpenAI API with the full conversation history
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=formatted_messages,
+                stream=True,
+                stream_options={"include_usage": True}  # Chunk cuối chứa usage (không có choices)
+            )
+            call.connected()
+            
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    call.token()
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None):
+                    call.set_usage(chunk.usage)
             
     except Exception as e:
         yield f"Error: {str(e)}"
\ No newline at end of file
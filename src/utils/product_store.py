@@ -0,0 +1,323 @@
+"""
+Kho sản phẩm dùng chung giữa các session Streamlit
+
+Mỗi lần scrape thành công tạo một ProductRecord bất biến (một phiên bản của ASIN) gồm
+thông tin sản phẩm, reviews dạng gọn, tóm tắt và system message dựng sẵn. Session chỉ giữ
+tham chiếu (product_ref) thay vì bản sao riêng. Kho giới hạn theo tổng dung lượng ước tính
+(PRODUCT_STORE_MAX_MB) và loại bỏ bản ghi ít dùng gần đây nhất (LRU). Scrape lại một
+sản phẩm không đổi nội dung dùng lại phiên bản mới nhất thay vì tạo bản sao.
+
+Session giữ bản ghi qua ProductLease: bản ghi đang được giữ (pin) không bị loại khỏi kho
+cho tới khi lease được giải phóng hoặc session bị thu gom.
+
+    ref = get_product_store().put(product_id, result).ref
+    lease = get_product_store().acquire(ref)  # None nếu đã bị loại khỏi kho
+    record = lease.record
+"""
+import hashlib
+import json
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from types import MappingProxyType
+
+from config.settings import PRODUCT_STORE_MAX_MB
+
+REVIEW_FIELDS = ("id", "rating", "title", "text", "author", "date")
+
+
+class Review:
+    """
+    Review gọn dùng __slots__ thay cho dict (ít bộ nhớ hơn, không sửa được sau khi tạo)
+
+    Hỗ trợ review.get(field, default) như dict để dùng chung với code đọc review dạng dict.
+    """
+
+    __slots__ = REVIEW_FIELDS
+
+    def __init__(self, id=None, rating=None, title=None, text=None, author=None, date=None):
+        setter = object.__setattr__
+        setter(self, "id", id)
+        setter(self, "rating", _intern(rating))
+        setter(self, "title", title)
+        setter(self, "text", text)
+        setter(self, "author", _intern(author))
+        setter(self, "date", _intern(date))
+
+    @classmethod
+    def from_dict(cls, review):
+        if isinstance(review, cls):
+            return review
+        return cls(**{field: review.get(field) for field in REVIEW_FIELDS})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Review is immutable")
+
+    def get(self, field, default=None):
+        value = getattr(self, field, None)
+        return default if value is None else value
+
+    def __getitem__(self, field):
+        if field not in REVIEW_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in REVIEW_FIELDS}
+
+
+def _intern(value):
+    # Số sao, ngày và tên tác giả lặp lại nhiều giữa các review: dùng chung một chuỗi
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def build_system_message(product_id, basic_product_info, product_summary, reviews_context):
+    """Tạo system message cho chatbot từ thông tin sản phẩm đã scrape"""
+    return f"""Bạn là trợ lý AI hữu ích, thân thiện và trung thực.
+
+                THÔNG TIN SẢN PHẨM {f"(ProductId: {product_id})" if product_id else ""}:
+                Tên: {basic_product_info.get('title', 'Không rõ')}
+                Giá: {basic_product_info.get('price', 'Không rõ')}
+                Đánh giá: {basic_product_info.get('rating', 'Không rõ')}
+                Số lượng đánh giá: {basic_product_info.get('review_count', 'Không rõ')}
+                Mô tả: {basic_product_info.get('description', 'Không rõ')}
+
+                TÓM TẮT SẢN PHẨM:
+                {product_summary}
+
+                ĐÁNH GIÁ NGƯỜI DÙNG:
+                {reviews_context}
+
+                Hãy sử dụng thông tin trên để trả lời các câu hỏi của người dùng về sản phẩm này.
+                Khi được hỏi về đánh giá hoặc cảm nhận về sản phẩm, hãy dựa vào các đánh giá của người dùng đã cung cấp.
+                Khi không có thông tin để trả lời, hãy thừa nhận rằng bạn không có đủ thông tin và không tự tạo ra thông tin giả.
+                """
+
+
+class ProductRecord:
+    """Một phiên bản bất biến của sản phẩm trong kho"""
+
+    __slots__ = ("key", "version", "product_id", "info", "reviews", "summary", "system_message",
+                 "welcome_message", "digest", "nbytes")
+
+    def __init__(self, key, version, product_id, result, digest=None):
+        """
+        Args:
+            key (str): Khoá của sản phẩm (ASIN, hoặc URL nếu không có ASIN)
+            version (int): Số phiên bản của khoá
+            product_id (str): ASIN trích từ URL sản phẩm (None nếu URL không có ASIN), được ghi
+                              vào system message
+            result (dict): Kết quả của run_scrape_pipeline
+            digest (str, optional): Mã băm nội dung (xem content_digest)
+        """
+        product_data = result["product_data"]
+        basic_product_info = result["basic_product_info"] or {}
+        reviews_context = product_data.get("reviews_context", result["reviews_context"])
+        summary = result["product_summary"]
+        self.key = key
+        self.version = version
+        self.product_id = product_id
+        # Thông tin sản phẩm không gồm reviews (reviews được giữ riêng ở dạng gọn)
+        self.info = MappingProxyType({name: value for name, value in product_data.items() if name != "reviews"})
+        self.reviews = tuple(Review.from_dict(review) for review in product_data.get("reviews") or ())
+        self.summary = summary
+        self.system_message = build_system_message(product_id, basic_product_info, summary, reviews_context)
+        self.welcome_message = f"Đã tìm thấy thông tin sản phẩm!\n\n**Tóm tắt sản phẩm:**\n\n{summary}"
+        self.digest = digest or content_digest(product_id, result)
+        self.nbytes = _estimate_bytes(self)
+
+    @property
+    def ref(self):
+        """Tham chiếu được lưu trong session"""
+        return (self.key, self.version)
+
+
+def content_digest(product_id, result):
+    """Mã băm nội dung của một kết quả scrape, để nhận ra lần scrape không thay đổi gì"""
+    content = {
+        "product_id": product_id,
+        "product_data": result["product_data"],
+        "basic_product_info": result["basic_product_info"],
+        "reviews_context": result["reviews_context"],
+        "product_summary": result["product_summary"],
+    }
+    encoded = json.dumps(content, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ProductLease:
+    """
+    Tham chiếu của một session tới bản ghi trong kho
+
+    Bản ghi được pin cho tới khi gọi release() hoặc lease bị thu gom (session kết thúc).
+    """
+
+    __slots__ = ("ref", "key", "_store", "_finalizer", "__weakref__")
+
+    def __init__(self, store, record):
+        self.ref = record.ref
+        self.key = record.key
+        self._store = store
+        self._finalizer = weakref.finalize(self, store._release, record.ref)
+
+    @property
+    def record(self):
+        """Bản ghi đang giữ (hoặc phiên bản mới nhất của sản phẩm nếu bản ghi không còn)"""
+        return self._store.get(self.ref) or self._store.latest(self.key)
+
+    def release(self):
+        self._finalizer()
+
+
+def _estimate_bytes(record):
+    """Ước tính dung lượng (byte) của một bản ghi: các chuỗi, container và review"""
+    seen = set()
+
+    def size(value):
+        if id(value) in seen:
+            return 0
+        seen.add(id(value))
+        total = sys.getsizeof(value)
+        if isinstance(value, (dict, MappingProxyType)):
+            total += sum(size(k) + size(v) for k, v in value.items())
+        elif isinstance(value, (list, tuple, set)):
+            total += sum(size(item) for item in value)
+        elif isinstance(value, Review):
+            total += sum(size(getattr(value, field)) for field in REVIEW_FIELDS)
+        return total
+
+    return sum(size(getattr(record, name)) for name in ("info", "reviews", "summary", "system_message",
+                                                          "welcome_message"))
+
+
+class ProductStore:
+    """Kho ProductRecord dùng chung, giới hạn theo dung lượng với chính sách LRU"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): Tổng dung lượng ước tính tối đa của các bản ghi
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evictions = 0
+        self.reused = 0
+        self._records = OrderedDict()  # (key, version) -> ProductRecord
+        self._versions = {}  # key -> phiên bản mới nhất
+        self._pins = {}  # (key, version) -> số lease đang giữ
+        self._lock = threading.Lock()
+
+    def put(self, key, result, product_id=None):
+        """
+        Thêm phiên bản mới của sản phẩm từ kết quả scrape
+
+        Nếu nội dung trùng với phiên bản mới nhất còn trong kho thì dùng lại phiên bản đó.
+
+        Returns:
+            ProductRecord: Bản ghi vừa tạo hoặc bản ghi được dùng lại
+        """
+        digest = content_digest(product_id, result)
+        with self._lock:
+            latest = self._records.get((key, self._versions.get(key)))
+            if latest is not None and latest.digest == digest:
+                self._records.move_to_end(latest.ref)
+                self.reused += 1
+                return latest
+            version = self._versions.get(key, 0) + 1
+            self._versions[key] = version
+        record = ProductRecord(key, version, product_id, result, digest=digest)
+        with self._lock:
+            self._records[record.ref] = record
+            self.nbytes += record.nbytes
+            self._evict(keep=record.ref)
+        return record
+
+    def acquire(self, ref):
+        """
+        Giữ (pin) một bản ghi cho session
+
+        Args:
+            ref (tuple): (key, version) của bản ghi
+
+        Returns:
+            ProductLease: Lease của bản ghi, hoặc None nếu bản ghi đã bị loại khỏi kho
+        """
+        if not ref:
+            return None
+        ref = tuple(ref)
+        with self._lock:
+            record = self._records.get(ref)
+            if record is None:
+                return None
+            self._records.move_to_end(ref)
+            self._pins[ref] = self._pins.get(ref, 0) + 1
+        return ProductLease(self, record)
+
+    def _release(self, ref):
+        with self._lock:
+            count = self._pins.get(ref, 0) - 1
+            if count > 0:
+                self._pins[ref] = count
+            else:
+                self._pins.pop(ref, None)
+            self._evict()
+
+    def _evict(self, keep=None):
+        # Loại từ bản ghi ít dùng gần đây nhất; bỏ qua bản ghi đang được session giữ và bản ghi vừa thêm
+        # (kho có thể tạm vượt giới hạn nếu mọi bản ghi đều đang được giữ)
+        for ref in list(self._records):
+            if self.nbytes <= self.max_bytes:
+                break
+            if ref == keep or ref in self._pins:
+                continue
+            evicted = self._records.pop(ref)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, ref):
+        """
+        Args:
+            ref (tuple): (key, version) được lưu trong session
+
+        Returns:
+            ProductRecord: Bản ghi, hoặc None nếu đã bị loại khỏi kho
+        """
+        if not ref:
+            return None
+        ref = tuple(ref)
+        with self._lock:
+            record = self._records.get(ref)
+            if record is not None:
+                self._records.move_to_end(ref)
+            return record
+
+    def latest(self, key):
+        """Phiên bản mới nhất của một sản phẩm còn trong kho (hoặc None)"""
+        with self._lock:
+            version = self._versions.get(key)
+        return self.get((key, version)) if version else None
+
+    def stats(self):
+        with self._lock:
+            return {"records": len(self._records), "nbytes": self.nbytes, "max_bytes": self.max_bytes,
+                    "evictions": self.evictions, "reused": self.reused, "pinned": len(self._pins)}
+
+
+_product_store = None
+_product_store_lock = threading.Lock()
+
+
+def get_product_store():
+    """
+    Trả về kho sản phẩm dùng chung cho cả tiến trình
+
+    Returns:
+        ProductStore: Kho được chia sẻ giữa các session Streamlit
+    """
+    global _product_store
+    if _product_store is None:
+        with _product_store_lock:
+            if _product_store is None:
+                _product_store = ProductStore(max_bytes=int(PRODUCT_STORE_MAX_MB * 1024 * 1024))
+    return _product_store
@@ -0,0 +1,179 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Từ phổ biến không mang nghĩa tìm kiếm (tiếng Anh và tiếng Việt)
+STOPWORDS = frozenset("""
+a an and are as at be but by do does for from has have how i in is it its me my of on or so
+that the this to was were what when which who why will with you your
+có của và là không thì này cho với được các những một như sản phẩm bạn tôi gì nào về
+""".split())
+
+
+def tokenize(text):
+    """Tách từ đơn giản (chữ thường, hỗ trợ tiếng Việt có dấu), bỏ stopwords"""
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def review_document(review):
+    return f"{review.get('title', '')} {review.get('text', '')}"
+
+
+class ReviewIndex:
+    """
+    Chỉ mục BM25 trên reviews của một sản phẩm
+
+    Dùng để chọn ra top-k reviews liên quan tới từng câu hỏi thay vì gửi toàn bộ
+    reviews trong system message ở mọi lượt chat.
+    """
+
+    def __init__(self, reviews, k1=1.5, b=0.75):
+        """
+        Args:
+            reviews (list): Danh sách review dict (title, text, author, date, ...)
+            k1 (float): Tham số bão hoà tần suất từ của BM25
+            b (float): Tham số chuẩn hoá độ dài văn bản của BM25
+        """
+        self.reviews = list(reviews)
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = []
+        self._lengths = []
+        document_freq = Counter()
+        for review in self.reviews:
+            tokens = tokenize(review_document(review))
+            freqs = Counter(tokens)
+            self._term_freqs.append(freqs)
+            self._lengths.append(len(tokens))
+            document_freq.update(freqs.keys())
+        count = len(self.reviews)
+        self._avg_length = (sum(self._lengths) / count) if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_freq.items()
+        }
+
+    def __len__(self):
+        return len(self.reviews)
+
+    def search(self, query, k=8):
+        """
+        Tìm top-k reviews liên quan nhất tới câu hỏi
+
+        Args:
+            query (str): Câu hỏi của người dùng
+            k (int): Số reviews tối đa trả về
+
+        Returns:
+            list: Reviews theo thứ tự điểm BM25 giảm dần. Nếu câu hỏi không khớp từ nào,
+                  trả về k reviews đầu tiên (thứ tự "hữu ích nhất" của Amazon).
+        """
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        if not terms:
+            return self.reviews[:k]
+        scores = []
+        for position, freqs in enumerate(self._term_freqs):
+            length_norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / (self._avg_length or 1))
+            score = 0.0
+            for term in terms:
+                freq = freqs.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + length_norm)
+            if score > 0:
+                scores.append((score, position))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return [self.reviews[position] for _, position in scores[:k]]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_CACHED_INDEXES = 64
+
+
+def get_review_index(key, reviews):
+    """
+    Lấy (hoặc tạo) chỉ mục BM25 cho reviews của một phiên bản sản phẩm, dùng chung giữa các session
+
+    Args:
+        key (tuple): ProductRecord.ref (sản phẩm, phiên bản) - mỗi phiên bản có nội dung cố định;
+                     None nếu không xác định được (khi đó không cache)
+        reviews (list): Reviews của phiên bản đó
+
+    Returns:
+        ReviewIndex: Chỉ mục trên reviews
+    """
+    if not key:
+        return ReviewIndex(reviews)
+    key = tuple(key)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = ReviewIndex(reviews)
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def invalidate_review_indexes(product_id):
+    """Xoá các chỉ mục đã cache của một ProductId (ví dụ khi dữ liệu scrape thay đổi)"""
+    if not product_id:
+        return
+    with _indexes_lock:
+        for key in [key for key in _indexes if key[0] == product_id]:
+            del _indexes[key]
+
+
+def format_reviews(reviews):
+    """Định dạng danh sách reviews thành đoạn văn bản cho prompt"""
+    parts = []
+    for i, review in enumerate(reviews):
+        parts.append(
+            f"Review #{i+1}:\n"
+            f"- Tiêu đề: {review.get('title', 'Không có tiêu đề')}\n"
+            f"- Người đánh giá: {review.get('author', 'Ẩn danh')}\n"
+            f"- Số sao: {review.get('rating') or 'Không rõ'}\n"
+            f"- Nội dung: {review.get('text', 'Không có nội dung')}\n"
+            f"- Ngày: {review.get('date', 'Không rõ ngày')}\n"
+        )
+    return "\n".join(parts)
+
+
+def reviews_message(reviews):
+    """System message chứa các reviews được chọn (None nếu không có review nào)"""
+    if not reviews:
+        return None
+    return {
+        "role": "system",
+        "content": "ĐÁNH GIÁ NGƯỜI DÙNG LIÊN QUAN ĐẾN CÂU HỎI:\n\n" + format_reviews(reviews),
+    }
+
+def build_messages_with_reviews(messages_history, reviews):
+    """
+    Chèn reviews liên quan ngay trước câu hỏi cuối cùng của người dùng
+
+    Không thay đổi messages_history; tin nhắn cuối được sao chép để các bước xử lý
+    phía sau (ví dụ thêm ProductId) không ghi ngược vào lịch sử.
+
+    Args:
+        messages_history (list): Lịch sử hội thoại (message dict)
+        reviews (list): Reviews đã chọn cho câu hỏi hiện tại
+
+    Returns:
+        list: Danh sách message dùng cho lần gọi API này
+    """
+    if not messages_history:
+        return []
+    messages = list(messages_history[:-1])
+    if reviews:
+        messages.append(reviews_message(reviews))
+    messages.append(dict(messages_history[-1]))
+    return messages
@@ -0,0 +1,235 @@
+"""
+Hàng đợi job Scrape chạy nền, tách khỏi lần chạy script của Streamlit
+
+Nút Scrape chỉ tạo job và lưu job_id vào session; worker trong pool thread chạy
+scrape_and_summarize và cập nhật trạng thái/tiến độ của job, còn UI đọc lại bản ghi đó
+mỗi lần poll. Người dùng vẫn tương tác được trong lúc scrape, và rerun không làm mất việc.
+
+    job = get_scrape_jobs().submit(product_url, product_id, use_file_search, selected_model)
+    ...
+    snapshot = get_scrape_jobs().get(job.job_id).snapshot()
+"""
+import atexit
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from config.settings import SCRAPE_DEADLINE, SCRAPE_WORKERS, SCRAPE_JOBS_PER_HOST, SCRAPE_JOB_RETENTION
+from utils.product_store import get_product_store
+from utils.tracing import span
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class ScrapeJob:
+    """Trạng thái của một job Scrape; được worker cập nhật và UI đọc qua snapshot()"""
+
+    def __init__(self, product_url, product_id, use_file_search, selected_model):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.key = product_id or product_url
+        self.host = urlparse(product_url).netloc or product_url
+        self.product_url = product_url
+        self.product_id = product_id
+        self.use_file_search = use_file_search
+        self.selected_model = selected_model
+        self.status = QUEUED
+        self.percent = 0
+        self.message = "Đang chờ tới lượt scrape..."
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    def update(self, percent, message):
+        """Cập nhật tiến độ (gọi từ worker)"""
+        with self._lock:
+            self.percent = max(self.percent, percent)
+            self.message = message
+
+    def _start(self):
+        with self._lock:
+            self.status = RUNNING
+            self.started_at = time.time()
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.percent = 100 if status == DONE else self.percent
+            self.finished_at = time.time()
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Bản sao trạng thái hiện tại (job_id, key, tham số của job, status, percent, message, result,
+                  error, thời gian)
+        """
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "key": self.key,
+                "product_url": self.product_url,
+                "product_id": self.product_id,
+                "use_file_search": self.use_file_search,
+                "selected_model": self.selected_model,
+                "status": self.status,
+                "percent": self.percent,
+                "message": self.message,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+def run_scrape_job(job):
+    """Runner mặc định: scrape + tóm tắt trong giới hạn SCRAPE_DEADLINE"""
+    # Import muộn: chỉ nạp Selenium/OpenAI khi có job đầu tiên
+    from utils.scrape_pipeline import scrape_and_summarize
+
+    with span("scrape_request", asin=job.product_id, known_product=job.use_file_search) as request_span:
+        result = scrape_and_summarize(job.product_url, job.product_id, job.use_file_search, job.selected_model,
+                                      deadline=SCRAPE_DEADLINE, on_progress=job.update)
+        if result["error"]:
+            request_span.set(outcome="timeout" if result["error"] == "timeout" else "failed")
+    if result["error"] or result["product_data"] is None or result["product_summary"] is None:
+        return {"error": result["error"] or "Không thể lấy thông tin sản phẩm", "product_ref": None}
+    # Dữ liệu sản phẩm được lưu một lần trong kho dùng chung; job và session chỉ giữ tham chiếu
+    record = get_product_store().put(job.key, result, product_id=job.product_id)
+    return {"error": None, "product_ref": record.ref}
+
+
+class ScrapeJobQueue:
+    """Pool worker chạy các job Scrape, giới hạn số job chạy đồng thời trên mỗi host"""
+
+    def __init__(self, runner=run_scrape_job, max_workers=4, max_per_host=2, retention=600):
+        """
+        Args:
+            runner (callable): Hàm nhận ScrapeJob và trả về dict gồm error và product_ref (tham chiếu
+                               tới bản ghi trong utils.product_store)
+            max_workers (int): Số job chạy đồng thời tối đa
+            max_per_host (int): Số job chạy đồng thời tối đa trên cùng một host (ví dụ www.amazon.com)
+            retention (float): Thời gian (giây) giữ job đã kết thúc để UI đọc kết quả
+        """
+        self.runner = runner
+        self.max_per_host = max(1, max_per_host)
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="scrape-job")
+        self._jobs = {}
+        self._running_per_host = {}
+        self._pending_per_host = {}  # host -> deque các job chờ slot của host
+        self._lock = threading.Lock()
+
+    def submit(self, product_url, product_id, use_file_search, selected_model):
+        """
+        Tạo job mới và đưa vào hàng đợi, hoặc dùng chung job đang chạy cho cùng ASIN và model
+
+        Returns:
+            ScrapeJob: Job mới (trạng thái "queued") hoặc job đang chạy cùng ASIN/model
+        """
+        job = ScrapeJob(product_url, product_id, use_file_search, selected_model)
+        with self._lock:
+            self._prune()
+            # Nhiều session/tab cùng scrape một sản phẩm: chỉ một job chạy, mọi session poll cùng tiến độ
+            for existing in self._jobs.values():
+                if existing.active and existing.key == job.key and existing.selected_model == selected_model:
+                    print(f"🔗 Joined scrape job {existing.job_id} for {existing.key}")
+                    return existing
+            self._jobs[job.job_id] = job
+            # Job vượt giới hạn của host chờ ở hàng đợi riêng, không giữ worker của host khác
+            if self._running_per_host.get(job.host, 0) < self.max_per_host:
+                self._running_per_host[job.host] = self._running_per_host.get(job.host, 0) + 1
+                self._executor.submit(self._run, job)
+            else:
+                self._pending_per_host.setdefault(job.host, deque()).append(job)
+        print(f"📥 Queued scrape job {job.job_id} for {job.key}")
+        return job
+
+    def get(self, job_id):
+        """Trả về ScrapeJob theo id, hoặc None nếu không có (hoặc đã bị dọn)"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, key=None):
+        """
+        Returns:
+            list: Snapshot các job (của một ASIN nếu có key), mới nhất trước
+        """
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if key is None or job.key == key]
+        return sorted((job.snapshot() for job in jobs), key=lambda job: job["created_at"], reverse=True)
+
+    def _run(self, job):
+        try:
+            self._execute(job)
+        finally:
+            # Nhường slot của host cho job kế tiếp đang chờ
+            with self._lock:
+                pending = self._pending_per_host.get(job.host)
+                if pending:
+                    self._executor.submit(self._run, pending.popleft())
+                else:
+                    self._running_per_host[job.host] -= 1
+
+    def _execute(self, job):
+        job._start()
+        job.update(10, "Đang scrape thông tin sản phẩm và tìm kiếm đánh giá...")
+        try:
+            result = self.runner(job)
+        except Exception as e:
+            print(f"⚠️ Scrape job {job.job_id} failed: {e}")
+            job._finish(FAILED, error=str(e))
+            return
+        if result["error"] == "timeout":
+            job._finish(TIMEOUT, result, error="timeout")
+        elif result["error"] or not result["product_ref"]:
+            job._finish(FAILED, result, error=result["error"] or "Không thể lấy thông tin sản phẩm")
+        else:
+            job._finish(DONE, result)
+        print(f"📤 Scrape job {job.job_id} {job.status} in {job.finished_at - job.created_at:.1f}s")
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if not job.active and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_scrape_jobs = None
+_scrape_jobs_lock = threading.Lock()
+
+
+def get_scrape_jobs():
+    """
+    Trả về hàng đợi job Scrape dùng chung cho cả tiến trình
+
+    Returns:
+        ScrapeJobQueue: Hàng đợi được chia sẻ giữa các session Streamlit
+    """
+    global _scrape_jobs
+    if _scrape_jobs is None:
+        with _scrape_jobs_lock:
+            if _scrape_jobs is None:
+                _scrape_jobs = ScrapeJobQueue(max_workers=SCRAPE_WORKERS, max_per_host=SCRAPE_JOBS_PER_HOST,
+                                              retention=SCRAPE_JOB_RETENTION)
+                atexit.register(_scrape_jobs.shutdown)
+    return _scrape_jobs
@@ -0,0 +1,189 @@
+import asyncio
+import queue
+import threading
+
+from helper.crawl_selenium import get_basic_product_info, get_product_info
+from utils.async_openai_helper import get_openai_response_async
+from utils.local_review_index import get_local_review_index
+from utils.tracing import attach, current_span, span
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    """Event loop nền dùng chung cho mọi pipeline (giữ AsyncOpenAI client trên một loop duy nhất)"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="scrape-pipeline-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def build_summary_prompt(basic_product_info):
+    """Tạo prompt để sinh tóm tắt sản phẩm từ thông tin cơ bản"""
+    return f"""
+                Hãy tạo một bản tóm tắt ngắn gọn về sản phẩm này dựa trên thông tin sau:
+
+                THÔNG TIN CƠ BẢN:
+                Tên sản phẩm: {basic_product_info.get('title', 'Không rõ')}
+                Giá: {basic_product_info.get('price', 'Không rõ')}
+                Đánh giá: {basic_product_info.get('rating', 'Không rõ')}
+                Số lượng đánh giá: {basic_product_info.get('review_count', 'Không rõ')}
+                Mô tả: {basic_product_info.get('description', 'Không rõ')}
+
+                Tóm tắt nên bao gồm: Đây là sản phẩm gì, các tính năng chính, điểm mạnh, giá cả, và cảm nhận chung của người dùng.
+                """
+
+
+def _scrape_succeeded(product):
+    return bool(product) and "error" not in product and product.get("title") != "Title not found"
+
+
+async def run_scrape_pipeline(product_url, product_id, use_file_search, selected_model, on_progress=None):
+    """
+    Chạy đồng thời các bước độc lập của một lần Scrape
+
+    - Scrape trình duyệt/HTTP (trong thread riêng)
+    - Lấy reviews từ cơ sở dữ liệu (sản phẩm đã biết) - không phụ thuộc vào bước scrape
+    - Tạo tóm tắt - bắt đầu ngay khi có thông tin cơ bản, không đợi phần reviews
+
+    Args:
+        product_url (str): URL sản phẩm
+        product_id (str): ASIN (có thể None)
+        use_file_search (bool): Sản phẩm có trong cơ sở dữ liệu hay không
+        selected_model (str): Model OpenAI
+        on_progress (callable, optional): (percent, message) khi một bước hoàn tất
+
+    Returns:
+        dict: basic_product_info, product_data, reviews_context, product_summary và error (nếu có)
+    """
+    loop = asyncio.get_running_loop()
+    basic_ready = loop.create_future()
+    known_product = bool(use_file_search and product_id)
+
+    def progress(percent, message):
+        if on_progress:
+            on_progress(percent, message)
+
+    def set_basic(info):
+        if not basic_ready.done():
+            basic_ready.set_result(info)
+
+    def on_basic(info):
+        # Được gọi từ thread scrape: chuyển kết quả về event loop
+        loop.call_soon_threadsafe(set_basic, info)
+
+    async def scrape_stage():
+        product = None
+        try:
+            if known_product:
+                product = await asyncio.to_thread(get_basic_product_info, product_url)
+            else:
+                product = await asyncio.to_thread(get_product_info, product_url, on_basic)
+        finally:
+            # Luôn giải phóng summary_stage, kể cả khi scrape lỗi
+            set_basic(product)
+        progress(50, "Đã scrape xong thông tin sản phẩm.")
+        return product
+
+    async def reviews_stage():
+        if not known_product:
+            return None
+        with span("pipeline_reviews") as reviews_span:
+            local_index = get_local_review_index()
+            if local_index is not None and product_id in local_index:
+                # Reviews được lấy trực tiếp từ chỉ mục cục bộ theo từng câu hỏi, không cần gọi LLM
+                reviews_span.set(outcome="local_index")
+                return (f"Có {local_index.count(product_id)} đánh giá trong cơ sở dữ liệu. "
+                        "Các đánh giá liên quan nhất sẽ được cung cấp kèm theo từng câu hỏi.")
+            # Lấy reviews từ cơ sở dữ liệu thông qua file search
+            reviews_prompt = f"Liệt kê chi tiết tất cả các đánh giá cho sản phẩm có ProductId {product_id}. Cho mỗi đánh giá, bao gồm: tên người dùng, số sao đánh giá, tiêu đề đánh giá, và nội dung đánh giá."
+            reviews_context = await get_openai_response_async(reviews_prompt, product_id, use_file_search=True,
+                                                              selected_model=selected_model, use_cache=True)
+            reviews_span.set(outcome="file_search")
+        progress(60, "Đã lấy đánh giá từ cơ sở dữ liệu.")
+        return reviews_context
+
+    async def summary_stage():
+        basic_product_info = await basic_ready
+        if not _scrape_succeeded(basic_product_info):
+            return None
+        progress(40, f"Đã tìm thấy: {basic_product_info.get('title', '')[:60]}. Đang tạo tóm tắt...")
+        with span("pipeline_summary"):
+            summary = await get_openai_response_async(build_summary_prompt(basic_product_info),
+                                                      selected_model=selected_model,
+                                                      use_cache=True, cache_tag=product_id)
+        progress(70, "Đã tạo tóm tắt sản phẩm.")
+        return summary
+
+    product, reviews_context, product_summary = await asyncio.gather(
+        scrape_stage(), reviews_stage(), summary_stage()
+    )
+
+    result = {"basic_product_info": product, "product_summary": product_summary, "error": None}
+    if known_product:
+        result["product_data"] = {
+            "title": product.get('title', 'Không rõ'),
+            "price": product.get('price', 'Không rõ'),
+            "rating": product.get('rating', 'Không rõ'),
+            "review_count": product.get('review_count', 'Không rõ'),
+            "description": product.get('description', 'Không rõ'),
+            "reviews_context": reviews_context,
+        }
+    elif _scrape_succeeded(product):
+        # Không đưa toàn bộ reviews vào system message: mỗi câu hỏi sẽ được
+        # kèm top-k reviews liên quan nhất
+        reviews_context = (f"Có {len(product.get('reviews', []))} đánh giá của người dùng. "
+                           "Các đánh giá liên quan nhất sẽ được cung cấp kèm theo từng câu hỏi.")
+        result["product_data"] = dict(product, reviews_context=reviews_context)
+    else:
+        result["product_data"] = None
+        result["error"] = product.get("error", "Không thể lấy thông tin sản phẩm") if product else "Không thể lấy thông tin sản phẩm"
+    result["reviews_context"] = reviews_context
+    return result
+
+
+def scrape_and_summarize(product_url, product_id, use_file_search, selected_model, deadline=180, on_progress=None):
+    """
+    Chạy run_scrape_pipeline trên event loop nền và chờ kết quả từ thread gọi (script Streamlit)
+
+    Progress được chuyển qua hàng đợi và gọi on_progress trên chính thread gọi, nên
+    on_progress có thể cập nhật các phần tử Streamlit.
+
+    Args:
+        deadline (float): Thời gian tối đa (giây) cho toàn bộ pipeline
+
+    Returns:
+        dict: Kết quả như run_scrape_pipeline; error = "timeout" khi vượt deadline
+    """
+    events = queue.Queue()
+    parent = current_span()
+
+    async def run():
+        # Giữ span của caller làm span cha cho các bước chạy trên event loop nền
+        with attach(parent):
+            return await run_scrape_pipeline(product_url, product_id, use_file_search, selected_model,
+                                             on_progress=lambda percent, message: events.put((percent, message)))
+
+    coroutine = asyncio.wait_for(run(), timeout=deadline)
+    future = asyncio.run_coroutine_threadsafe(coroutine, _get_loop())
+    while True:
+        try:
+            percent, message = events.get(timeout=0.1)
+            if on_progress:
+                on_progress(percent, message)
+            continue
+        except queue.Empty:
+            if not future.done():
+                continue
+        if events.empty():
+            break
+    try:
+        return future.result()
+    except asyncio.TimeoutError:
+        return {"basic_product_info": None, "product_data": None, "reviews_context": None,
+                "product_summary": None, "error": "timeout"}
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+
+from utils.local_review_index import embed_texts, TOKEN_PATTERN
+from config.settings import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL
+
+
+# Từ chức năng bị bỏ khi so khớp câu hỏi (giữ lại từ phủ định như "not", "không", "chưa")
+QUESTION_STOPWORDS = frozenset("""
+a an the is are was were be been am do does did it its s this that these those thing to of for in on at
+with and or how what whats which who why when where can could would should will may might i me my you
+your there any about like much many has have had get gets really very please
+có là thì gì sao nào này kia đó cái nó thế vậy được của cho với và hay hoặc ạ à ơi nhé bao nhiêu như
+""".split())
+
+
+def normalize_question(question):
+    """
+    Rút gọn câu hỏi về các từ mang nội dung để so khớp
+
+    "How is the battery life?" và "What's the battery life like?" đều thành "battery life".
+    """
+    return " ".join(token for token in TOKEN_PATTERN.findall((question or "").lower())
+                    if token not in QUESTION_STOPWORDS)
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời chat theo ASIN, so khớp câu hỏi theo độ tương đồng embedding
+
+    Câu hỏi được rút gọn về các từ mang nội dung (normalize_question) rồi embed cục bộ
+    (feature hashing unigram + bigram, không gọi API). Nếu một câu hỏi gần đây cho cùng sản phẩm,
+    cùng model và cùng system prefix có cosine similarity >= threshold thì câu trả lời cũ
+    được phát lại dưới dạng stream.
+
+    Bỏ từ chức năng giúp câu diễn đạt lại khớp nhau ("How is the battery life?" /
+    "What's the battery life like?" = 1.0), còn câu hỏi khác nội dung vẫn cách xa
+    ("easy to clean" / "hard to clean" ~0.33, "loud" / "not loud" ~0.58); threshold 0.8
+    nằm giữa hai nhóm (xem tests/test_semantic_cache.py). Câu diễn đạt bằng từ khác hẳn
+    ("How long does the battery last?") vẫn không khớp.
+
+    Chỉ nên dùng cho câu hỏi độc lập (lượt đầu của hội thoại): câu hỏi nối tiếp
+    ("còn pin thì sao?") phụ thuộc các lượt trước, không thuộc khoá của cache.
+    """
+
+    def __init__(self, threshold=0.8, ttl=86400, max_per_product=200):
+        """
+        Args:
+            threshold (float): Cosine similarity tối thiểu để coi là cùng câu hỏi
+            ttl (float): Thời gian sống của câu trả lời (giây)
+            max_per_product (int): Số câu trả lời tối đa giữ cho mỗi ASIN/model
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_per_product = max_per_product
+        self._entries = {}  # (product_id, model, system prefix) -> list[(embedding, question, answer, created_at)]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, product_id, model, question, context=None):
+        """
+        Tìm câu trả lời đã cache cho câu hỏi tương tự với cùng system prefix
+
+        Returns:
+            str: Câu trả lời đã cache, hoặc None nếu không có câu hỏi nào đủ giống
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        query = embed_texts([normalized])[0]
+        now = time.time()
+        key = (product_id, model, context)
+        with self._lock:
+            entries = [entry for entry in self._entries.get(key, []) if now - entry[3] <= self.ttl]
+            if entries:
+                self._entries[key] = entries
+            else:
+                self._entries.pop(key, None)
+            if entries:
+                scores = np.stack([entry[0] for entry in entries]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    return entries[best][2]
+            self.misses += 1
+        return None
+
+    def store(self, product_id, model, question, answer, context=None):
+        normalized = normalize_question(question)
+        if not normalized:
+            # Câu hỏi chỉ có từ chức năng ("What is this?") không đủ để so khớp
+            return
+        embedding = embed_texts([normalized])[0]
+        with self._lock:
+            entries = self._entries.setdefault((product_id, model, context), [])
+            entries.append((embedding, question, answer, time.time()))
+            if len(entries) > self.max_per_product:
+                del entries[:len(entries) - self.max_per_product]
+
+    def invalidate(self, product_id):
+        """Xoá toàn bộ câu trả lời của một ASIN (ví dụ khi reviews được làm mới)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == product_id]:
+                del self._entries[key]
+
+    def stream(self, product_id, model, question, stream_factory, chunk_size=20, context=None):
+        """
+        Trả về câu trả lời dạng stream, dùng cache nếu có câu hỏi tương tự
+
+        Args:
+            product_id (str): ASIN của sản phẩm đang chat
+            model (str): Model được chọn
+            question (str): Câu hỏi của người dùng
+            stream_factory (callable): Hàm không tham số trả về generator stream từ OpenAI
+            chunk_size (int): Số ký tự mỗi chunk khi phát lại câu trả lời đã cache
+            context (str, optional): system_prefix_digest của request (system message của sản phẩm)
+
+        Yields:
+            str: Các đoạn của câu trả lời
+        """
+        cached = self.lookup(product_id, model, question, context=context)
+        if cached is not None:
+            for start in range(0, len(cached), chunk_size):
+                yield cached[start:start + chunk_size]
+            return
+
+        chunks = []
+        for chunk in stream_factory():
+            chunks.append(chunk)
+            yield chunk
+        answer = "".join(chunks)
+        if answer and not any(chunk.startswith("Error:") for chunk in chunks):
+            self.store(product_id, model, question, answer, context=context)
+
+
+def system_prefix_digest(messages):
+    """
+    Mã băm các system message đầu request (thông tin và tóm tắt sản phẩm)
+
+    Reviews chèn theo câu hỏi và các lượt hội thoại không thuộc khoá: cache chỉ dùng cho
+    câu hỏi độc lập, và reviews được chọn lại từ chính câu hỏi.
+
+    Args:
+        messages (list): Message dict gửi lên API
+
+    Returns:
+        str: Mã băm của system prefix
+    """
+    prefix = []
+    for message in messages:
+        if message.get("role") != "system":
+            break
+        prefix.append(message.get("content"))
+    encoded = json.dumps(prefix, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def is_standalone_question(messages_history):
+    """True nếu câu hỏi cuối là lượt đầu tiên của hội thoại (chưa có lượt user/assistant nào trước đó)"""
+    return sum(1 for message in messages_history if message.get("role") in ("user", "assistant")) == 1
+
+
+semantic_cache = SemanticAnswerCache(threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL)
+
+
+def invalidate_product_answers(product_id):
+    """Xoá các câu trả lời chat đã cache của một ProductId"""
+    if product_id:
+        semantic_cache.invalidate(product_id)
@@ -0,0 +1,286 @@
+"""
+Span/timer nhẹ cho pipeline scrape
+
+Mỗi span ghi một bản ghi JSONL (tên, thời gian, outcome, ASIN, attempt, ...) và được gộp
+vào histogram theo (tên, outcome), có thể xuất dạng text của Prometheus qua một endpoint
+HTTP tuỳ chọn (TRACE_METRICS_PORT).
+
+    from utils.tracing import span
+
+    with span("driver_get", asin=product_id) as s:
+        driver.get(url)
+        s.set(outcome="captcha")
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import TRACE_ENABLED, TRACE_JSONL_PATH, TRACE_JSONL_MAX_MB, TRACE_METRICS_PORT
+
+# Giới hạn trên (giây) của các bucket histogram
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+# Thuộc tính được span con thừa kế từ span cha
+INHERITED_ATTRS = ("asin", "attempt")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Một khoảng thời gian đang được đo; set() để gắn thêm thuộc tính hoặc outcome"""
+
+    __slots__ = ("name", "attrs", "outcome", "trace_id", "span_id", "parent_id", "start", "duration")
+
+    def __init__(self, name, attrs, parent=None):
+        self.name = name
+        self.attrs = {key: parent.attrs[key] for key in INHERITED_ATTRS if parent and key in parent.attrs}
+        self.attrs.update(attrs)
+        self.outcome = "ok"
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration = None
+
+    def set(self, outcome=None, **attrs):
+        if outcome is not None:
+            self.outcome = outcome
+        self.attrs.update(attrs)
+        return self
+
+    def to_record(self):
+        return {
+            "ts": round(self.start, 6),
+            "name": self.name,
+            "duration_ms": round(self.duration * 1000, 3),
+            "outcome": self.outcome,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            **self.attrs,
+        }
+
+
+class _Histogram:
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+
+class Tracer:
+    """Thu thập span: ghi JSONL và gộp histogram thời gian theo (tên, outcome)"""
+
+    def __init__(self, jsonl_path=None, enabled=True, buckets=DEFAULT_BUCKETS, max_bytes=None):
+        """
+        Args:
+            jsonl_path (str, optional): File JSONL nhận từng bản ghi span (None = không ghi file)
+            enabled (bool): False để span() không làm gì (chi phí gần như bằng 0)
+            buckets (tuple): Giới hạn trên (giây) của các bucket histogram
+            max_bytes (int, optional): Khi file JSONL vượt kích thước này, đổi tên thành <path>.1
+                                       (ghi đè bản cũ) và ghi sang file mới (None = không giới hạn)
+        """
+        self.jsonl_path = jsonl_path
+        self.enabled = enabled
+        self.buckets = buckets
+        self.max_bytes = max_bytes
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_size = 0
+        self._server = None
+        self._collectors = []
+
+    def add_collector(self, render):
+        """Đăng ký hàm trả về text Prometheus bổ sung cho endpoint /metrics (ví dụ telemetry LLM)"""
+        if render not in self._collectors:
+            self._collectors.append(render)
+
+    @contextmanager
+    def span(self, name, detached=False, **attrs):
+        """
+        Args:
+            name (str): Tên span
+            detached (bool): Không đặt span làm span hiện tại của context; dùng cho span bao quanh
+                             yield của generator, để code của caller không bị gắn nhầm làm span con
+            **attrs: Thuộc tính của span
+        """
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        current = Span(name, attrs, _current_span.get())
+        token = None if detached else _current_span.set(current)
+        started = time.perf_counter()
+        try:
+            yield current
+        except BaseException as e:
+            if current.outcome == "ok":
+                current.set(outcome="error", error=type(e).__name__)
+            raise
+        finally:
+            current.duration = time.perf_counter() - started
+            if token is not None:
+                _current_span.reset(token)
+            self.record(current)
+
+    def record(self, finished):
+        """Ghi một span đã kết thúc vào histogram và file JSONL"""
+        with self._lock:
+            key = (finished.name, finished.outcome)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.count += 1
+            histogram.total += finished.duration
+            for index, bound in enumerate(self.buckets):
+                if finished.duration <= bound:
+                    histogram.counts[index] += 1
+                    break
+            if self.jsonl_path:
+                try:
+                    if self._file is None:
+                        os.makedirs(os.path.dirname(os.path.abspath(self.jsonl_path)), exist_ok=True)
+                        self._file = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+                        self._file_size = os.path.getsize(self.jsonl_path)
+                    line = json.dumps(finished.to_record(), ensure_ascii=False, default=str) + "\n"
+                    self._file.write(line)
+                    self._file_size += len(line.encode("utf-8"))
+                    if self.max_bytes and self._file_size >= self.max_bytes:
+                        self._rotate()
+                except OSError as e:
+                    print(f"⚠️ Trace write error: {e}")
+                    self.jsonl_path = None
+
+    def _rotate(self):
+        # Giữ một bản cũ (<path>.1) để file trace không lớn mãi trên server chạy lâu
+        self._file.close()
+        self._file = None
+        os.replace(self.jsonl_path, f"{self.jsonl_path}.1")
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: (tên, outcome) -> {"count", "total_s", "mean_ms"}
+        """
+        with self._lock:
+            return {key: {"count": h.count, "total_s": h.total, "mean_ms": h.total / h.count * 1000}
+                    for key, h in self._histograms.items()}
+
+    def render_prometheus(self):
+        """Xuất histogram theo định dạng text exposition của Prometheus"""
+        lines = ["# HELP scrape_span_duration_seconds Duration of traced scrape stages",
+                 "# TYPE scrape_span_duration_seconds histogram"]
+        with self._lock:
+            for (name, outcome), histogram in sorted(self._histograms.items()):
+                labels = f'name="{_escape_label(name)}",outcome="{_escape_label(outcome)}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'scrape_span_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'scrape_span_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"scrape_span_duration_seconds_sum{{{labels}}} {histogram.total:.6f}")
+                lines.append(f"scrape_span_duration_seconds_count{{{labels}}} {histogram.count}")
+        text = "\n".join(lines) + "\n"
+        for render in list(self._collectors):
+            try:
+                text += render()
+            except Exception as e:
+                print(f"⚠️ Metrics collector error: {e}")
+        return text
+
+    def serve_metrics(self, port, host="127.0.0.1"):
+        """
+        Mở endpoint /metrics (text Prometheus) trong thread nền
+
+        Returns:
+            bool: True nếu endpoint đang chạy
+        """
+        if self._server is not None:
+            return True
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"⚠️ Could not start metrics endpoint on port {port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="trace-metrics", daemon=True).start()
+        print(f"Trace metrics available at http://{host}:{port}/metrics")
+        return True
+
+
+class _NoopSpan:
+    name = None
+    attrs = {}
+
+    def set(self, outcome=None, **attrs):
+        return self
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+tracer = Tracer(
+    jsonl_path=TRACE_JSONL_PATH or None,
+    enabled=TRACE_ENABLED,
+    max_bytes=int(TRACE_JSONL_MAX_MB * 1024 * 1024) if TRACE_JSONL_MAX_MB > 0 else None,
+)
+if TRACE_ENABLED and TRACE_METRICS_PORT:
+    tracer.serve_metrics(TRACE_METRICS_PORT)
+
+
+def span(name, **attrs):
+    """Đo một đoạn code bằng tracer dùng chung (context manager trả về Span)"""
+    return tracer.span(name, **attrs)
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def attach(parent):
+    """Dùng parent làm span cha trong context hiện tại (ví dụ khi chuyển việc sang thread/event loop khác)"""
+    token = _current_span.set(parent)
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
+
+
+def traced(name=None):
+    """Decorator: mỗi lần gọi hàm là một span"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator